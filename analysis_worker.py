@@ -0,0 +1,40 @@
+"""
+Audio analysis worker
+Serves VerificationService analysis over a local socket so it can scale
+independently of the bot processes
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent))
+
+from config.settings import settings
+from services.analysis_worker import AnalysisWorkerServer
+from utils.logger import logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Воркер анализа аудио для бота верификации")
+    parser.add_argument("--endpoint", type=str, default="unix:/tmp/verification-analysis-0.sock",
+                        help="Адрес: unix:/path или tcp:host:port")
+    parser.add_argument("--concurrency", type=int, default=settings.analysis_worker_concurrency,
+                        help="Одновременных анализов")
+    return parser.parse_args()
+
+
+def main():
+    """Worker entry point"""
+    args = parse_args()
+    server = AnalysisWorkerServer(args.endpoint, args.concurrency)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("🛑 Воркер анализа остановлен")
+
+
+if __name__ == "__main__":
+    main()
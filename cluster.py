@@ -0,0 +1,66 @@
+"""
+Shard cluster launcher
+Runs several bot processes, each owning a shard range, with a Unix-socket IPC
+for cluster status, aggregated metrics and coordinated shutdown
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent))
+
+from config.settings import settings
+from core.cluster import ClusterCoordinator, fetch_recommended_shards, request, worker_command
+from utils.logger import console, logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Кластер процессов бота голосовой верификации")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "status", "shutdown"])
+    parser.add_argument("--processes", type=int, default=settings.cluster_processes, help="Количество процессов")
+    parser.add_argument("--shards", type=int, default=settings.shard_count, help="Количество шардов (0 — рекомендация Discord)")
+    parser.add_argument("--socket", type=str, default=settings.cluster_socket, help="Путь к Unix-сокету координатора")
+    return parser.parse_args()
+
+
+async def run_cluster(args: argparse.Namespace):
+    shard_count = args.shards
+    if shard_count <= 0:
+        if not settings.token:
+            logger.error("❌ Токен бота не указан! Без него нельзя узнать количество шардов.")
+            return
+        shard_count = await fetch_recommended_shards(settings.token)
+        logger.info(f"📡 Discord рекомендует шардов: {shard_count}")
+
+    coordinator = ClusterCoordinator(
+        args.socket,
+        shard_count,
+        args.processes,
+        worker_command(),
+        settings.cluster_max_restarts,
+        settings.cluster_restart_window
+    )
+    await coordinator.run()
+
+
+def main():
+    """Cluster entry point"""
+    args = parse_args()
+    if args.command == "run":
+        asyncio.run(run_cluster(args))
+        return
+
+    try:
+        reply = asyncio.run(request(args.socket, args.command))
+    except OSError as e:
+        logger.error(f"❌ Координатор кластера недоступен ({args.socket}): {e}")
+        sys.exit(1)
+    console.print_json(json.dumps(reply, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
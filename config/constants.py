@@ -4,6 +4,7 @@ class VerificationStatus(Enum):
     """Verification session statuses"""
     PENDING = "pending"
     IN_PROGRESS = "in_progress"
+    SUSPENDED = "suspended"
     COMPLETED = "completed"
     FAILED = "failed"
 
@@ -14,3 +15,12 @@ class EmbedColors:
     WARNING = 0xffa500
     INFO = 0x0099ff
     RECORDING = 0x9932cc
+
+class VoiceTransition(Enum):
+    """Voice state transitions relative to the verification channel"""
+    JOINED = "joined"
+    LEFT = "left"
+    MOVED_IN = "moved_in"
+    MOVED_OUT = "moved_out"
+    STATE_ONLY = "state_only"
+    UNRELATED = "unrelated"
@@ -10,6 +10,9 @@ class BotSettings:
     """Bot configuration settings"""
     token: str
     command_prefix: str = "!"
+    low_memory_mode: bool = False  # no chunking, voice-only member cache, no role restore from cache
+    member_cache_size: int = 512
+    footprint_path: str = "data/footprint.json"  # last startup figures per mode, for the low-memory comparison
     
     # Channel IDs
     voice_channel_id: int = 1378734533410689155
@@ -23,7 +26,105 @@ class BotSettings:
     questions: List[str] = None
     recording_durations: List[int] = None
     audio_files: Dict[str, str] = None
-    
+
+    # Recording buffer limits
+    recording_user_buffer_mb: float = 8.0
+    recording_memory_budget_mb: float = 64.0
+    recording_buffer_slack: float = 1.5  # ring capacity = duration * slack
+    recording_silence_peak: int = 64  # PCM16 peak below this is silence
+    recording_silence_hangover_ms: int = 200
+    recording_temp_dir: str = "temp_recordings"
+    recording_spill_dir: str = "temp_recordings/spill"
+    recording_capture_mode: str = "pcm"  # "pcm" | "opus" (сырые пакеты, декодирование по запросу)
+    recording_upload_format: str = "wav"  # "wav" | "ogg" (только для режима opus)
+    recording_trim_enabled: bool = True  # keep only the speech window of an answer
+    recording_trim_margin_ms: int = 250  # kept before the first and after the last speech frame
+    recording_barge_in: bool = False  # capture the answer while the prompt is playing
+    recording_barge_in_wait: float = 3.0  # seconds to start answering after the prompt ends
+    recording_barge_in_speech_dbfs: float = -40.0  # frame RMS that counts as the start of an answer
+    recording_barge_in_speech_frames: int = 3  # consecutive 20 ms frames (or Opus packets) above it
+
+    # Session timers
+    question_pause_seconds: float = 3.0
+    session_ttl_seconds: float = 300.0
+    session_reap_interval: float = 60.0
+    voice_debounce_seconds: float = 1.0
+    session_resume_grace_seconds: float = 120.0  # how long a left user's progress is kept
+    session_max_resumes: int = 2
+
+    # Shard cluster (cluster.py)
+    cluster_processes: int = 2
+    shard_count: int = 0  # 0 — recommended by Discord
+    cluster_socket: str = "/tmp/verification-bot-cluster.sock"
+    cluster_metrics_interval: float = 10.0
+    cluster_max_restarts: int = 5  # crashes per process within the window
+    cluster_restart_window: float = 300.0
+
+    # Analysis workers (analysis_worker.py); endpoints "unix:/path" or "tcp:host:port"
+    analysis_workers: List[str] = None
+    analysis_worker_concurrency: int = 2
+    analysis_worker_retry_seconds: float = 30.0  # unreachable worker is skipped for this long
+
+    # Answer analysis
+    analysis_frame_ms: int = 20
+    analysis_feature_rate: int = 16000  # speech features after integer decimation; 0 — native rate
+    analysis_spectral_centroid: bool = True
+
+    # Offline passphrase check: MFCC + banded DTW against reference recordings
+    passphrase_templates: Dict[str, str] = None  # question -> directory of reference WAVs
+    passphrase_dtw_band: float = 0.2  # Sakoe-Chiba radius as a share of the longer sequence
+    passphrase_accept_ratio: float = 1.3  # distance / template spread at or below this matches
+    passphrase_reject_ratio: float = 2.0  # and at or above this scores zero
+    passphrase_distance_scale: float = 15.0  # spread used when there is a single template
+
+    # Answer fingerprints: replayed recordings across accounts
+    fingerprint_enabled: bool = True
+    fingerprint_db_path: str = "data/fingerprints.sqlite3"
+    fingerprint_ttl_seconds: float = 30 * 24 * 3600
+    fingerprint_evict_interval: float = 3600.0
+    fingerprint_peaks_per_second: int = 20
+    fingerprint_fan_out: int = 5  # target peaks paired with each anchor
+    fingerprint_min_matches: int = 15  # time-aligned hashes needed to consider a match
+    fingerprint_match_ratio: float = 0.2  # share of the shorter answer's hashes
+
+    # Recording archive: content-addressed, compressed, SQLite manifest
+    archive_enabled: bool = True
+    archive_dir: str = "data/archive"
+    archive_compression_level: int = 6
+    archive_batch_size: int = 16  # answers per fsync + manifest commit
+    archive_batch_seconds: float = 2.0
+    archive_retention_days: float = 30.0
+    archive_max_mb: float = 2048.0
+    archive_janitor_interval: float = 3600.0
+    archive_orphan_seconds: float = 3600.0  # temp files older than this are crash leftovers
+
+    # Verification result log: JSON Lines segments compacted into Parquet (pyarrow)
+    result_log_enabled: bool = True
+    result_log_dir: str = "data/results"
+    result_log_batch_size: int = 64  # records per write + fsync
+    result_log_batch_seconds: float = 5.0
+    result_log_segment_seconds: float = 3600.0  # segment rotation
+    result_log_compact_interval: float = 3600.0
+
+    # Verification history for the support command
+    history_enabled: bool = True
+    history_db_path: str = "data/history.sqlite3"
+    history_page_size: int = 5  # attempts per page
+    history_view_timeout: float = 180.0  # pagination buttons stay active this long
+
+    # Shared-memory PCM handoff to local analysis workers
+    shared_pcm_enabled: bool = True
+    shared_pcm_slab_mb: float = 8.0  # one answer per slab; larger answers get a dedicated segment
+    shared_pcm_slabs: int = 8
+    shared_pcm_lease_seconds: float = 600.0  # older leases are swept as leaked
+
+    # Verified result cache
+    verified_cache_ttl_seconds: float = 7 * 24 * 3600
+    verified_cache_max_entries: int = 10000
+
+    # Stage deadlines (seconds)
+    stage_timeouts: Dict[str, float] = None
+
     def __post_init__(self):
         if self.questions is None:
             self.questions = [
@@ -41,7 +142,28 @@ class BotSettings:
                 "completion": "assets/audio/completion.mp3"
             }
 
+        if self.passphrase_templates is None:
+            # Эталоны не поставляются с ботом: записи фразы у каждого сервера свои
+            self.passphrase_templates = {}
+
+        if self.analysis_workers is None:
+            self.analysis_workers = []
+
+        if self.stage_timeouts is None:
+            self.stage_timeouts = {
+                "prompt": 30.0,
+                "recording_callback": 10.0,  # after the recording deadline
+                "save": 15.0,
+                "analysis": 30.0,
+                "subprocess": 15.0,
+                "upload": 30.0,
+                "fingerprint": 10.0,
+                "post_processing": 60.0  # waiting for background answer processing before completion
+            }
+
 # Global settings instance
 settings = BotSettings(
     token=os.getenv("DISCORD_TOKEN", ""),
+    low_memory_mode=os.getenv("LOW_MEMORY_MODE", "").lower() in ("1", "true", "yes"),
+    analysis_workers=[endpoint.strip() for endpoint in os.getenv("ANALYSIS_WORKERS", "").split(",") if endpoint.strip()],
 )
@@ -1,31 +1,65 @@
+import asyncio
+import json
+import math
+import os
+import time
+from typing import List, Optional
+
 import discord
 from discord.ext import commands
 
+from core.cluster import ClusterClient, shard_ownership
+from handlers.history_commands import HistoryCommands
 from handlers.voice_events import VoiceEventHandler
+from services.guild_cache import guild_resources
+from services.member_resolver import member_resolver
+from utils.helpers import current_rss_mb, peak_rss_mb
 from utils.logger import logger
 from config.settings import settings
 
-class VerificationBot(commands.Bot):
-    """Главный класс бота"""
+class VerificationBot(commands.AutoShardedBot):
+    """Главный класс бота
+
+    В кластере процесс получает свой диапазон шардов (shard_ids из shard_count),
+    вне кластера шардирование выбирается автоматически.
+    """
 
-    def __init__(self):
+    def __init__(self, shard_ids: Optional[List[int]] = None, shard_count: Optional[int] = None):
+        self.started_at = time.perf_counter()
         intents = discord.Intents.default()
         intents.voice_states = True
         intents.guilds = True
+        # Интент members нужен всегда: без него не приходят снятие ролей и обновления прав бота
         intents.members = True
 
+        if settings.low_memory_mode:
+            # Участники не загружаются при старте, в кэше только голосовые каналы
+            member_cache_flags = discord.MemberCacheFlags.none()
+            member_cache_flags.voice = True
+        else:
+            member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
         super().__init__(
-            command_prefix=settings.command_prefix,
+            # Упоминание бота работает без привилегированного интента Message Content
+            command_prefix=commands.when_mentioned_or(settings.command_prefix),
             intents=intents,
-            help_command=None
+            help_command=None,
+            chunk_guilds_at_startup=not settings.low_memory_mode,
+            member_cache_flags=member_cache_flags,
+            shard_ids=shard_ids,
+            shard_count=shard_count
         )
 
         self.voice_handler = VoiceEventHandler(self)
+        self.add_cog(HistoryCommands(self.voice_handler.verification_service.history))
+        self._cluster_task: Optional[asyncio.Task] = None
 
     async def on_ready(self):
         """Вызывается, когда бот готов к работе"""
         logger.info(f"✅ Бот {self.user} успешно запущен!")
         logger.info(f"📡 Подключено к {len(self.guilds)} серверам.")
+        self._report_footprint()
+        self._start_cluster_client()
 
         activity = discord.Activity(
             type=discord.ActivityType.listening,
@@ -33,6 +67,88 @@ class VerificationBot(commands.Bot):
         )
         await self.change_presence(activity=activity)
 
+    def _report_footprint(self):
+        """Время запуска и память; экономия low-memory считается по последнему запуску в другом режиме"""
+        low_memory = settings.low_memory_mode
+        footprint = {
+            'startup_seconds': round(time.perf_counter() - self.started_at, 2),
+            'rss_mb': round(current_rss_mb(), 1),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'members_cached': sum(len(guild.members) for guild in self.guilds),
+            'guilds': len(self.guilds),
+            'recorded_at': time.time(),
+        }
+        logger.info(
+            f"📏 Режим: {'low-memory' if low_memory else 'полный кэш участников'} • "
+            f"Запуск: {footprint['startup_seconds']:.1f}с • RSS: {footprint['rss_mb']:.0f} MB "
+            f"(пик {footprint['peak_rss_mb']:.0f} MB) • Участников в кэше: {footprint['members_cached']}"
+        )
+
+        # В кластере каждый процесс сравнивается с самим собой
+        suffix = f":{shard_ownership.cluster_id}" if shard_ownership.clustered else ""
+        key, other_key = ("low_memory", "full_cache") if low_memory else ("full_cache", "low_memory")
+        runs = self._load_footprints()
+        other = runs.get(other_key + suffix)
+        if other is None:
+            logger.info(
+                f"📏 Для оценки экономии запустите бота и в режиме "
+                f"{'полного кэша' if low_memory else 'low-memory'} (LOW_MEMORY_MODE)"
+            )
+        else:
+            full, low = (other, footprint) if low_memory else (footprint, other)
+            logger.info(
+                f"📉 Экономия low-memory: запуск {full['startup_seconds'] - low['startup_seconds']:+.1f}с • "
+                f"RSS {full['rss_mb'] - low['rss_mb']:+.0f} MB • пик {full['peak_rss_mb'] - low['peak_rss_mb']:+.0f} MB • "
+                f"участников в кэше {full['members_cached'] - low['members_cached']:+d} "
+                f"(гильдий: {full['guilds']} / {low['guilds']})"
+            )
+
+        runs[key + suffix] = footprint
+        self._save_footprints(runs)
+
+    def _load_footprints(self) -> dict:
+        try:
+            with open(settings.footprint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать замеры запуска {settings.footprint_path}: {e}")
+            return {}
+
+    def _save_footprints(self, runs: dict) -> None:
+        try:
+            os.makedirs(os.path.dirname(settings.footprint_path) or ".", exist_ok=True)
+            with open(settings.footprint_path, "w", encoding="utf-8") as f:
+                json.dump(runs, f, indent=2)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить замеры запуска {settings.footprint_path}: {e}")
+
+    def _start_cluster_client(self):
+        """Подключиться к координатору кластера (один раз за жизнь процесса)"""
+        socket_path = os.getenv("CLUSTER_SOCKET")
+        if not shard_ownership.clustered or not socket_path or self._cluster_task is not None:
+            return
+        client = ClusterClient(
+            socket_path, shard_ownership, self.cluster_metrics, self.close, settings.cluster_metrics_interval
+        )
+        self._cluster_task = asyncio.get_running_loop().create_task(client.run())
+        logger.info(f"🧩 Процесс кластера {shard_ownership.cluster_id}, шарды {shard_ownership.shard_ids}")
+
+    def cluster_metrics(self) -> dict:
+        """Метрики процесса для сводного статуса кластера"""
+        service = self.voice_handler.verification_service
+        return {
+            'guilds': len(self.guilds),
+            'sessions': len(service.active_sessions),
+            'suspended_sessions': len(service.suspended_sessions),
+            'recordings': len(service.recording_service.active_recordings),
+            'members_cached': sum(len(guild.members) for guild in self.guilds),
+            'members_resolved': len(member_resolver),
+            'rss_mb': round(current_rss_mb(), 1),
+            'latency_ms': round(self.latency * 1000, 1) if math.isfinite(self.latency) else None,
+        }
+
     async def on_voice_state_update(
         self,
         member: discord.Member,
@@ -42,6 +158,40 @@ class VerificationBot(commands.Bot):
         """Обработка обновлений голосовых состояний"""
         await self.voice_handler.handle_voice_state_update(member, before, after)
 
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        guild_resources.invalidate(channel.guild.id, "channel_create")
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        guild_resources.invalidate(channel.guild.id, "channel_delete")
+
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        guild_resources.invalidate(after.guild.id, "channel_update")
+
+    async def on_guild_role_create(self, role: discord.Role):
+        guild_resources.invalidate(role.guild.id, "role_create")
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        guild_resources.invalidate(role.guild.id, "role_delete")
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        guild_resources.invalidate(after.guild.id, "role_update")
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        # Права бота зависят только от его собственных ролей
+        if after.id == self.user.id:
+            guild_resources.invalidate(after.guild.id, "bot_member_update")
+            return
+        # Снятая модератором роль не должна восстанавливаться при перезаходе
+        if before.get_role(settings.verified_role_id) and not after.get_role(settings.verified_role_id):
+            await self.voice_handler.verification_service.verified_cache.invalidate(after.guild.id, after.id)
+            logger.info(f"🗑️ Роль верификации снята с {after.display_name}, сохраненный результат удален")
+
+    async def on_member_ban(self, guild: discord.Guild, user: discord.User):
+        await self.voice_handler.verification_service.verified_cache.invalidate(guild.id, user.id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        guild_resources.invalidate(guild.id, "guild_remove")
+
     async def on_error(self, event: str, args, *kwargs):
         """Обработка ошибок"""
         logger.error(f"⚠️ Ошибка в событии '{event}': {args}")
@@ -0,0 +1,380 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import aiohttp
+
+from core.exceptions import ClusterException
+from utils.logger import logger
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+SHUTDOWN_GRACE_SECONDS = 15.0
+RECONNECT_DELAY_SECONDS = 2.0
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Шард гильдии по формуле Discord"""
+    return (guild_id >> 22) % shard_count
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[List[int]]:
+    """Разбить шарды на непрерывные диапазоны по процессам"""
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+async def fetch_recommended_shards(token: str) -> int:
+    """Рекомендуемое Discord количество шардов"""
+    headers = {"Authorization": f"Bot {token}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_BOT_URL, headers=headers) as response:
+            if response.status != 200:
+                raise ClusterException(f"GET /gateway/bot вернул {response.status}")
+            data = await response.json()
+    return int(data["shards"])
+
+
+class ShardOwnership:
+    """Какие шарды (а значит и гильдии) обслуживает текущий процесс"""
+
+    def __init__(self):
+        self.cluster_id: Optional[int] = None
+        self.shard_ids: Optional[List[int]] = None
+        self.shard_count: Optional[int] = None
+
+    def configure(self, cluster_id: int, shard_ids: List[int], shard_count: int) -> None:
+        self.cluster_id = cluster_id
+        self.shard_ids = list(shard_ids)
+        self.shard_count = shard_count
+
+    @property
+    def clustered(self) -> bool:
+        return self.shard_ids is not None
+
+    def owns(self, guild_id: int) -> bool:
+        """Вне кластера процесс владеет всеми гильдиями"""
+        if not self.clustered:
+            return True
+        return shard_for_guild(guild_id, self.shard_count) in self.shard_ids
+
+    @classmethod
+    def from_env(cls) -> "ShardOwnership":
+        ownership = cls()
+        shards = os.getenv("CLUSTER_SHARDS")
+        if shards:
+            ownership.configure(
+                int(os.getenv("CLUSTER_ID", "0")),
+                [int(shard) for shard in shards.split(",")],
+                int(os.environ["CLUSTER_SHARD_COUNT"])
+            )
+        return ownership
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write(json.dumps(message).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+async def _receive(reader: asyncio.StreamReader) -> Optional[dict]:
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+async def request(socket_path: str, op: str, timeout: float = 5.0) -> dict:
+    """Одиночный запрос к координатору (status / shutdown)"""
+    reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(socket_path), timeout)
+    try:
+        await _send(writer, {"op": op})
+        reply = await asyncio.wait_for(_receive(reader), timeout)
+        return reply or {}
+    finally:
+        writer.close()
+
+
+@dataclass
+class WorkerProcess:
+    """Процесс бота, обслуживающий диапазон шардов"""
+    cluster_id: int
+    shard_ids: List[int]
+    process: Optional[asyncio.subprocess.Process] = None
+    writer: Optional[asyncio.StreamWriter] = None
+    metrics: dict = field(default_factory=dict)
+    last_seen: float = 0.0
+    started_at: float = 0.0
+    crashes: Deque[float] = field(default_factory=deque)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class ClusterCoordinator:
+    """Запуск процессов кластера, надзор за ними и IPC по Unix-сокету
+
+    Упавший процесс (ненулевой код или сигнал) перезапускается с тем же
+    диапазоном шардов, пока не превышен лимит падений за окно; штатный выход
+    с кодом 0 перезапуска не вызывает. Через сокет процессы присылают метрики,
+    а внешние клиенты получают сводный статус и могут остановить кластер.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        shard_count: int,
+        processes: int,
+        command: List[str],
+        max_restarts: int,
+        restart_window: float
+    ):
+        self.socket_path = socket_path
+        self.shard_count = shard_count
+        self.command = command
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.workers: Dict[int, WorkerProcess] = {
+            cluster_id: WorkerProcess(cluster_id, shards)
+            for cluster_id, shards in enumerate(shard_ranges(shard_count, processes))
+        }
+        self.started_at = time.time()
+        self._stopping = asyncio.Event()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def run(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.request_shutdown)
+
+        logger.info(
+            f"🧩 Кластер: {len(self.workers)} процессов, {self.shard_count} шардов, IPC {self.socket_path}"
+        )
+        supervisors = [asyncio.create_task(self._supervise(worker)) for worker in self.workers.values()]
+        asyncio.gather(*supervisors, return_exceptions=True).add_done_callback(self._on_workers_finished)
+        try:
+            await self._stopping.wait()
+            await self._shutdown_workers()
+        finally:
+            for task in supervisors:
+                task.cancel()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+            self._server.close()
+            await self._server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logger.info("🛑 Кластер остановлен")
+
+    def request_shutdown(self) -> None:
+        if not self._stopping.is_set():
+            logger.info("🛑 Получен запрос на остановку кластера")
+            self._stopping.set()
+
+    def _on_workers_finished(self, _future: asyncio.Future) -> None:
+        """Все процессы завершились сами или исчерпали перезапуски — надзирать больше не за кем"""
+        if not self._stopping.is_set():
+            logger.info("🛑 Все процессы кластера завершены")
+            self._stopping.set()
+
+    def _environment(self, worker: WorkerProcess) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "CLUSTER_ID": str(worker.cluster_id),
+            "CLUSTER_SHARDS": ",".join(str(shard) for shard in worker.shard_ids),
+            "CLUSTER_SHARD_COUNT": str(self.shard_count),
+            "CLUSTER_SOCKET": self.socket_path,
+        })
+        return env
+
+    async def _supervise(self, worker: WorkerProcess) -> None:
+        while not self._stopping.is_set():
+            worker.process = await asyncio.create_subprocess_exec(*self.command, env=self._environment(worker))
+            worker.started_at = time.time()
+            logger.info(f"▶️ Процесс {worker.cluster_id} (pid {worker.process.pid}) запущен, шарды {worker.shard_ids}")
+
+            returncode = await worker.process.wait()
+            worker.writer = None
+            if self._stopping.is_set():
+                return
+            if returncode == 0:
+                # Процесс завершился сам (например, по команде shutdown) — это не падение
+                logger.info(f"⏹️ Процесс {worker.cluster_id} завершился штатно, шарды {worker.shard_ids} освобождены")
+                return
+
+            now = time.monotonic()
+            worker.crashes.append(now)
+            while worker.crashes and now - worker.crashes[0] > self.restart_window:
+                worker.crashes.popleft()
+            if len(worker.crashes) > self.max_restarts:
+                logger.error(
+                    f"💥 Процесс {worker.cluster_id} упал {len(worker.crashes)} раз за {self.restart_window:.0f}с — "
+                    f"перезапуски прекращены, шарды {worker.shard_ids} не обслуживаются"
+                )
+                return
+
+            delay = min(30.0, 2 ** (len(worker.crashes) - 1))
+            logger.warning(f"⚠️ Процесс {worker.cluster_id} завершился с кодом {returncode}, перезапуск через {delay:.0f}с")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _shutdown_workers(self) -> None:
+        """Попросить процессы завершиться через IPC, затем добить оставшиеся"""
+        for worker in self.workers.values():
+            if worker.alive and worker.writer is not None:
+                try:
+                    await _send(worker.writer, {"op": "shutdown"})
+                except (ConnectionError, RuntimeError):
+                    pass
+            elif worker.alive:
+                worker.process.terminate()
+
+        alive = [worker.process.wait() for worker in self.workers.values() if worker.alive]
+        if not alive:
+            return
+        done, pending = await asyncio.wait(
+            [asyncio.ensure_future(waiter) for waiter in alive], timeout=SHUTDOWN_GRACE_SECONDS
+        )
+        for worker in self.workers.values():
+            if worker.alive:
+                logger.warning(f"⚠️ Процесс {worker.cluster_id} не завершился вовремя, kill")
+                worker.process.kill()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        worker: Optional[WorkerProcess] = None
+        try:
+            while True:
+                message = await _receive(reader)
+                if message is None:
+                    break
+                op = message.get("op")
+                if op == "hello":
+                    worker = self.workers.get(message.get("cluster_id"))
+                    if worker is not None:
+                        worker.writer = writer
+                        worker.last_seen = time.time()
+                elif op == "metrics" and worker is not None:
+                    worker.metrics = message.get("metrics", {})
+                    worker.last_seen = time.time()
+                elif op == "status":
+                    await _send(writer, self.status())
+                elif op == "shutdown":
+                    await _send(writer, {"ok": True})
+                    self.request_shutdown()
+                else:
+                    await _send(writer, {"error": f"unknown op {op!r}"})
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.debug(f"IPC соединение закрыто: {e}")
+        finally:
+            if worker is not None and worker.writer is writer:
+                worker.writer = None
+            writer.close()
+
+    def status(self) -> dict:
+        """Сводный статус: по процессам и суммарные метрики"""
+        processes, totals = [], {}
+        for worker in self.workers.values():
+            processes.append({
+                "cluster_id": worker.cluster_id,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": worker.alive,
+                "shards": worker.shard_ids,
+                "uptime": time.time() - worker.started_at if worker.alive else 0.0,
+                "crashes": len(worker.crashes),
+                "last_seen": worker.last_seen,
+                "metrics": worker.metrics,
+            })
+            for name, value in worker.metrics.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[name] = totals.get(name, 0) + value
+        return {
+            "shard_count": self.shard_count,
+            "uptime": time.time() - self.started_at,
+            "processes": processes,
+            "totals": totals,
+        }
+
+
+class ClusterClient:
+    """Сторона процесса бота: hello, периодические метрики и команда остановки"""
+
+    def __init__(
+        self,
+        socket_path: str,
+        ownership: ShardOwnership,
+        metrics: Callable[[], dict],
+        on_shutdown: Callable[[], Awaitable],
+        interval: float
+    ):
+        self.socket_path = socket_path
+        self.ownership = ownership
+        self.metrics = metrics
+        self.on_shutdown = on_shutdown
+        self.interval = interval
+
+    async def run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                logger.debug(f"Координатор кластера недоступен: {e}")
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+                continue
+
+            listener = asyncio.create_task(self._listen(reader))
+            try:
+                await _send(writer, {
+                    "op": "hello",
+                    "cluster_id": self.ownership.cluster_id,
+                    "shards": self.ownership.shard_ids,
+                    "pid": os.getpid(),
+                })
+                while not listener.done():
+                    await _send(writer, {"op": "metrics", "metrics": self.metrics()})
+                    await asyncio.wait([listener], timeout=self.interval)
+                if listener.result():
+                    return
+            except (ConnectionError, ValueError) as e:
+                logger.debug(f"IPC соединение с координатором потеряно: {e}")
+            finally:
+                listener.cancel()
+                writer.close()
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+    async def _listen(self, reader: asyncio.StreamReader) -> bool:
+        """Вернуть True, если пришла команда остановки"""
+        while True:
+            message = await _receive(reader)
+            if message is None:
+                return False
+            if message.get("op") == "shutdown":
+                logger.info("🛑 Координатор запросил остановку процесса")
+                await self.on_shutdown()
+                return True
+
+
+# Global ownership of the current process (configured from the launcher's environment)
+shard_ownership = ShardOwnership.from_env()
+
+
+def worker_command() -> List[str]:
+    """Команда запуска процесса бота"""
+    return [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")]
@@ -13,3 +13,15 @@ class RecordingException(VerificationBotException):
 class RoleException(VerificationBotException):
     """Raised when role operations fail"""
     pass
+
+class StageTimeoutException(VerificationBotException):
+    """Raised when a verification stage exceeds its deadline"""
+    pass
+
+class ClusterException(VerificationBotException):
+    """Raised when the shard cluster cannot be set up"""
+    pass
+
+class AnalysisWorkerException(VerificationBotException):
+    """Raised when an analysis worker request fails"""
+    pass
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+from config.settings import settings
+from services.verification_history import HistoryAttempt, HistoryPage, VerificationHistory
+from utils.logger import logger
+
+OUTCOME_LABELS = {
+    "completed": "✅ Пройдена",
+    "error": "🚨 Ошибка",
+    "cancelled": "🛑 Отменена",
+    "suspended": "⏸️ Приостановлена",
+    "expired": "⌛ Истекла",
+    "in_progress": "🎙️ Идет",
+}
+
+
+def _answer_line(answer: dict) -> str:
+    parts = [f"Q{answer['question'] + 1}: **{answer['quality']}%**" if answer['quality'] is not None else f"Q{answer['question'] + 1}: без записи"]
+    if answer['duration'] is not None:
+        parts.append(f"{answer['duration']:.1f}/{answer['expected_duration']:.0f}с")
+    if answer['analysis_seconds'] is not None:
+        parts.append(f"анализ {answer['analysis_seconds']:.1f}с")
+    if answer['duplicate_of']:
+        parts.append(f"♻️ <@{answer['duplicate_of']}>")
+    if answer['audio_url']:
+        parts.append(f"[🎧 запись]({answer['audio_url']})")
+    if answer.get('archive_sha256'):
+        parts.append(f"🗄️ `{answer['archive_sha256'][:12]}`")
+    return " • ".join(parts)
+
+
+def _attempt_field(attempt: HistoryAttempt, show_user: bool) -> Tuple[str, str]:
+    name = f"#{attempt.id} {OUTCOME_LABELS.get(attempt.outcome, attempt.outcome)}"
+    if attempt.average_quality is not None:
+        name += f" • {attempt.average_quality:.0f}%"
+
+    header = [f"<t:{int(attempt.started_at)}:f>"]
+    if show_user:
+        header.append(f"<@{attempt.user_id}>")
+    if attempt.duration_seconds is not None:
+        header.append(f"{attempt.duration_seconds:.0f}с")
+    if attempt.resumes:
+        header.append(f"🔁 {attempt.resumes}")
+    lines = [" • ".join(header)]
+    lines.extend(_answer_line(answer) for answer in attempt.answers)
+    if attempt.error:
+        lines.append(f"❌ `{attempt.error[:120]}`")
+    return name, "\n".join(lines)[:1024]
+
+
+def history_embed(page: HistoryPage, page_number: int, user: Optional[discord.abc.User]) -> discord.Embed:
+    """Эмбед страницы истории участника или всей гильдии"""
+    if user is not None:
+        description = f"**{user.mention}** (`{user.id}`) • Попыток: **{page.total}**"
+    else:
+        description = "Последние попытки в гильдии"
+    embed = discord.Embed(
+        title="📜 История верификации",
+        description=description,
+        color=0x3498db,
+        timestamp=datetime.utcnow()
+    )
+    if not page.attempts:
+        embed.add_field(name="Пусто", value="Попыток верификации не найдено", inline=False)
+    for attempt in page.attempts:
+        name, value = _attempt_field(attempt, show_user=user is None)
+        embed.add_field(name=name, value=value, inline=False)
+    embed.set_footer(text=f"Страница {page_number} • @бот history @участник")
+    return embed
+
+
+class HistoryView(discord.ui.View):
+    """Листание истории по курсорам: стек курсоров уже показанных страниц"""
+
+    def __init__(self, history: VerificationHistory, author_id: int, guild_id: int, user: Optional[discord.abc.User], page: HistoryPage):
+        super().__init__(timeout=settings.history_view_timeout)
+        self.history = history
+        self.author_id = author_id
+        self.guild_id = guild_id
+        self.user = user
+        self.page = page
+        self.cursors: List[Optional[Tuple[float, int]]] = [None]
+        self.message: Optional[discord.Message] = None
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.page.next_cursor is None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author_id
+
+    async def _show(self, interaction: discord.Interaction) -> None:
+        self.page = await self.history.page(
+            self.guild_id, self.user.id if self.user else None, self.cursors[-1], settings.history_page_size
+        )
+        self._update_buttons()
+        await interaction.response.edit_message(embed=history_embed(self.page, len(self.cursors), self.user), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        self.cursors.pop()
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        self.cursors.append(self.page.next_cursor)
+        await self._show(interaction)
+
+    async def on_timeout(self) -> None:
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+class HistoryCommands(commands.Cog):
+    """Команда саппортов: история верификаций участника"""
+
+    def __init__(self, history: Optional[VerificationHistory]):
+        self.history = history
+
+    @commands.command(name="history")
+    @commands.guild_only()
+    @commands.has_guild_permissions(kick_members=True)
+    async def history_command(self, ctx: commands.Context, user: Optional[discord.User] = None):
+        """История верификаций участника или последние попытки в гильдии"""
+        if self.history is None:
+            await ctx.reply("📜 История верификаций отключена")
+            return
+
+        started = time.perf_counter()
+        page = await self.history.page(ctx.guild.id, user.id if user else None, None, settings.history_page_size)
+        logger.debug(f"📜 История {user.id if user else ctx.guild.id}: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        view = HistoryView(self.history, ctx.author.id, ctx.guild.id, user, page)
+        view.message = await ctx.reply(embed=history_embed(page, 1, user), view=view)
+
+    async def cog_command_error(self, ctx: commands.Context, error: commands.CommandError):
+        if isinstance(error, commands.MissingPermissions):
+            await ctx.reply("⛔ Команда доступна участникам с правом **Kick Members**")
+        elif isinstance(error, commands.UserInputError):
+            await ctx.reply(f"Использование: `{settings.command_prefix}history [@участник|ID]`")
+        elif not isinstance(error, commands.NoPrivateMessage):
+            logger.error(f"⚠️ Ошибка команды history: {error}")
@@ -2,17 +2,44 @@ import asyncio
 import discord
 from discord.ext import commands
 
+from core.cluster import shard_ownership
+from services.member_resolver import member_resolver
+from services.opus_capture import CaptureVoiceClient
 from services.verification_service import VerificationService
 from utils.logger import logger
+from config.constants import VoiceTransition
 from config.settings import settings
 
+
+def classify_voice_transition(
+    before: discord.VoiceState,
+    after: discord.VoiceState,
+    channel_id: int
+) -> VoiceTransition:
+    """Определить тип перехода относительно канала верификации"""
+    was_inside = before.channel is not None and before.channel.id == channel_id
+    is_inside = after.channel is not None and after.channel.id == channel_id
+
+    if was_inside and is_inside:
+        # mute/deafen/stream и прочие изменения без смены канала
+        return VoiceTransition.STATE_ONLY
+    if is_inside:
+        return VoiceTransition.JOINED if before.channel is None else VoiceTransition.MOVED_IN
+    if was_inside:
+        return VoiceTransition.LEFT if after.channel is None else VoiceTransition.MOVED_OUT
+    return VoiceTransition.UNRELATED
+
+
 class VoiceEventHandler:
     """Обработчик событий голосовых каналов"""
-    
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.verification_service = VerificationService()
-    
+        self.scheduler = self.verification_service.scheduler
+        self.suppressed_events = 0
+        self._joining = set()
+
     async def handle_voice_state_update(
         self,
         member: discord.Member,
@@ -22,52 +49,113 @@ class VoiceEventHandler:
         """Обработка обновления состояния в голосовом канале"""
         if member.bot:
             return
-        
-        if after.channel and after.channel.id == settings.voice_channel_id:
-            await self._handle_user_joined(member, after.channel)
-        
-        if before.channel and before.channel.id == settings.voice_channel_id:
-            await self._handle_user_left(member, before.channel)
-    
+
+        # Сессии гильдии ведет только процесс, владеющий ее шардом
+        if not shard_ownership.owns(member.guild.id):
+            self.suppressed_events += 1
+            return
+
+        transition = classify_voice_transition(before, after, settings.voice_channel_id)
+
+        if transition in (VoiceTransition.STATE_ONLY, VoiceTransition.UNRELATED):
+            self.suppressed_events += 1
+            return
+
+        if transition in (VoiceTransition.JOINED, VoiceTransition.MOVED_IN):
+            # Объект Member из события — единственный источник без полного кэша участников
+            member_resolver.remember(member)
+            self._schedule_join(member, after.channel)
+        else:
+            await self._on_user_left(member, before.channel)
+
+    def _schedule_join(self, member: discord.Member, channel: discord.VoiceChannel):
+        """Подтвердить вход только если участник не ушел за окно дебаунса"""
+        self.scheduler.cancel_key(("join", member.id))
+        # Кто-то вошел — отложенное отключение бота больше не нужно
+        self.scheduler.cancel_key(("disconnect", member.guild.id))
+        self.scheduler.schedule(
+            settings.voice_debounce_seconds, self._handle_user_joined, member, channel,
+            key=("join", member.id)
+        )
+
+    async def _on_user_left(self, member: discord.Member, channel: discord.VoiceChannel):
+        self._joining.discard(member.id)
+        if self.scheduler.cancel_key(("join", member.id)):
+            # Вход не успел подтвердиться — это «дребезг», сессия не начиналась
+            self.suppressed_events += 1
+            logger.debug(f"〰️ Пропущен кратковременный вход {member.display_name}")
+        await self._handle_user_left(member, channel)
+
     async def _handle_user_joined(self, member: discord.Member, channel: discord.VoiceChannel):
         """Обработка подключения пользователя к каналу верификации"""
+        self._joining.add(member.id)
         try:
             voice_client = discord.utils.get(self.bot.voice_clients, guild=member.guild)
             text_channel = self.bot.get_channel(settings.text_channel_id)
-            
+
             if not text_channel:
                 logger.error(f"❌ Текстовый канал с ID {settings.text_channel_id} не найден.")
                 return
-            
+
+            # Повторный вход уже верифицированного участника — без подключения и интервью
+            if await self.verification_service.restore_verified(member, text_channel):
+                return
+
             if not voice_client:
-                voice_client = await channel.connect()
+                voice_client = await channel.connect(cls=CaptureVoiceClient)
                 await asyncio.sleep(1)
                 logger.info(f"🔊 Бот подключился к голосовому каналу: #{channel.name}")
-            
+
+            if member.id not in self._joining:
+                # Пользователь ушел, пока бот подключался
+                return
+
             logger.info(f"🟢 Пользователь {member.display_name} присоединился к каналу верификации.")
-            
+
             await self.verification_service.start_verification(
                 member, voice_client, text_channel
             )
-            
+
         except Exception as e:
             logger.error(f"💥 Ошибка при подключении пользователя {member.display_name}: {e}")
-    
+        finally:
+            self._joining.discard(member.id)
+
     async def _handle_user_left(self, member: discord.Member, channel: discord.VoiceChannel):
         """Обработка выхода пользователя из канала верификации"""
         try:
+            # Останавливаем запись, анализ и таймеры сразу; прогресс сохраняется для возврата
             voice_client = discord.utils.get(self.bot.voice_clients, guild=member.guild)
+            self.verification_service.suspend_session(
+                member.id, voice_client, self.bot.get_channel(settings.text_channel_id)
+            )
+
             if not voice_client or not voice_client.is_connected():
                 return
-            
-            human_members = [m for m in channel.members if not m.bot]
-            
+
             logger.info(f"🔴 Пользователь {member.display_name} покинул канал верификации.")
-            
-            if len(human_members) == 0:
-                self.verification_service.cleanup_session(member.id)
-                await voice_client.disconnect()
-                logger.info(f"🔌 Бот отключился от голосового канала: #{channel.name} (канал пуст)")
-                
+
+            if not any(not m.bot for m in channel.members):
+                # Отключаемся с задержкой, чтобы быстрый перезаход не вызывал переподключение
+                self.scheduler.schedule(
+                    settings.voice_debounce_seconds, self._disconnect_if_empty, member.guild, channel,
+                    key=("disconnect", member.guild.id)
+                )
+
         except Exception as e:
             logger.error(f"⚠️ Ошибка при выходе пользователя {member.display_name}: {e}")
+
+    async def _disconnect_if_empty(self, guild: discord.Guild, channel: discord.VoiceChannel):
+        """Отключить бота, если канал все еще пуст"""
+        try:
+            voice_client = discord.utils.get(self.bot.voice_clients, guild=guild)
+            if not voice_client or not voice_client.is_connected():
+                return
+            if any(not m.bot for m in channel.members):
+                return
+
+            await voice_client.disconnect()
+            logger.info(f"🔌 Бот отключился от голосового канала: #{channel.name} (канал пуст)")
+
+        except Exception as e:
+            logger.error(f"⚠️ Ошибка при отключении от канала #{channel.name}: {e}")
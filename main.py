@@ -10,14 +10,18 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 from core.bot import VerificationBot
+from core.cluster import shard_ownership
 from utils.logger import logger
 
 def main():
     """Main entry point"""
     logger.info("Запуск бота голосовой верификации Discord...")
     
-    # Create and run bot
-    bot = VerificationBot()
+    # Create and run bot (inside a cluster the launcher assigns the shard range)
+    if shard_ownership.clustered:
+        bot = VerificationBot(shard_ownership.shard_ids, shard_ownership.shard_count)
+    else:
+        bot = VerificationBot()
     bot.run_bot()
 
 if __name__ == "__main__":
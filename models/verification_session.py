@@ -1,6 +1,7 @@
+import asyncio
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, timezone
+from typing import Dict, Optional, List
 import discord
 from config.constants import VerificationStatus
 
@@ -14,6 +15,10 @@ class VerificationSession:
     start_time: datetime = field(default_factory=datetime.utcnow)
     completed_questions: List[str] = field(default_factory=list)
     audio_files: List[str] = field(default_factory=list)
+    results: Dict[int, dict] = field(default_factory=dict)
+    pending: List[asyncio.Task] = field(default_factory=list, repr=False)
+    resumes: int = 0
+    resumed_at: Optional[datetime] = None
     
     @property
     def is_completed(self) -> bool:
@@ -22,11 +27,49 @@ class VerificationSession:
     @property
     def is_in_progress(self) -> bool:
         return self.status == VerificationStatus.IN_PROGRESS
+
+    @property
+    def is_suspended(self) -> bool:
+        return self.status == VerificationStatus.SUSPENDED
+
+    @property
+    def started_timestamp(self) -> float:
+        """Session start as unix time (start_time is naive UTC)"""
+        return self.start_time.replace(tzinfo=timezone.utc).timestamp()
+
+    @property
+    def active_since(self) -> datetime:
+        """Start of the current run (after the last resume)"""
+        return self.resumed_at or self.start_time
+
+    def first_unanswered(self, total_questions: int) -> int:
+        """Index of the first question without a processed answer"""
+        return next((i for i in range(total_questions) if i not in self.results), total_questions)
     
     def next_question(self) -> None:
         """Move to the next question"""
         self.current_question_index += 1
     
+    def record_result(self, question_index: int, result: dict) -> None:
+        """Attach the post-processing result of an answer"""
+        self.results[question_index] = result
+
+    @property
+    def average_quality(self) -> Optional[float]:
+        scores = [r['quality'] for r in self.results.values() if r.get('quality') is not None]
+        return sum(scores) / len(scores) if scores else None
+
+    def suspend(self, total_questions: int) -> None:
+        """Pause the session; it continues from the first unanswered question"""
+        self.status = VerificationStatus.SUSPENDED
+        self.current_question_index = self.first_unanswered(total_questions)
+        self.pending.clear()
+
+    def resume(self) -> None:
+        self.status = VerificationStatus.IN_PROGRESS
+        self.resumes += 1
+        self.resumed_at = datetime.utcnow()
+
     def complete(self) -> None:
         """Mark session as completed"""
         self.status = VerificationStatus.COMPLETED
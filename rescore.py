@@ -0,0 +1,83 @@
+"""
+Batch re-scoring of archived answers
+Runs archived recordings through the current analysis and scoring in a process pool
+and compares the new scores with the ones stored in the archive manifest
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent))
+
+from config.settings import settings
+from services.audio_features import HAS_NUMPY
+from services.recording_archive import MANIFEST_NAME
+from utils.logger import console, logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересчет оценок архивных ответов текущей версией анализа")
+    parser.add_argument("--archive-dir", default=settings.archive_dir, help="Каталог архива записей")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессов анализа")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Файлов на одну задачу пула")
+    parser.add_argument("--guild", type=int, help="Только эта гильдия")
+    parser.add_argument("--user", type=int, help="Только этот пользователь")
+    parser.add_argument("--question", type=int, help="Только этот вопрос (с 1)")
+    parser.add_argument("--days", type=float, help="Только записи за последние N дней")
+    parser.add_argument("--limit", type=int, help="Не больше N записей")
+    parser.add_argument("--pass-threshold", type=int, default=50, help="Порог прохождения для подсчета смен решения")
+    parser.add_argument("--no-passphrase", action="store_true", help="Не проверять фразу по эталонам")
+    parser.add_argument("--top", type=int, default=10, help="Сколько крупнейших изменений показать")
+    parser.add_argument("--output", help="CSV с оценками по каждой записи")
+    parser.add_argument("--verbose", action="store_true", help="Показывать логи анализа")
+    return parser.parse_args()
+
+
+def main():
+    """Re-scoring entry point"""
+    args = parse_args()
+    if not HAS_NUMPY:
+        sys.exit("❌ Для пересчета нужен numpy")
+    if not args.verbose:
+        logger.logger.setLevel(logging.WARNING)
+
+    from services.rescoring import load_manifest, render_report, rescore, write_csv
+
+    if not os.path.exists(os.path.join(args.archive_dir, MANIFEST_NAME)):
+        sys.exit(f"❌ Манифест архива не найден в {args.archive_dir}")
+
+    recordings = load_manifest(
+        args.archive_dir,
+        guild_id=args.guild,
+        user_id=args.user,
+        question=args.question - 1 if args.question else None,
+        since=time.time() - args.days * 24 * 3600 if args.days else None,
+        limit=args.limit,
+    )
+    if not recordings:
+        console.print("Нет записей по заданным фильтрам")
+        return
+
+    console.print(f"🔁 Записей: {len(recordings)}, процессов: {args.workers}")
+    report = rescore(
+        args.archive_dir,
+        recordings,
+        workers=max(1, args.workers),
+        chunk_size=max(1, args.chunk_size),
+        passphrases=not args.no_passphrase,
+        pass_threshold=args.pass_threshold,
+    )
+    for table in render_report(report, args.top):
+        console.print(table)
+    if args.output:
+        write_csv(report, args.output)
+        console.print(f"💾 Сравнение сохранено в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
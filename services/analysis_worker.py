@@ -0,0 +1,349 @@
+import asyncio
+import itertools
+import json
+import os
+import struct
+import time
+import wave
+from typing import Awaitable, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from core.exceptions import AnalysisWorkerException
+from services.audio_analysis import AudioAnalyzer
+from services.audio_buffers import MB
+from services.audio_features import read_wav_pcm
+from services.shared_pcm import SHM_DIR, PcmHandle, attach_segment, pcm_pool, segment_owner
+from utils.helpers import pid_alive
+from utils.logger import logger
+
+# Кадр: magic, тип, длина JSON метаданных, длина PCM; затем метаданные и PCM.
+# Для локальных воркеров PCM не передается: в метаданных имя сегмента разделяемой памяти.
+FRAME_MAGIC = b"VBA1"
+FRAME_HEADER = struct.Struct("!4sBII")
+MAX_METADATA_BYTES = 1 * MB
+MAX_PAYLOAD_BYTES = 64 * MB
+
+MSG_ANALYZE = 1
+MSG_RESULT = 2
+MSG_ERROR = 3
+MSG_PING = 4
+MSG_PONG = 5
+
+
+def encode_frame(msg_type: int, metadata: dict, payload: bytes = b"") -> bytes:
+    meta = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(FRAME_MAGIC, msg_type, len(meta), len(payload)) + meta + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, dict, bytes]:
+    header = await reader.readexactly(FRAME_HEADER.size)
+    magic, msg_type, meta_length, payload_length = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC:
+        raise AnalysisWorkerException(f"Неверная сигнатура кадра: {magic!r}")
+    if meta_length > MAX_METADATA_BYTES or payload_length > MAX_PAYLOAD_BYTES:
+        raise AnalysisWorkerException(f"Кадр слишком большой: {meta_length}+{payload_length} байт")
+    metadata = json.loads(await reader.readexactly(meta_length)) if meta_length else {}
+    payload = await reader.readexactly(payload_length) if payload_length else b""
+    return msg_type, metadata, payload
+
+
+def parse_endpoint(endpoint: str) -> Tuple[str, str, Optional[int]]:
+    """'unix:/path' или 'tcp:host:port' → (вид, адрес, порт)"""
+    kind, _, address = endpoint.partition(":")
+    if kind == "unix" and address:
+        return "unix", address, None
+    if kind == "tcp":
+        host, _, port = address.rpartition(":")
+        if host and port.isdigit():
+            return "tcp", host, int(port)
+    raise AnalysisWorkerException(f"Некорректный адрес воркера анализа: {endpoint!r}")
+
+
+async def open_endpoint(endpoint: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, address, port = parse_endpoint(endpoint)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(address, port)
+
+
+def is_local_endpoint(endpoint: str) -> bool:
+    kind, address, _ = parse_endpoint(endpoint)
+    return kind == "unix" or address in ("127.0.0.1", "localhost", "::1")
+
+
+class AnalysisWorkerServer:
+    """Демон анализа: принимает PCM по сокету и возвращает результат AudioAnalyzer"""
+
+    def __init__(self, endpoint: str, concurrency: int):
+        self.endpoint = endpoint
+        self.analyzer = AudioAnalyzer()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._segments = {}
+
+    async def serve_forever(self) -> None:
+        kind, address, port = parse_endpoint(self.endpoint)
+        if kind == "unix":
+            if os.path.exists(address):
+                os.unlink(address)
+            server = await asyncio.start_unix_server(self._handle_connection, path=address)
+        else:
+            server = await asyncio.start_server(self._handle_connection, address, port)
+        logger.info(f"🧮 Воркер анализа слушает {self.endpoint}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close_segments()
+            if kind == "unix" and os.path.exists(address):
+                os.unlink(address)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                msg_type, metadata, payload = await read_frame(reader)
+                if msg_type == MSG_PING:
+                    writer.write(encode_frame(MSG_PONG, self.stats()))
+                elif msg_type == MSG_ANALYZE:
+                    writer.write(await self._analyze(metadata, payload))
+                else:
+                    writer.write(encode_frame(MSG_ERROR, {'error': f"unknown message type {msg_type}"}))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        except (ConnectionError, AnalysisWorkerException, ValueError) as e:
+            logger.debug(f"Соединение с клиентом анализа закрыто: {e}")
+        finally:
+            writer.close()
+
+    async def _analyze(self, metadata: dict, payload: bytes) -> bytes:
+        self.in_flight += 1
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                if 'shm' in metadata:
+                    result = await self._analyze_shared_pcm(metadata)
+                else:
+                    result = await self._analyze_pcm(metadata, payload)
+                result['analysis_seconds'] = time.perf_counter() - started
+            self.completed += 1
+            return encode_frame(MSG_RESULT, result)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"❌ Ошибка анализа в воркере: {e}")
+            return encode_frame(MSG_ERROR, {'error': str(e)})
+        finally:
+            self.in_flight -= 1
+
+    def _analyze_pcm(self, metadata: dict, pcm) -> Awaitable[dict]:
+        return self.analyzer.analyze_pcm(
+            pcm, metadata['channels'], metadata['sample_width'], metadata['sample_rate'],
+            metadata['expected_duration'], metadata.get('network'), metadata.get('question')
+        )
+
+    async def _analyze_shared_pcm(self, metadata: dict) -> dict:
+        """Анализ прямо из сегмента разделяемой памяти, без копии и временного файла"""
+        name, offset, size = metadata['shm'], metadata['offset'], metadata['size']
+        self._prune_segments()
+        segment = self._segments.get(name)
+        # Отдельный сегмент одного ответа после анализа больше не нужен
+        dedicated = False
+        if segment is None:
+            segment = attach_segment(name)
+            dedicated = offset == 0 and segment.size == size
+            if not dedicated:
+                self._segments[name] = segment
+        try:
+            if offset + size > segment.size:
+                raise AnalysisWorkerException(f"Диапазон {offset}+{size} вне сегмента {segment.name}")
+            with segment.buf[offset:offset + size] as view:
+                return await self._analyze_pcm(metadata, view)
+        finally:
+            if dedicated:
+                segment.close()
+
+    def _prune_segments(self) -> None:
+        """Закрыть сегменты пулов, которых больше нет: процесс бота завершился или удалил сегмент"""
+        for name, segment in list(self._segments.items()):
+            owner = segment_owner(name)
+            if owner is not None and pid_alive(owner) and os.path.exists(os.path.join(SHM_DIR, name)):
+                continue
+            try:
+                segment.close()
+            except BufferError:
+                # Сегмент еще читает другой анализ — закроем при следующем запросе
+                continue
+            del self._segments[name]
+            logger.debug(f"Сегмент PCM {name} закрыт: пул бота больше не существует")
+
+    def close_segments(self) -> None:
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+    def stats(self) -> dict:
+        return {'in_flight': self.in_flight, 'completed': self.completed, 'failed': self.failed}
+
+
+class WorkerEndpoint:
+    """Состояние одного воркера на стороне клиента"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.local = is_local_endpoint(endpoint)
+        self.in_flight = 0
+        self.down_until = 0.0
+        self.completed = 0
+        self.failures = 0
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    async def acquire(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        return await open_endpoint(self.endpoint)
+
+    def release(self, connection: Tuple[asyncio.StreamReader, asyncio.StreamWriter]) -> None:
+        self._idle.append(connection)
+
+    def mark_down(self, retry_seconds: float) -> None:
+        self.failures += 1
+        self.down_until = time.monotonic() + retry_seconds
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+class AnalysisClient:
+    """Клиент воркеров анализа с балансировкой по числу запросов в работе
+
+    Недоступный воркер исключается на analysis_worker_retry_seconds; если
+    не отвечает ни один, анализ выполняется в текущем процессе.
+    """
+
+    def __init__(self, endpoints: List[str]):
+        self.endpoints = [WorkerEndpoint(endpoint) for endpoint in endpoints]
+        self.local = AudioAnalyzer()
+        self.local_fallbacks = 0
+        self._round_robin = itertools.count()
+
+    def _candidates(self) -> List[WorkerEndpoint]:
+        available = [endpoint for endpoint in self.endpoints if endpoint.available]
+        if not available:
+            return []
+        # Наименее загруженный первым; при равной загрузке — по кругу
+        offset = next(self._round_robin) % len(available)
+        rotated = available[offset:] + available[:offset]
+        return sorted(rotated, key=lambda endpoint: endpoint.in_flight)
+
+    async def analyze(
+        self,
+        filepath: str,
+        expected_duration: int,
+        network: Optional[dict] = None,
+        pcm_handle: Optional[PcmHandle] = None,
+        question: Optional[str] = None
+    ) -> dict:
+        """pcm_handle — тот же ответ в разделяемой памяти; локальным воркерам передается только ссылка"""
+        candidates = self._candidates()
+        params, pcm = None, None
+        if candidates and pcm_handle is None:
+            try:
+                params, pcm = await asyncio.get_running_loop().run_in_executor(None, read_wav_pcm, filepath)
+            except (OSError, EOFError, wave.Error) as e:
+                logger.debug(f"Не удалось прочитать WAV для воркера: {e}")
+                candidates = []
+
+        for endpoint in candidates:
+            shared = None
+            if pcm_handle is None:
+                metadata, payload = dict(params), pcm
+            elif endpoint.local:
+                metadata, payload, shared = pcm_handle.to_metadata(), b"", pcm_handle
+            else:
+                metadata, payload = pcm_handle.params(), pcm_pool.read(pcm_handle)
+            metadata.update(expected_duration=expected_duration, network=network, question=question)
+            try:
+                result = await self._request(endpoint, metadata, payload, shared)
+            except (OSError, asyncio.IncompleteReadError, AnalysisWorkerException, ValueError) as e:
+                endpoint.mark_down(settings.analysis_worker_retry_seconds)
+                logger.warning(f"⚠️ Воркер анализа {endpoint.endpoint} недоступен: {e}")
+                continue
+            if result is None:
+                # Воркер доступен, но анализ упал — повторяем локально
+                break
+            result['analysis_worker'] = endpoint.endpoint
+            return result
+
+        if self.endpoints:
+            self.local_fallbacks += 1
+        return await self.local.analyze_file(filepath, expected_duration, network, question)
+
+    async def _request(
+        self, endpoint: WorkerEndpoint, metadata: dict, pcm: bytes, shared: Optional[PcmHandle] = None
+    ) -> Optional[dict]:
+        """Результат воркера или None, если анализ в воркере завершился ошибкой
+
+        shared — ответ в разделяемой памяти, который воркер читает сам. Если
+        ожидание отменено (дедлайн стадии), обмен доводится до ответа или
+        разрыва соединения: до этого аренда не отдает память новому ответу.
+        """
+        endpoint.in_flight += 1
+        if shared is not None:
+            pcm_pool.pin(shared)
+        exchange = asyncio.ensure_future(self._exchange(endpoint, metadata, pcm))
+
+        def _finished(task: asyncio.Task) -> None:
+            endpoint.in_flight -= 1
+            if shared is not None:
+                pcm_pool.unpin(shared)
+            if not task.cancelled() and task.exception() is not None:
+                logger.debug(f"Обмен с воркером {endpoint.endpoint} завершился ошибкой: {task.exception()}")
+
+        exchange.add_done_callback(_finished)
+        return await asyncio.shield(exchange)
+
+    async def _exchange(self, endpoint: WorkerEndpoint, metadata: dict, pcm: bytes) -> Optional[dict]:
+        connection = None
+        try:
+            connection = await endpoint.acquire()
+            reader, writer = connection
+            writer.write(encode_frame(MSG_ANALYZE, metadata, pcm))
+            await writer.drain()
+            msg_type, result, _ = await read_frame(reader)
+            if msg_type == MSG_ERROR:
+                # Ошибка анализа, а не транспорта: соединение можно переиспользовать
+                endpoint.release(connection)
+                connection = None
+                logger.warning(f"⚠️ Воркер {endpoint.endpoint} не смог проанализировать запись: {result.get('error')}")
+                return None
+            if msg_type != MSG_RESULT:
+                raise AnalysisWorkerException(f"Неожиданный тип ответа {msg_type}")
+            endpoint.release(connection)
+            connection = None
+            endpoint.completed += 1
+            return result
+        finally:
+            if connection is not None:
+                connection[1].close()
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {
+            endpoint.endpoint: {
+                'in_flight': endpoint.in_flight,
+                'completed': endpoint.completed,
+                'failures': endpoint.failures,
+                'available': endpoint.available,
+            }
+            for endpoint in self.endpoints
+        }
+        stats['shared_pcm'] = pcm_pool.stats()
+        return stats
@@ -0,0 +1,661 @@
+import asyncio
+import math
+import os
+import struct
+import tempfile
+import wave
+from typing import Dict, Optional, Tuple
+
+from config.settings import settings
+from services.audio_buffers import WAV_HEADER_BYTES
+from services.audio_features import AudioFeatures, extract_features_and_signal, pcm_to_mono, read_wav_pcm, signal_at_rate
+from services.fingerprint import FINGERPRINT_RATE, landmark_hashes
+from services.passphrase import MATCH_RATE, PassphraseMatcher
+from utils.helpers import run_process
+from utils.logger import logger
+
+try:
+    import librosa
+    import numpy as np
+    HAS_LIBROSA = True
+except ImportError:
+    HAS_LIBROSA = False
+    librosa = None
+    np = None  # Добавь это, чтобы избежать NameError
+
+try:
+    from pydub import AudioSegment
+    HAS_PYDUB = True
+except ImportError:
+    HAS_PYDUB = False
+
+
+class AudioAnalyzer:
+    """Анализ записанного ответа и расчет оценки качества
+
+    Используется в процессе бота как запасной вариант и внутри воркеров анализа.
+    """
+
+    def __init__(self):
+        # Эталоны фраз загружаются один раз при старте процесса
+        self.passphrases = PassphraseMatcher(settings.passphrase_templates)
+
+    async def _convert_to_pcm16(self, input_path: str, output_path: str) -> bool:
+        """Конвертировать аудио в моно PCM16 с помощью ffmpeg, сохраняя исходную частоту"""
+        try:
+            returncode, _, _ = await run_process(
+                "ffmpeg", "-y", "-i", input_path,
+                "-ac", "1", "-sample_fmt", "s16",
+                output_path,
+                timeout=settings.stage_timeouts["subprocess"]
+            )
+            return returncode == 0
+        except Exception as e:
+            logger.warning(f"FFmpeg conversion failed: {e}")
+            return False
+
+    def _interpret_rms(self, rms: float) -> Tuple[str, str, int]:
+        """Интерпретировать RMS значение в удобочитаемый формат"""
+        if rms <= 0.0:
+            return "0.0000", "🔴 Тишина", 5
+        
+        try:
+            db = 20 * math.log10(rms + 1e-10)  # dBFS громкость
+            rms_str = f"{rms:.4f}"
+            
+            if db < -40:
+                return rms_str, "🔴 Очень тихо", 15
+            elif db < -30:
+                return rms_str, "🟡 Тихо", 35
+            elif db < -20:
+                return rms_str, "🟢 Нормально", 70
+            elif db < -10:
+                return rms_str, "🟢 Громко", 85
+            else:
+                return rms_str, "🟦 Очень громко", 90
+        except Exception:
+            return f"{rms:.4f}", "🟡 Неопределенно", 50
+
+    async def _analyze_with_librosa(self, file_path: str) -> Dict:
+        """Анализ аудио с помощью librosa (наиболее точный)"""
+        # Создаем временный файл для конвертации
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
+            temp_path = tmp_file.name
+
+        try:
+            # Конвертируем в совместимый формат
+            if not await self._convert_to_pcm16(file_path, temp_path):
+                raise Exception("FFmpeg conversion failed")
+
+            # Загружаем аудио
+            y, sr = librosa.load(temp_path, sr=None, mono=True)
+            
+            # Вычисляем метрики
+            duration = len(y) / sr
+            rms = float(librosa.feature.rms(y=y).mean())
+            
+            return {
+                'duration': duration,
+                'sample_rate': sr,
+                'rms': rms,
+                'method': 'librosa'
+            }
+            
+        except Exception as e:
+            raise Exception(f"Librosa analysis failed: {e}")
+        finally:
+            # Очищаем временный файл, в том числе при отмене сессии
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    async def _analyze_with_pydub(self, file_path: str) -> Dict:
+        """Анализ аудио с помощью pydub (средний уровень точности)"""
+        try:
+            # Пытаемся загрузить напрямую
+            try:
+                audio = AudioSegment.from_wav(file_path)
+            except Exception:
+                # Если не получается, конвертируем через ffmpeg
+                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
+                    temp_path = tmp_file.name
+                
+                try:
+                    if not await self._convert_to_pcm16(file_path, temp_path):
+                        raise Exception("FFmpeg conversion failed")
+                    audio = AudioSegment.from_wav(temp_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.unlink(temp_path)
+
+            duration = len(audio) / 1000.0  # в секундах
+            sample_rate = audio.frame_rate
+            
+            # Простой расчет RMS
+            samples = audio.get_array_of_samples()
+            if len(samples) > 0:
+                rms = math.sqrt(sum(x*x for x in samples) / len(samples)) / 32768.0
+            else:
+                rms = 0.0
+
+            return {
+                'duration': duration,
+                'sample_rate': sample_rate,
+                'rms': rms,
+                'method': 'pydub'
+            }
+            
+        except Exception as e:
+            raise Exception(f"Pydub analysis failed: {e}")
+
+    async def _analyze_with_ffprobe(self, file_path: str) -> Dict:
+        """Анализ аудио с помощью ffprobe (базовый уровень)"""
+        try:
+            # Получаем информацию о файле
+            returncode, stdout, stderr = await run_process(
+                "ffprobe", "-v", "quiet", "-print_format", "json",
+                "-show_format", "-show_streams", file_path,
+                timeout=settings.stage_timeouts["subprocess"],
+                capture_output=True
+            )
+            
+            if returncode != 0:
+                raise Exception(f"ffprobe failed: {stderr.decode()}")
+            
+            import json
+            data = json.loads(stdout.decode())
+            
+            duration = 0.0
+            sample_rate = 48000
+            
+            # Извлекаем информацию о формате
+            if 'format' in data and 'duration' in data['format']:
+                duration = float(data['format']['duration'])
+            
+            # Извлекаем информацию о потоке
+            if 'streams' in data and len(data['streams']) > 0:
+                stream = data['streams'][0]
+                if 'sample_rate' in stream:
+                    sample_rate = int(stream['sample_rate'])
+            
+            # Оценка RMS на основе размера файла (очень приблизительно)
+            file_size = os.path.getsize(file_path)
+            estimated_rms = min(0.1, max(0.001, file_size / (duration * 100000))) if duration > 0 else 0.001
+
+            return {
+                'duration': duration,
+                'sample_rate': sample_rate,
+                'rms': estimated_rms,
+                'method': 'ffprobe'
+            }
+            
+        except Exception as e:
+            raise Exception(f"FFprobe analysis failed: {e}")
+
+    @staticmethod
+    def _default_result(network: Optional[dict]) -> dict:
+        return {
+            'duration': 0.0,
+            'file_size_kb': 0.0,
+            'avg_volume': 0,
+            'sample_rate': 48000,
+            'quality': 5,
+            'quality_emoji': '🔴',
+            'quality_color': 0xe74c3c,
+            'channels': 2,
+            'sample_width': 2,
+            'analysis_method': 'fallback',
+            'network': network
+        }
+
+    async def analyze_file(self, filepath: str, expected_duration: int, network: Optional[dict] = None, question: Optional[str] = None) -> dict:
+        """Улучшенный анализ аудиофайла с каскадным подходом
+
+        network — RTP статистика записи; учитывается в оценке отдельным измерением.
+        question — текст вопроса; если для него есть эталоны фразы, ответ сверяется с ними.
+        """
+        
+        # Базовые значения по умолчанию
+        result = self._default_result(network)
+        
+        try:
+            # Проверка существования файла
+            if not os.path.exists(filepath):
+                logger.warning(f"Audio file not found: {filepath}")
+                return result
+                
+            file_size = os.path.getsize(filepath)
+            result['file_size_kb'] = file_size / 1024
+            
+            # Проверка минимального размера
+            if file_size < 1024:  # Меньше 1KB
+                logger.warning(f"Audio file too small: {file_size} bytes")
+                result['quality'] = 10
+                return result
+            
+            # Каскадный анализ: пробуем методы от лучшего к худшему
+            analysis_result = None
+
+            # 0. Один проход по кадрам PCM на родной частоте записи: без ffmpeg и декодеров
+            try:
+                params, pcm = await asyncio.get_running_loop().run_in_executor(None, read_wav_pcm, filepath)
+                analysis_result = await self._analyze_signal(
+                    result, pcm, params['channels'], params['sample_width'], params['sample_rate'], question
+                )
+            except (OSError, EOFError, wave.Error) as e:
+                logger.debug(f"WAV read failed: {e}")
+
+            # 1. Пробуем librosa (самый точный из декодеров)
+            if not analysis_result and HAS_LIBROSA:
+                try:
+                    logger.debug("Trying librosa analysis...")
+                    analysis_result = await self._analyze_with_librosa(filepath)
+                    logger.info("✅ Librosa analysis successful")
+                except Exception as e:
+                    logger.debug(f"Librosa failed: {e}")
+            
+            # 2. Пробуем pydub (средний уровень)
+            if not analysis_result and HAS_PYDUB:
+                try:
+                    logger.debug("Trying pydub analysis...")
+                    analysis_result = await self._analyze_with_pydub(filepath)
+                    logger.info("✅ Pydub analysis successful")
+                except Exception as e:
+                    logger.debug(f"Pydub failed: {e}")
+            
+            # 3. Пробуем ffprobe (базовый уровень)
+            if not analysis_result:
+                try:
+                    logger.debug("Trying ffprobe analysis...")
+                    analysis_result = await self._analyze_with_ffprobe(filepath)
+                    logger.info("✅ FFprobe analysis successful")
+                except Exception as e:
+                    logger.debug(f"FFprobe failed: {e}")
+            
+            # Если все методы не сработали, используем fallback
+            if not analysis_result:
+                logger.warning("All analysis methods failed, using fallback estimation")
+                result.update(self._estimate_audio_properties(filepath, file_size))
+                result['analysis_method'] = 'fallback_estimation'
+
+            self._finish(result, analysis_result, expected_duration)
+            
+        except Exception as e:
+            logger.error(f"❌ Complete audio analysis failure: {e}")
+            # Аварийный fallback
+            result['duration'] = max(1.0, expected_duration * 0.5)
+            result['quality'] = 25
+            result['analysis_method'] = 'emergency_fallback'
+            
+        return result
+
+    async def analyze_pcm(
+        self,
+        pcm,
+        channels: int,
+        sample_width: int,
+        sample_rate: int,
+        expected_duration: int,
+        network: Optional[dict] = None,
+        question: Optional[str] = None
+    ) -> dict:
+        """Анализ PCM ответа без файла: буфер разделяемой памяти или данные из сокета
+
+        Оценка та же, что у analyze_file для WAV файла с этими данными.
+        """
+        result = self._default_result(network)
+        try:
+            # Размер как у WAV файла ответа: от него зависит оценка
+            file_size = len(pcm) + WAV_HEADER_BYTES
+            result['file_size_kb'] = file_size / 1024
+            if file_size < 1024:
+                logger.warning(f"Audio data too small: {file_size} bytes")
+                result['quality'] = 10
+                return result
+
+            analysis_result = await self._analyze_signal(result, pcm, channels, sample_width, sample_rate, question)
+            if not analysis_result:
+                logger.warning("Feature extraction failed, using fallback estimation")
+                result.update(self._estimate_audio_properties("", file_size))
+                result['analysis_method'] = 'fallback_estimation'
+
+            self._finish(result, analysis_result, expected_duration)
+
+        except Exception as e:
+            logger.error(f"❌ Complete audio analysis failure: {e}")
+            result['duration'] = max(1.0, expected_duration * 0.5)
+            result['quality'] = 25
+            result['analysis_method'] = 'emergency_fallback'
+
+        return result
+
+    def _signal_pass(self, pcm, channels: int, sample_width: int, sample_rate: int, question: Optional[str]) -> Tuple[AudioFeatures, Optional[dict], Optional[list]]:
+        """Признаки, проверка фразы и хэши отпечатка по одному PCM (блокирующий вызов, для executor)
+
+        Фраза и отпечаток считаются по сигналу прохода признаков, а не по
+        повторно прочитанному файлу.
+        """
+        features, mono, rate = extract_features_and_signal(pcm, channels, sample_width, sample_rate)
+        passphrase = hashes = None
+        if mono is None:
+            return features, passphrase, hashes
+        def at_rate(target_rate: int):
+            signal = signal_at_rate(mono, rate, target_rate)
+            if signal is None:
+                # Частота признаков не кратна нужной — понижаем исходный PCM
+                signal = pcm_to_mono(pcm, channels, sample_width, sample_rate, target_rate)[0]
+            return signal
+
+        if self.passphrases.has_templates(question):
+            passphrase = self.passphrases.match_signal(at_rate(MATCH_RATE), MATCH_RATE, question)
+        if settings.fingerprint_enabled:
+            hashes = landmark_hashes(at_rate(FINGERPRINT_RATE), FINGERPRINT_RATE)
+        return features, passphrase, hashes
+
+    async def _analyze_signal(self, result: dict, pcm, channels: int, sample_width: int, sample_rate: int, question: Optional[str]) -> Optional[Dict]:
+        try:
+            features, passphrase, hashes = await asyncio.get_running_loop().run_in_executor(
+                None, self._signal_pass, pcm, channels, sample_width, sample_rate, question
+            )
+        except ValueError as e:
+            logger.debug(f"Feature extraction failed: {e}")
+            return None
+        result['features'] = features.to_dict()
+        if passphrase:
+            result['passphrase'] = passphrase
+        if hashes is not None:
+            # Хэши отпечатка сверяет с индексом процесс бота
+            result['fingerprint'] = hashes
+        return {
+            'duration': features.duration,
+            'sample_rate': features.sample_rate,
+            'rms': features.rms,
+            'method': f"features_{features.method}"
+        }
+
+    def _finish(self, result: dict, analysis_result: Optional[Dict], expected_duration: int) -> None:
+        if analysis_result:
+            # Обновляем результат данными анализа
+            result['duration'] = analysis_result['duration']
+            result['sample_rate'] = analysis_result['sample_rate']
+            result['avg_volume'] = int(analysis_result['rms'] * 10000)  # Приводим к интегральному RMS
+            result['analysis_method'] = analysis_result['method']
+
+        # Интерпретируем RMS
+        rms_str, rms_label, rms_quality = self._interpret_rms(analysis_result['rms'] if analysis_result else 0.001)
+        result['rms_string'] = rms_str
+        result['rms_label'] = rms_label
+        
+        # Вычисляем качество
+        result.update(self._calculate_quality_metrics(result, expected_duration))
+        
+        logger.info(f"🎵 Audio analysis complete: {result['duration']:.1f}s, {result['quality']}%, method: {result['analysis_method']}")
+
+    def _estimate_volume_from_file_size(self, file_size: int, duration: float, expected_duration: int) -> int:
+        """Улучшенная оценка громкости с учетом ожидаемой длительности"""
+        if duration <= 0:
+            return 800 if expected_duration <= 3 else 1000
+        
+        bytes_per_second = file_size / duration
+        
+        # Адаптивные пороги в зависимости от ожидаемой длительности
+        if expected_duration <= 3:
+            # Для коротких ответов более мягкие требования
+            if bytes_per_second < 30000:
+                return 400
+            elif bytes_per_second < 60000:
+                return 1000
+            elif bytes_per_second < 100000:
+                return 2000
+            else:
+                return 3500
+        else:
+            # Для длинных ответов стандартные требования
+            if bytes_per_second < 50000:
+                return 500
+            elif bytes_per_second < 100000:
+                return 1500
+            elif bytes_per_second < 150000:
+                return 3000
+            else:
+                return 5000
+
+    def _calculate_manual_rms(self, audio_data: bytes, sample_width: int) -> int:
+        """Manual RMS calculation as fallback"""
+        try:
+            if len(audio_data) < sample_width:
+                return 0
+                
+            if sample_width == 1:
+                # 8-bit unsigned
+                samples = [abs(b - 128) for b in audio_data]
+            elif sample_width == 2:
+                # 16-bit signed
+                samples = []
+                for i in range(0, len(audio_data) - 1, 2):
+                    if i + 1 < len(audio_data):
+                        sample = struct.unpack('<h', audio_data[i:i+2])[0]
+                        samples.append(abs(sample))
+            elif sample_width == 4:
+                # 32-bit signed
+                samples = []
+                for i in range(0, len(audio_data) - 3, 4):
+                    if i + 3 < len(audio_data):
+                        sample = struct.unpack('<i', audio_data[i:i+4])[0]
+                        samples.append(abs(sample))
+            else:
+                return 1000  # Default fallback
+                
+            if samples:
+                # RMS calculation
+                mean_square = sum(x * x for x in samples) / len(samples)
+                return int(mean_square ** 0.5)
+            else:
+                return 0
+                
+        except Exception as e:
+            logger.warning(f"Manual RMS calculation failed: {e}")
+            return 1000  # Safe fallback
+
+    def _estimate_audio_properties(self, filepath: str, file_size: int, expected_duration: int = 3) -> dict:
+        """Улучшенная оценка свойств аудио с учетом ожидаемой длительности"""
+        estimated_sample_rate = 48000
+        estimated_channels = 2
+        estimated_sample_width = 2
+        
+        # Более точная оценка длительности
+        audio_data_size = max(0, file_size - 44)
+        bytes_per_second = estimated_sample_rate * estimated_channels * estimated_sample_width
+        estimated_duration_calc = audio_data_size / bytes_per_second if bytes_per_second > 0 else 1.0
+        
+        # Ограничиваем оценку разумными пределами
+        if expected_duration <= 3:
+            estimated_duration_calc = min(estimated_duration_calc, expected_duration * 2)
+        
+        # Улучшенная оценка громкости
+        estimated_volume = self._estimate_volume_from_file_size(file_size, estimated_duration_calc, expected_duration)
+        
+        return {
+            'duration': estimated_duration_calc,
+            'sample_rate': estimated_sample_rate,
+            'channels': estimated_channels,
+            'sample_width': estimated_sample_width,
+            'avg_volume': estimated_volume
+        }
+
+    @staticmethod
+    def _calculate_network_score(network: Optional[dict]) -> Optional[float]:
+        """Оценка качества доставки 0..1 по потерям, порядку и джиттеру"""
+        if not network or not network['expected']:
+            return None
+
+        # До 1% потерь не заметно на слух, к 15% речь рассыпается
+        loss_score = 1.0 - min(1.0, max(0.0, network['loss_ratio'] - 0.01) / 0.14)
+        reorder_ratio = network['out_of_order'] / network['expected']
+        reorder_score = 1.0 - min(1.0, reorder_ratio / 0.05)
+        # Джиттер-буфер Discord сглаживает примерно до 40 мс
+        jitter_score = 1.0 - min(1.0, max(0.0, network['jitter_ms'] - 40) / 120)
+        return loss_score * 0.6 + jitter_score * 0.25 + reorder_score * 0.15
+
+    @staticmethod
+    def _calculate_signal_score(features: Optional[dict], expected_duration: int) -> Optional[float]:
+        """Оценка сигнала 0..1 по доле речи, SNR и клиппингу"""
+        if not features or not features['frames']:
+            return None
+
+        # Для ответа хватает речи на треть ожидаемой длительности
+        speech_target = max(0.5, expected_duration * 0.3)
+        speech_score = min(1.0, features['speech_seconds'] / speech_target)
+        # 5 dB — речь тонет в шуме, от 25 dB — чистая запись
+        snr_score = min(1.0, max(0.0, features['snr_db'] - 5) / 20)
+        # Больше 2% перегруженных отсчетов — слышимые искажения
+        clipping_score = 1.0 - min(1.0, features['clipping_ratio'] / 0.02)
+        return speech_score * 0.5 + snr_score * 0.3 + clipping_score * 0.2
+
+    def _calculate_quality_metrics(self, audio_data: dict, expected_duration: int) -> dict:
+        """Calculate quality score with adaptive scoring based on expected duration"""
+        
+        duration = audio_data['duration']
+        file_size_kb = audio_data['file_size_kb']
+        avg_volume = audio_data['avg_volume']
+        
+        # ИСПРАВЛЕНО: Адаптивная оценка длительности
+        if expected_duration > 0:
+            duration_ratio = duration / expected_duration
+            
+            # Для коротких ответов (≤3 сек) - более мягкие требования
+            if expected_duration <= 3:
+                if duration_ratio >= 0.3:  # Минимум 30% от ожидаемого
+                    if duration_ratio <= 2.0:  # Максимум в 2 раза больше
+                        duration_score = 1.0
+                    else:
+                        duration_score = max(0.7, 1.0 - (duration_ratio - 2.0) * 0.2)
+                else:
+                    # Очень короткие ответы - мягкий штраф
+                    duration_score = duration_ratio / 0.3 * 0.8
+            
+            # Для длинных ответов (>3 сек) - стандартные требования
+            else:
+                if duration_ratio >= 0.6:  # Минимум 60% от ожидаемого
+                    if duration_ratio <= 1.3:  # До 130% - отлично
+                        duration_score = 1.0
+                    else:
+                        duration_score = max(0.8, 1.0 - (duration_ratio - 1.3) * 0.3)
+                else:
+                    duration_score = duration_ratio / 0.6 * 0.7
+        else:
+            duration_score = 0.8 if duration > 0.5 else 0.3
+        
+        # ИСПРАВЛЕНО: Адаптивная оценка размера файла
+        # Базовая оценка: 12-18 KB/сек для коротких записей, 15-20 KB/сек для длинных
+        if expected_duration <= 3:
+            expected_size_kb = expected_duration * 12  # Меньше ожидаемый размер для коротких
+            min_acceptable_ratio = 0.2  # Более мягкие требования
+        else:
+            expected_size_kb = expected_duration * 15
+            min_acceptable_ratio = 0.3
+        
+        if expected_size_kb > 0:
+            size_ratio = file_size_kb / expected_size_kb
+            if size_ratio >= min_acceptable_ratio:
+                if size_ratio <= 2.5:
+                    size_score = 1.0
+                else:
+                    size_score = 0.8  # Большой файл не критично
+            else:
+                size_score = size_ratio / min_acceptable_ratio * 0.6
+        else:
+            size_score = 0.7 if file_size_kb > 10 else 0.3
+        
+        # ИСПРАВЛЕНО: Адаптивная оценка громкости
+        if avg_volume > 0:
+            # Для коротких ответов требования к громкости мягче
+            if expected_duration <= 3:
+                if avg_volume >= 300:  # Минимальный порог для коротких
+                    if avg_volume <= 8000:
+                        volume_score = 1.0
+                    else:
+                        volume_score = 0.9
+                else:
+                    volume_score = max(0.4, avg_volume / 300 * 0.8)
+            else:
+                # Для длинных ответов стандартные требования
+                if avg_volume >= 500:
+                    if avg_volume <= 6000:
+                        volume_score = 1.0
+                    else:
+                        volume_score = 0.9
+                else:
+                    volume_score = max(0.3, avg_volume / 500 * 0.7)
+        else:
+            volume_score = 0.1  # Тишина всегда плохо
+        
+        # ИСПРАВЛЕНО: Адаптивные веса в зависимости от длительности
+        if expected_duration <= 3:
+            # Для коротких ответов: громкость важнее длительности
+            quality = duration_score * 0.3 + volume_score * 0.5 + size_score * 0.2
+        else:
+            # Для длинных ответов: сбалансированно
+            quality = duration_score * 0.4 + volume_score * 0.4 + size_score * 0.2
+
+        # Признаки сигнала: есть ли речь, насколько она выше шума и нет ли перегруза
+        signal_score = self._calculate_signal_score(audio_data.get('features'), expected_duration)
+        if signal_score is not None:
+            quality = quality * 0.8 + signal_score * 0.2
+
+        # Фраза: громкий и длинный шум без нужных слов не должен проходить
+        passphrase = audio_data.get('passphrase')
+        passphrase_score = passphrase['score'] if passphrase else None
+        if passphrase_score is not None:
+            quality = quality * 0.6 + passphrase_score * 0.4
+
+        # Сеть оценивается отдельно: потери пакетов не должны выглядеть как тихий голос
+        network_score = self._calculate_network_score(audio_data.get('network'))
+        if network_score is not None:
+            quality = quality * 0.85 + network_score * 0.15
+        quality = int(quality * 100)
+        
+        quality = max(15, min(100, quality))  # Минимум 15% для любого ответа
+        
+        # ИСПРАВЛЕНО: Адаптивные пороги качества
+        if expected_duration <= 3:
+            # Для коротких ответов более мягкие пороги
+            if quality >= 70:
+                quality_emoji = "🟢"
+                quality_color = 0x27ae60
+            elif quality >= 50:
+                quality_emoji = "🟡"
+                quality_color = 0xf39c12
+            elif quality >= 30:
+                quality_emoji = "🟠"
+                quality_color = 0xe67e22
+            else:
+                quality_emoji = "🔴"
+                quality_color = 0xe74c3c
+        else:
+            # Для длинных ответов стандартные пороги
+            if quality >= 80:
+                quality_emoji = "🟢"
+                quality_color = 0x27ae60
+            elif quality >= 60:
+                quality_emoji = "🟡"
+                quality_color = 0xf39c12
+            elif quality >= 40:
+                quality_emoji = "🟠"
+                quality_color = 0xe67e22
+            else:
+                quality_emoji = "🔴"
+                quality_color = 0xe74c3c
+        
+        return {
+            'quality': quality,
+            'quality_emoji': quality_emoji,
+            'quality_color': quality_color,
+            'duration_score': duration_score,
+            'size_score': size_score,
+            'volume_score': volume_score,
+            'signal_score': signal_score,
+            'passphrase_score': passphrase_score,
+            'network_score': network_score,
+            'expected_duration': expected_duration,
+            'is_short_answer': expected_duration <= 3
+        }
@@ -0,0 +1,188 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from typing import BinaryIO, Iterator, Optional
+
+from utils.logger import logger
+
+MB = 1024 * 1024
+WAV_HEADER_BYTES = 44
+
+
+def frame_peak(data: bytes) -> int:
+    """Пиковая амплитуда PCM16 кадра"""
+    if len(data) < 2:
+        return 0
+    samples = array('h')
+    samples.frombytes(data[:len(data) - len(data) % 2])
+    return max(max(samples), -min(samples))
+
+
+def frame_energy(data: bytes) -> float:
+    """Средняя энергия PCM16 кадра относительно полной шкалы, 0..1"""
+    if len(data) < 2:
+        return 0.0
+    samples = array('h')
+    samples.frombytes(data[:len(data) - len(data) % 2])
+    return sum(sample * sample for sample in samples) / len(samples) / (32768.0 * 32768.0)
+
+
+def wav_header(data_size: int, channels: int, sample_width: int, sample_rate: int) -> bytes:
+    """Заголовок RIFF/WAVE для PCM данных известного размера"""
+    byte_rate = sample_rate * channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b'data', data_size
+    )
+
+
+class RecordingMemoryBudget:
+    """Глобальный бюджет памяти под буферы записи всех сессий"""
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.in_memory_bytes = 0
+        self.spilled_bytes = 0
+        self.buffers = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        """Зарезервировать память; False — бюджет исчерпан и буфер уйдет на диск"""
+        with self._lock:
+            self.buffers += 1
+            if self.in_memory_bytes + size > self.limit_bytes:
+                self.spilled_bytes += size
+                return False
+            self.in_memory_bytes += size
+            return True
+
+    def release(self, size: int, spilled: bool) -> None:
+        with self._lock:
+            self.buffers -= 1
+            if spilled:
+                self.spilled_bytes -= size
+            else:
+                self.in_memory_bytes -= size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'limit_bytes': self.limit_bytes,
+                'in_memory_bytes': self.in_memory_bytes,
+                'spilled_bytes': self.spilled_bytes,
+                'buffers': self.buffers,
+                'usage': self.in_memory_bytes / self.limit_bytes if self.limit_bytes else 0.0
+            }
+
+
+class UserAudioBuffer:
+    """Кольцевой PCM буфер одного говорящего с фиксированной емкостью
+
+    Память выделяется один раз под длительность вопроса. Если глобальный
+    бюджет исчерпан, буфер отображается на временный файл через mmap.
+    При переполнении самые старые данные перезаписываются.
+    """
+
+    def __init__(self, capacity: int, budget: RecordingMemoryBudget, spill_dir: str):
+        self.capacity = capacity
+        self.budget = budget
+        self.written = 0
+        self.overflow_bytes = 0
+        self.finished = False
+        self._spill_path: Optional[str] = None
+        self._spill_file: Optional[BinaryIO] = None
+
+        self.spilled = not budget.reserve(capacity)
+        if self.spilled:
+            self._data = self._open_spill(spill_dir)
+        else:
+            self._data = bytearray(capacity)
+
+    def _open_spill(self, spill_dir: str) -> mmap.mmap:
+        os.makedirs(spill_dir, exist_ok=True)
+        fd, self._spill_path = tempfile.mkstemp(suffix=".pcm", dir=spill_dir)
+        self._spill_file = os.fdopen(fd, "r+b")
+        self._spill_file.truncate(self.capacity)
+        logger.warning(f"💽 Бюджет памяти записи исчерпан, буфер {self.capacity // 1024} KB вынесен на диск")
+        return mmap.mmap(self._spill_file.fileno(), self.capacity)
+
+    @property
+    def size(self) -> int:
+        """Количество байт, доступных для чтения"""
+        return min(self.written, self.capacity)
+
+    def write(self, data: bytes) -> None:
+        if self.finished or not data:
+            return
+
+        length = len(data)
+        if length >= self.capacity:
+            # Кадр больше всего кольца — оставляем только хвост
+            self.overflow_bytes += self.size + length - self.capacity
+            self._data[0:self.capacity] = data[-self.capacity:]
+            self.written = self.capacity
+            return
+
+        position = self.written % self.capacity
+        first = min(length, self.capacity - position)
+        self._data[position:position + first] = data[:first]
+        if first < length:
+            self._data[0:length - first] = data[first:]
+        if self.written + length > self.capacity:
+            self.overflow_bytes += min(length, self.written + length - self.capacity)
+        self.written += length
+
+    def iter_chunks(self) -> Iterator[memoryview]:
+        """Содержимое кольца в хронологическом порядке"""
+        view = memoryview(self._data)
+        if self.written <= self.capacity:
+            yield view[:self.written]
+            return
+        position = self.written % self.capacity
+        yield view[position:self.capacity]
+        yield view[:position]
+
+    def getvalue(self) -> bytes:
+        return b"".join(bytes(chunk) for chunk in self.iter_chunks())
+
+    def write_wav(self, f: BinaryIO, channels: int, sample_width: int, sample_rate: int) -> int:
+        """Записать содержимое в файл как WAV, вернуть размер файла"""
+        header = wav_header(self.size, channels, sample_width, sample_rate)
+        f.write(header)
+        for chunk in self.iter_chunks():
+            f.write(chunk)
+        return len(header) + self.size
+
+    def cleanup(self) -> None:
+        self.finished = True
+
+    def release(self) -> None:
+        """Вернуть память в бюджет и удалить файл подкачки"""
+        if self._data is None:
+            return
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+        if self._spill_path:
+            try:
+                os.remove(self._spill_path)
+            except OSError as e:
+                logger.warning(f"Couldn't remove spill file {self._spill_path}: {e}")
+            self._spill_path = None
+        self.budget.release(self.capacity, self.spilled)
+
+    def stats(self) -> dict:
+        return {
+            'capacity_bytes': self.capacity,
+            'used_bytes': self.size,
+            'overflow_bytes': self.overflow_bytes,
+            'spilled': self.spilled
+        }
@@ -0,0 +1,343 @@
+import math
+import wave
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+from config.settings import settings
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+    np = None
+
+# Кадр тише -50 dBFS не считается речью при любом уровне шума
+SPEECH_FLOOR_ENERGY = 10 ** (-50 / 10)
+# Речь — кадры громче оценки шума на 6 dB
+SPEECH_OVER_NOISE = 10 ** (6 / 10)
+NOISE_PERCENTILE = 10
+# Sink отбрасывает тишину, и в записи может не быть шумовых кадров: оценка шума не выше -40 dBFS
+NOISE_CEILING_ENERGY = 10 ** (-40 / 10)
+MAX_SNR_DB = 60.0
+CLIP_LEVEL = 0.99
+
+SAMPLE_TYPECODES = {1: 'B', 2: 'h', 4: 'i'}
+DECIMATION_TAPS_PER_FACTOR = 16
+
+
+@dataclass
+class AudioFeatures:
+    """Признаки записи, посчитанные за один проход по кадрам"""
+    duration: float
+    sample_rate: int
+    frames: int
+    rms: float  # средний RMS по кадрам, 0..1
+    peak: float
+    speech_ratio: float  # доля кадров с речью
+    speech_seconds: float
+    snr_db: float
+    clipping_ratio: float
+    zero_crossing_rate: float  # пересечений нуля в секунду речи
+    spectral_centroid_hz: Optional[float]
+    method: str
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _snr_db(speech_energy: float, noise_energy: float) -> float:
+    if speech_energy <= 0:
+        return 0.0
+    if noise_energy <= 0:
+        return MAX_SNR_DB
+    return max(0.0, min(MAX_SNR_DB, 10 * math.log10(speech_energy / noise_energy)))
+
+
+def _full_scale(sample_width: int) -> float:
+    return float(1 << (8 * sample_width - 1))
+
+
+def pcm_to_float(pcm: bytes, channels: int, sample_width: int) -> "np.ndarray":
+    """Отсчеты PCM как float32 в диапазоне -1..1, форма (отсчеты, каналы)"""
+    dtype = {1: np.uint8, 2: '<i2', 4: '<i4'}[sample_width]
+    samples = np.frombuffer(pcm, dtype=dtype, count=len(pcm) // sample_width)
+    samples = samples[:len(samples) - len(samples) % channels]
+    signal = samples.astype(np.float32)
+    if sample_width == 1:
+        signal -= 128.0
+    signal /= _full_scale(sample_width)
+    return signal.reshape(-1, channels)
+
+
+def downmix(signal: "np.ndarray") -> "np.ndarray":
+    """Моно из (отсчеты, каналы) без копии для одноканальной записи"""
+    return signal[:, 0] if signal.shape[1] == 1 else signal.mean(axis=1)
+
+
+def decimate(mono: "np.ndarray", factor: int) -> "np.ndarray":
+    """Понижение частоты в целое число раз: ФНЧ с окном Хэмминга и каждый factor-й отсчет"""
+    if factor <= 1 or len(mono) == 0:
+        return mono
+    taps = DECIMATION_TAPS_PER_FACTOR * factor + 1
+    # Срез чуть ниже новой частоты Найквиста
+    cutoff = 0.9 / factor
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = (cutoff * np.sinc(cutoff * n) * np.hamming(taps)).astype(np.float32)
+    return np.convolve(mono, kernel, mode='same')[::factor]
+
+
+def feature_decimation(sample_rate: int) -> int:
+    """Во сколько раз понизить частоту для признаков; 1 — анализ на исходной частоте"""
+    target = settings.analysis_feature_rate
+    if not target or target >= sample_rate or sample_rate % target:
+        return 1
+    return sample_rate // target
+
+
+def pcm_to_mono(pcm: bytes, channels: int, sample_width: int, sample_rate: int, target_rate: Optional[int] = None) -> Tuple["np.ndarray", int]:
+    """Моно float32 на исходной частоте или с целочисленной децимацией до target_rate"""
+    mono = downmix(pcm_to_float(pcm, channels, sample_width))
+    if target_rate and target_rate < sample_rate and sample_rate % target_rate == 0:
+        return decimate(mono, sample_rate // target_rate), target_rate
+    return mono, sample_rate
+
+
+def read_wav_mono(filepath: str, target_rate: Optional[int] = None) -> Tuple["np.ndarray", int]:
+    with wave.open(filepath, "rb") as wav:
+        return pcm_to_mono(
+            wav.readframes(wav.getnframes()), wav.getnchannels(), wav.getsampwidth(), wav.getframerate(), target_rate
+        )
+
+
+def read_wav_pcm(filepath: str) -> Tuple[dict, bytes]:
+    """Параметры и PCM данные WAV файла (блокирующий вызов)"""
+    with wave.open(filepath, "rb") as wav:
+        params = {
+            'channels': wav.getnchannels(),
+            'sample_width': wav.getsampwidth(),
+            'sample_rate': wav.getframerate(),
+        }
+        return params, wav.readframes(wav.getnframes())
+
+
+def _speech_mask(energy: "np.ndarray") -> Tuple["np.ndarray", float]:
+    """Кадры речи по энергии и оценка шума"""
+    noise_floor = min(float(np.percentile(energy, NOISE_PERCENTILE)), NOISE_CEILING_ENERGY)
+    return energy > max(noise_floor * SPEECH_OVER_NOISE, SPEECH_FLOOR_ENERGY), noise_floor
+
+
+def _extract_numpy(pcm: bytes, channels: int, sample_width: int, sample_rate: int, frame_ms: int) -> Tuple[AudioFeatures, "np.ndarray", int]:
+    signal = pcm_to_float(pcm, channels, sample_width)
+    magnitudes = np.abs(signal)
+    peak = float(magnitudes.max()) if signal.size else 0.0
+    clipping_ratio = float(np.count_nonzero(magnitudes >= CLIP_LEVEL)) / signal.size if signal.size else 0.0
+    duration = len(signal) / sample_rate
+
+    # Пик и клиппинг — по исходным отсчетам, кадровые признаки речи — на пониженной частоте
+    factor = feature_decimation(sample_rate)
+    mono = decimate(downmix(signal), factor)
+    frame_rate = sample_rate // factor
+
+    frame_length = max(1, frame_rate * frame_ms // 1000)
+    count = len(mono) // frame_length
+    if count == 0:
+        return AudioFeatures(duration, sample_rate, 0, 0.0, peak, 0.0, 0.0, 0.0, clipping_ratio, 0.0, None, 'numpy'), mono, frame_rate
+
+    frames = mono[:count * frame_length].reshape(count, frame_length)
+    energy = np.einsum('ij,ij->i', frames, frames) / frame_length
+    speech, noise_floor = _speech_mask(energy)
+    speech_frames = int(np.count_nonzero(speech))
+
+    noise_energy = float(energy[~speech].mean()) if speech_frames < count else noise_floor
+    snr_db = _snr_db(float(energy[speech].mean()) if speech_frames else 0.0, noise_energy)
+
+    zero_crossing_rate = 0.0
+    spectral_centroid = None
+    if speech_frames:
+        voiced = frames[speech]
+        signs = np.signbit(voiced)
+        zero_crossing_rate = float(np.count_nonzero(signs[:, 1:] != signs[:, :-1])) * frame_rate / (speech_frames * frame_length)
+        if settings.analysis_spectral_centroid:
+            # Один батч FFT по всем кадрам речи
+            spectrum = np.abs(np.fft.rfft(voiced * np.hanning(frame_length).astype(np.float32), axis=1))
+            frequencies = np.fft.rfftfreq(frame_length, 1.0 / frame_rate)
+            total = spectrum.sum()
+            spectral_centroid = float((spectrum * frequencies).sum() / total) if total > 0 else None
+
+    return AudioFeatures(
+        duration=duration,
+        sample_rate=sample_rate,
+        frames=count,
+        rms=float(np.sqrt(energy).mean()),
+        peak=peak,
+        speech_ratio=speech_frames / count,
+        speech_seconds=speech_frames * frame_length / frame_rate,
+        snr_db=snr_db,
+        clipping_ratio=clipping_ratio,
+        zero_crossing_rate=zero_crossing_rate,
+        spectral_centroid_hz=spectral_centroid,
+        method='numpy'
+    ), mono, frame_rate
+
+
+def _extract_python(pcm: bytes, channels: int, sample_width: int, sample_rate: int, frame_ms: int) -> AudioFeatures:
+    """Тот же проход без numpy на исходной частоте; спектральный центроид не считается"""
+    samples = array(SAMPLE_TYPECODES[sample_width])
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % sample_width])
+    full_scale = _full_scale(sample_width)
+    bias = 128 if sample_width == 1 else 0
+    clip_threshold = CLIP_LEVEL * full_scale
+
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    step = frame_length * channels
+    count = len(samples) // step
+    duration = len(samples) // channels / sample_rate
+    peak = 0
+    clipped = 0
+    energies = []
+    crossings = []
+    for index in range(count):
+        frame = samples[index * step:(index + 1) * step]
+        total = 0.0
+        frame_crossings = 0
+        previous = 0
+        for position in range(0, step, channels):
+            value = 0
+            for channel in range(channels):
+                sample = frame[position + channel] - bias
+                magnitude = abs(sample)
+                if magnitude > peak:
+                    peak = magnitude
+                if magnitude >= clip_threshold:
+                    clipped += 1
+                value += sample
+            value /= channels
+            total += value * value
+            if position and (value < 0) != (previous < 0):
+                frame_crossings += 1
+            previous = value
+        energies.append(total / frame_length / (full_scale * full_scale))
+        crossings.append(frame_crossings)
+
+    clipping_ratio = clipped / len(samples) if samples else 0.0
+    if count == 0:
+        return AudioFeatures(duration, sample_rate, 0, 0.0, peak / full_scale, 0.0, 0.0, 0.0, clipping_ratio, 0.0, None, 'python')
+
+    noise_floor = min(sorted(energies)[int(count * NOISE_PERCENTILE / 100)], NOISE_CEILING_ENERGY)
+    threshold = max(noise_floor * SPEECH_OVER_NOISE, SPEECH_FLOOR_ENERGY)
+    speech = [energy > threshold for energy in energies]
+    speech_frames = sum(speech)
+    speech_energy = sum(energy for energy, voiced in zip(energies, speech) if voiced) / speech_frames if speech_frames else 0.0
+    noise_frames = count - speech_frames
+    noise_energy = sum(energy for energy, voiced in zip(energies, speech) if not voiced) / noise_frames if noise_frames else noise_floor
+    voiced_crossings = sum(frame_crossings for frame_crossings, voiced in zip(crossings, speech) if voiced)
+
+    return AudioFeatures(
+        duration=duration,
+        sample_rate=sample_rate,
+        frames=count,
+        rms=sum(math.sqrt(energy) for energy in energies) / count,
+        peak=peak / full_scale,
+        speech_ratio=speech_frames / count,
+        speech_seconds=speech_frames * frame_length / sample_rate,
+        snr_db=_snr_db(speech_energy, noise_energy),
+        clipping_ratio=clipping_ratio,
+        zero_crossing_rate=voiced_crossings * sample_rate / (speech_frames * frame_length) if speech_frames else 0.0,
+        spectral_centroid_hz=None,
+        method='python'
+    )
+
+
+def extract_features(pcm: bytes, channels: int, sample_width: int, sample_rate: int, frame_ms: Optional[int] = None) -> AudioFeatures:
+    """Разбить PCM на кадры один раз и посчитать по ним все признаки качества"""
+    return extract_features_and_signal(pcm, channels, sample_width, sample_rate, frame_ms)[0]
+
+
+def extract_features_and_signal(
+    pcm: bytes, channels: int, sample_width: int, sample_rate: int, frame_ms: Optional[int] = None
+) -> Tuple[AudioFeatures, Optional["np.ndarray"], int]:
+    """Признаки и моно сигнал, по которому они посчитаны (после децимации), с его частотой
+
+    Сигнал переиспользуют проверка фразы и отпечатки, чтобы не декодировать
+    и не понижать частоту ответа повторно. Без numpy сигнала нет (None).
+    """
+    if sample_width not in SAMPLE_TYPECODES:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    frame_ms = frame_ms or settings.analysis_frame_ms
+    if HAS_NUMPY:
+        return _extract_numpy(pcm, channels, sample_width, sample_rate, frame_ms)
+    return _extract_python(pcm, channels, sample_width, sample_rate, frame_ms), None, sample_rate
+
+
+def signal_at_rate(mono: "np.ndarray", sample_rate: int, target_rate: int) -> Optional["np.ndarray"]:
+    """Моно сигнал на target_rate целочисленной децимацией; None, если так не получить"""
+    if sample_rate == target_rate:
+        return mono
+    if sample_rate > target_rate and sample_rate % target_rate == 0:
+        return decimate(mono, sample_rate // target_rate)
+    return None
+
+
+@dataclass
+class SpeechWindow:
+    """Окно ответа в записи: от первого до последнего кадра речи с запасом"""
+    start: int  # в отсчетах исходной частоты
+    end: int
+    total: int
+    sample_rate: int
+
+    @property
+    def raw_duration(self) -> float:
+        return self.total / self.sample_rate
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start) / self.sample_rate
+
+    @property
+    def trimmed(self) -> bool:
+        return self.start > 0 or self.end < self.total
+
+    def to_dict(self) -> dict:
+        return {
+            'start_seconds': self.start / self.sample_rate,
+            'end_seconds': self.end / self.sample_rate,
+            'raw_duration': self.raw_duration,
+            'duration': self.duration,
+        }
+
+
+def speech_window(pcm: bytes, channels: int, sample_width: int, sample_rate: int, margin_ms: int, frame_ms: Optional[int] = None) -> Optional[SpeechWindow]:
+    """Найти окно речи по энергии кадров; None — без numpy или если речи нет
+
+    Кадры и порог речи те же, что у extract_features, поэтому обрезка не
+    отрезает то, что анализ считает речью.
+    """
+    if not HAS_NUMPY or sample_width not in SAMPLE_TYPECODES:
+        return None
+    frame_ms = frame_ms or settings.analysis_frame_ms
+    signal = pcm_to_float(pcm, channels, sample_width)
+    factor = feature_decimation(sample_rate)
+    mono = decimate(downmix(signal), factor)
+    frame_length = max(1, (sample_rate // factor) * frame_ms // 1000)
+    count = len(mono) // frame_length
+    if count == 0:
+        return None
+
+    frames = mono[:count * frame_length].reshape(count, frame_length)
+    speech, _ = _speech_mask(np.einsum('ij,ij->i', frames, frames) / frame_length)
+    voiced = np.flatnonzero(speech)
+    if len(voiced) == 0:
+        return None
+
+    margin = sample_rate * margin_ms // 1000
+    step = frame_length * factor
+    return SpeechWindow(
+        start=max(0, int(voiced[0]) * step - margin),
+        end=min(len(signal), (int(voiced[-1]) + 1) * step + margin),
+        total=len(signal),
+        sample_rate=sample_rate,
+    )
+
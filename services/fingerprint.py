@@ -0,0 +1,277 @@
+import asyncio
+import os
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.audio_features import HAS_NUMPY
+from utils.logger import logger
+
+if HAS_NUMPY:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+FINGERPRINT_RATE = 16000
+FFT_SIZE = 1024
+FFT_HOP = 256  # 16 ms
+MAX_FREQUENCY_BIN = 511  # 8 кГц при 16 кГц; 9 бит на частоту в хэше
+PEAK_NEIGHBORHOOD = (5, 10)  # кадров, бинов в каждую сторону
+PEAK_MIN_DB_OVER_MEDIAN = 10.0
+TARGET_MAX_DT = 63  # 6 бит на разницу во времени
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    question INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    hash_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_created ON answers (created_at);
+CREATE TABLE IF NOT EXISTS hashes (
+    guild_id INTEGER NOT NULL,
+    question INTEGER NOT NULL,
+    hash INTEGER NOT NULL,
+    answer_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, question, hash, answer_id, offset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashes_answer ON hashes (answer_id);
+"""
+
+
+@dataclass
+class FingerprintMatch:
+    """Ранее принятый ответ, совпавший с текущим"""
+    answer_id: int
+    user_id: int
+    created_at: float
+    matched_hashes: int
+    similarity: float  # доля хэшей короткой записи, совпавших с одним сдвигом
+
+    def to_dict(self) -> dict:
+        return {
+            'answer_id': self.answer_id,
+            'user_id': self.user_id,
+            'created_at': self.created_at,
+            'matched_hashes': self.matched_hashes,
+            'similarity': self.similarity,
+        }
+
+
+def landmark_hashes(mono: "np.ndarray", sample_rate: int) -> List[Tuple[int, int]]:
+    """Пары спектральных пиков (якорь, цель) → (хэш, кадр якоря)
+
+    Хэш: частота якоря, частота цели и расстояние между ними в кадрах.
+    Он не зависит от громкости и положения фразы в записи.
+    """
+    if len(mono) < FFT_SIZE:
+        return []
+    count = 1 + (len(mono) - FFT_SIZE) // FFT_HOP
+    indices = np.arange(FFT_SIZE)[None, :] + FFT_HOP * np.arange(count)[:, None]
+    spectrum = np.abs(np.fft.rfft(mono[indices] * np.hanning(FFT_SIZE).astype(np.float32), axis=1))
+    spectrum = 20 * np.log10(spectrum[:, 1:MAX_FREQUENCY_BIN + 1] + 1e-9)
+
+    # Локальные максимумы: раздельный максимум-фильтр по времени и частоте
+    time_radius, freq_radius = PEAK_NEIGHBORHOOD
+    padded = np.pad(spectrum, ((time_radius, time_radius), (0, 0)), constant_values=-np.inf)
+    neighborhood = sliding_window_view(padded, 2 * time_radius + 1, axis=0).max(axis=-1)
+    padded = np.pad(neighborhood, ((0, 0), (freq_radius, freq_radius)), constant_values=-np.inf)
+    neighborhood = sliding_window_view(padded, 2 * freq_radius + 1, axis=1).max(axis=-1)
+    is_peak = (spectrum == neighborhood) & (spectrum > np.median(spectrum) + PEAK_MIN_DB_OVER_MEDIAN)
+
+    frames, bins = np.nonzero(is_peak)
+    limit = max(1, int(settings.fingerprint_peaks_per_second * len(mono) / sample_rate))
+    if len(frames) > limit:
+        strongest = np.argsort(spectrum[frames, bins])[-limit:]
+        frames, bins = frames[strongest], bins[strongest]
+    order = np.lexsort((bins, frames))
+    frames, bins = frames[order].tolist(), (bins[order] + 1).tolist()
+
+    hashes = []
+    fan_out = settings.fingerprint_fan_out
+    for anchor, (anchor_frame, anchor_bin) in enumerate(zip(frames, bins)):
+        paired = 0
+        for target in range(anchor + 1, len(frames)):
+            dt = frames[target] - anchor_frame
+            if dt == 0:
+                continue
+            if dt > TARGET_MAX_DT or paired >= fan_out:
+                break
+            hashes.append(((anchor_bin << 15) | (bins[target] << 6) | dt, anchor_frame))
+            paired += 1
+    return hashes
+
+
+class FingerprintIndex:
+    """Инвертированный индекс хэшей ответов в SQLite
+
+    Поиск идет по первичному ключу (гильдия, вопрос, хэш) без чтения
+    таблицы, поэтому его время растет логарифмически с размером индекса.
+    Устаревшие ответы удаляются пачками по индексам created_at и answer_id.
+    Методы блокирующие; вызываются из одного потока AnswerFingerprints.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: процессы кластера на одном хосте пишут в общий индекс
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def match_and_add(
+        self, guild_id: int, question: int, user_id: int, hashes: List[Tuple[int, int]]
+    ) -> Optional[FingerprintMatch]:
+        """Найти лучший совпадающий ответ другого пользователя и добавить текущий в индекс"""
+        if not hashes:
+            return None
+        match = self._best_match(guild_id, question, user_id, hashes)
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO answers (guild_id, question, user_id, created_at, hash_count) VALUES (?, ?, ?, ?, ?)",
+                (guild_id, question, user_id, time.time(), len(hashes))
+            )
+            answer_id = cursor.lastrowid
+            self.db.executemany(
+                "INSERT OR IGNORE INTO hashes (guild_id, question, hash, answer_id, offset) VALUES (?, ?, ?, ?, ?)",
+                [(guild_id, question, value, answer_id, offset) for value, offset in hashes]
+            )
+        return match
+
+    def _best_match(
+        self, guild_id: int, question: int, user_id: int, hashes: List[Tuple[int, int]]
+    ) -> Optional[FingerprintMatch]:
+        query_offsets: Dict[int, List[int]] = defaultdict(list)
+        for value, offset in hashes:
+            query_offsets[value].append(offset)
+
+        # Совпадения с одинаковым сдвигом во времени — та же запись
+        aligned: Counter = Counter()
+        values = list(query_offsets)
+        for start in range(0, len(values), QUERY_CHUNK):
+            chunk = values[start:start + QUERY_CHUNK]
+            rows = self.db.execute(
+                f"SELECT hash, answer_id, offset FROM hashes WHERE guild_id = ? AND question = ? "
+                f"AND hash IN ({','.join('?' * len(chunk))})",
+                (guild_id, question, *chunk)
+            )
+            for value, answer_id, offset in rows:
+                for query_offset in query_offsets[value]:
+                    aligned[(answer_id, offset - query_offset)] += 1
+
+        best: Dict[int, int] = {}
+        for (answer_id, _), count in aligned.items():
+            if count > best.get(answer_id, 0):
+                best[answer_id] = count
+
+        deadline = time.time() - settings.fingerprint_ttl_seconds
+        for answer_id, count in sorted(best.items(), key=lambda item: item[1], reverse=True)[:5]:
+            if count < settings.fingerprint_min_matches:
+                break
+            row = self.db.execute(
+                "SELECT user_id, created_at, hash_count FROM answers WHERE id = ?", (answer_id,)
+            ).fetchone()
+            if row is None or row[0] == user_id or row[1] < deadline:
+                continue
+            similarity = count / min(len(hashes), row[2])
+            if similarity >= settings.fingerprint_match_ratio:
+                return FingerprintMatch(answer_id, row[0], row[1], count, similarity)
+        return None
+
+    def evict_batch(self, older_than: float, batch: int = 500) -> int:
+        """Удалить до batch ответов старше older_than (unix time) вместе с их хэшами"""
+        ids = [row[0] for row in self.db.execute(
+            "SELECT id FROM answers WHERE created_at < ? LIMIT ?", (older_than, batch)
+        )]
+        if not ids:
+            return 0
+        placeholders = ','.join('?' * len(ids))
+        with self.db:
+            self.db.execute(f"DELETE FROM hashes WHERE answer_id IN ({placeholders})", ids)
+            self.db.execute(f"DELETE FROM answers WHERE id IN ({placeholders})", ids)
+        return len(ids)
+
+    def count_answers(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class AnswerFingerprints:
+    """Отпечатки ответов: извлечение и работа с индексом в отдельном потоке"""
+
+    def __init__(self, path: str):
+        self.index = FingerprintIndex(path)
+        self.checked = 0
+        self.duplicates = 0
+        self.evicted = 0
+        # Один поток: соединение SQLite не делится между потоками
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fingerprints")
+
+    async def check(self, hashes: List[Tuple[int, int]], guild_id: int, question: int, user_id: int) -> Optional[dict]:
+        """Совпадение ответа с ответом другого участника этой гильдии на тот же вопрос
+
+        hashes — landmark_hashes ответа, посчитанные анализом по сигналу прохода признаков.
+        """
+        try:
+            match = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.index.match_and_add, guild_id, question, user_id, hashes
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Не удалось проверить отпечаток ответа {user_id}: {e}")
+            return None
+        self.checked += 1
+        if match:
+            self.duplicates += 1
+            logger.warning(
+                f"♻️ Ответ {user_id} совпадает с ответом {match.user_id} "
+                f"({match.similarity:.0%}, гильдия {guild_id}, вопрос {question + 1})"
+            )
+            return match.to_dict()
+        return None
+
+    async def evict(self) -> int:
+        """Удалить устаревшие ответы
+
+        Каждая пачка — отдельное задание потока индекса, поэтому проверки
+        ответов, пришедшие во время очистки, ждут не дольше одной пачки.
+        """
+        older_than = time.time() - settings.fingerprint_ttl_seconds
+        loop = asyncio.get_running_loop()
+        removed = 0
+        while True:
+            try:
+                batch = await loop.run_in_executor(self._executor, self.index.evict_batch, older_than)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Не удалось очистить индекс отпечатков: {e}")
+                break
+            if not batch:
+                break
+            removed += batch
+            await asyncio.sleep(0)
+        if removed:
+            self.evicted += removed
+            logger.info(f"🧹 Из индекса отпечатков удалено устаревших ответов: {removed}")
+        return removed
+
+    def stats(self) -> dict:
+        return {'checked': self.checked, 'duplicates': self.duplicates, 'evicted': self.evicted}
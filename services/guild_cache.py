@@ -0,0 +1,81 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import discord
+
+from config.settings import settings
+from utils.logger import logger
+
+INDICATOR_CHANNEL_MARKERS = ('верификация', 'verification')
+
+
+@dataclass
+class GuildResources:
+    """Разрешенные ресурсы гильдии, нужные сессиям верификации"""
+    guild_id: int
+    indicator_channel: Optional[discord.TextChannel] = None
+    alert_channel: Optional[discord.TextChannel] = None
+    roles: Dict[int, Optional[discord.Role]] = field(default_factory=dict)
+    bot_permissions: discord.Permissions = field(default_factory=discord.Permissions.none)
+
+
+class GuildResourceCache:
+    """Кэш каналов, ролей и прав бота по гильдиям
+
+    Запись строится при первом обращении и сбрасывается событиями gateway
+    (изменение каналов, ролей, участника-бота) вместо пересчета в каждой сессии.
+    """
+
+    def __init__(self):
+        self._resources: Dict[int, GuildResources] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, guild: discord.Guild) -> GuildResources:
+        resources = self._resources.get(guild.id)
+        if resources is not None:
+            self.hits += 1
+            return resources
+        self.misses += 1
+        resources = self._resources[guild.id] = self._resolve(guild)
+        return resources
+
+    @staticmethod
+    def _resolve(guild: discord.Guild) -> GuildResources:
+        me = guild.me
+        resources = GuildResources(guild_id=guild.id)
+        if me is not None:
+            resources.bot_permissions = me.guild_permissions
+
+        for channel in guild.text_channels:
+            name = channel.name.lower()
+            if resources.indicator_channel is None and any(marker in name for marker in INDICATOR_CHANNEL_MARKERS):
+                resources.indicator_channel = channel
+            if resources.alert_channel is None and me is not None and channel.permissions_for(me).send_messages:
+                resources.alert_channel = channel
+            if resources.indicator_channel and resources.alert_channel:
+                break
+
+        for role_id in (settings.verified_role_id, settings.unverified_role_id):
+            resources.roles[role_id] = guild.get_role(role_id)
+        return resources
+
+    def role(self, guild: discord.Guild, role_id: int) -> Optional[discord.Role]:
+        roles = self.get(guild).roles
+        if role_id not in roles:
+            roles[role_id] = guild.get_role(role_id)
+        return roles[role_id]
+
+    def invalidate(self, guild_id: int, reason: str = "") -> None:
+        if self._resources.pop(guild_id, None) is not None:
+            logger.debug(f"♻️ Кэш ресурсов гильдии {guild_id} сброшен{f': {reason}' if reason else ''}")
+
+    def clear(self) -> None:
+        self._resources.clear()
+
+    def stats(self) -> dict:
+        return {'guilds': len(self._resources), 'hits': self.hits, 'misses': self.misses}
+
+
+# Global cache instance
+guild_resources = GuildResourceCache()
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import discord
+
+from config.settings import settings
+from utils.logger import logger
+
+
+class MemberResolver:
+    """Поиск участников без полного кэша гильдии
+
+    Сначала кэш discord (в режиме low-memory там только участники голосовых
+    каналов), затем небольшой LRU объектов Member из событий и, в конце,
+    запрос fetch_member к API.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.fetches = 0
+        self._members: "OrderedDict[Tuple[int, int], discord.Member]" = OrderedDict()
+
+    def remember(self, member: discord.Member) -> None:
+        key = (member.guild.id, member.id)
+        self._members[key] = member
+        self._members.move_to_end(key)
+        while len(self._members) > self.max_size:
+            self._members.popitem(last=False)
+
+    def get(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        member = self._members.get(key)
+        if member is not None:
+            self._members.move_to_end(key)
+        return member
+
+    async def fetch(self, guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+        member = self.get(guild, user_id)
+        if member is not None:
+            return member
+        try:
+            self.fetches += 1
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+        except discord.HTTPException as e:
+            logger.warning(f"⚠️ Не удалось получить участника {user_id}: {e}")
+            return None
+        if member is not None:
+            self.remember(member)
+        return member
+
+    def forget(self, guild_id: int, user_id: int) -> None:
+        self._members.pop((guild_id, user_id), None)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+
+# Global resolver instance
+member_resolver = MemberResolver(settings.member_cache_size)
@@ -0,0 +1,207 @@
+import struct
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional
+
+import discord
+from discord.sinks import RawData
+
+from config.settings import settings
+from services.audio_buffers import MB, RecordingMemoryBudget
+from services.sinks import CustomWaveSink
+from utils.logger import logger
+from utils.ogg import OggOpusWriter
+
+OPUS_SILENCE_FRAME = b"\xf8\xff\xfe"
+SAMPLES_PER_FRAME = 960  # 20 мс при 48 кГц
+MAX_CONCEALED_FRAMES = 5
+RTP_HEADER = struct.Struct(">HII")
+
+
+@dataclass
+class OpusPacket:
+    """Принятый Opus пакет с RTP метаданными"""
+    sequence: int
+    timestamp: int
+    receive_time: float
+    payload: bytes
+
+
+class OpusStream:
+    """Поток пакетов одного SSRC в порядке получения"""
+
+    def __init__(self, ssrc: int, limit_bytes: int):
+        self.ssrc = ssrc
+        self.limit_bytes = limit_bytes
+        self.packets: List[OpusPacket] = []
+        self.size_bytes = 0
+        self.dropped_packets = 0
+
+    def append(self, packet: OpusPacket) -> None:
+        if self.size_bytes + len(packet.payload) > self.limit_bytes:
+            self.dropped_packets += 1
+            return
+        self.packets.append(packet)
+        self.size_bytes += len(packet.payload)
+
+    def ordered(self) -> List[OpusPacket]:
+        """Пакеты по возрастанию расширенного номера последовательности"""
+        if not self.packets:
+            return []
+        extended = []
+        cycles = 0
+        previous = self.packets[0].sequence
+        for packet in self.packets:
+            delta = packet.sequence - previous
+            if delta < -0x8000:
+                cycles += 0x10000
+            elif delta > 0x8000:
+                cycles -= 0x10000
+            extended.append((packet.sequence + cycles, packet))
+            previous = packet.sequence
+        extended.sort(key=lambda item: item[0])
+        # Дубликаты (повторная доставка) отбрасываем
+        result, last = [], None
+        for number, packet in extended:
+            if number != last:
+                result.append(packet)
+            last = number
+        return result
+
+
+class OpusCaptureSink(CustomWaveSink):
+    """Sink, хранящий сырые Opus пакеты без декодирования
+
+    Декодируется только поток нужного пользователя и только по запросу,
+    для загрузки поток можно упаковать в OGG без перекодирования.
+    Если голосовой клиент не поддерживает захват пакетов, sink работает
+    как обычный CustomWaveSink.
+    """
+
+    def __init__(self, duration: int, budget: RecordingMemoryBudget, *, filters=None, on_speech=None):
+        super().__init__(duration, budget, filters=filters, on_speech=on_speech)
+        self.streams: Dict[int, OpusStream] = {}
+        self.user_streams: Dict[int, OpusStream] = {}
+        self._last_sequence: Dict[int, int] = {}
+
+    @property
+    def captures_packets(self) -> bool:
+        return bool(self.streams)
+
+    def write_packet(self, ssrc: int, packet: OpusPacket) -> None:
+        stream = self.streams.get(ssrc)
+        if stream is None:
+            stream = self.streams[ssrc] = OpusStream(ssrc, int(settings.recording_user_buffer_mb * MB))
+        stream.append(packet)
+        if self.on_speech is not None and self.speech_started_at is None:
+            self._detect_packet_speech(ssrc, packet)
+
+    def _detect_packet_speech(self, ssrc: int, packet: OpusPacket) -> None:
+        """Начало ответа — recording_barge_in_speech_frames пакетов подряд
+
+        Клиент Discord шлет пакеты только пока говорит; короткий всплеск шума ответ не начинает.
+        """
+        user = self._user_for_ssrc(ssrc)
+        if user is None or (self.filtered_users and user not in self.filtered_users):
+            return
+        previous = self._last_sequence.get(ssrc)
+        self._last_sequence[ssrc] = packet.sequence
+        if previous is not None and packet.sequence == (previous + 1) & 0xFFFF:
+            self._speech_run += 1
+        else:
+            self._speech_run = 1
+        if self._speech_run >= settings.recording_barge_in_speech_frames:
+            self._mark_speech(user)
+
+    def cleanup(self):
+        super().cleanup()
+        for ssrc, stream in self.streams.items():
+            user = self._user_for_ssrc(ssrc)
+            if user is None:
+                logger.debug(f"SSRC {ssrc} не сопоставлен пользователю, поток пропущен")
+                continue
+            if self.filtered_users and user not in self.filtered_users:
+                continue
+            self.user_streams[user] = stream
+
+    def decode_user(self, user_id: int) -> bytes:
+        """Декодировать поток пользователя в PCM16 стерео 48 кГц (блокирующий вызов)"""
+        stream = self.user_streams.get(user_id)
+        if stream is None:
+            return b""
+
+        decoder = discord.opus.Decoder()
+        frame_bytes = self.channels * self.sample_width
+        pcm = bytearray()
+        previous: Optional[OpusPacket] = None
+
+        for packet in stream.ordered():
+            if previous is not None:
+                lost = (packet.sequence - previous.sequence - 1) & 0xFFFF
+                for _ in range(min(lost, MAX_CONCEALED_FRAMES)):
+                    pcm += decoder.decode(None)
+                # Разрыв длиннее, чем покрывает маскировка потерь, заполняем тишиной
+                gap = (packet.timestamp - previous.timestamp) & 0xFFFFFFFF
+                missing = gap - SAMPLES_PER_FRAME * (1 + min(lost, MAX_CONCEALED_FRAMES))
+                if 0 < missing < self.sample_rate * self.duration * 2:
+                    pcm += b"\x00" * (missing * frame_bytes)
+            pcm += decoder.decode(packet.payload)
+            previous = packet
+
+        return bytes(pcm)
+
+    def write_ogg(self, user_id: int, f: BinaryIO, start: int = 0, end: Optional[int] = None) -> int:
+        """Упаковать поток пользователя в OGG без декодирования
+
+        start/end — окно в отсчетах декодированного PCM: decode_user заполняет
+        разрывы, поэтому позиция пакета равна смещению его RTP timestamp.
+        """
+        writer = OggOpusWriter(f, channels=self.channels)
+        stream = self.user_streams.get(user_id)
+        packets = stream.ordered() if stream else []
+        for packet in packets:
+            offset = (packet.timestamp - packets[0].timestamp) & 0xFFFFFFFF
+            if offset + SAMPLES_PER_FRAME <= start or (end is not None and offset >= end):
+                continue
+            writer.write_packet(packet.payload)
+        return writer.close()
+
+    def release(self):
+        super().release()
+        self.streams.clear()
+        self.user_streams.clear()
+
+    def memory_stats(self) -> dict:
+        stats = super().memory_stats()
+        stats['opus_streams'] = len(self.streams)
+        stats['opus_bytes'] = sum(stream.size_bytes for stream in self.streams.values())
+        stats['opus_packets'] = sum(len(stream.packets) for stream in self.streams.values())
+        return stats
+
+
+class CaptureVoiceClient(discord.VoiceClient):
+    """Голосовой клиент, передающий Opus пакеты в OpusCaptureSink до декодера
+
+    Для любого CustomWaveSink дополнительно собирает RTP статистику потоков.
+    """
+
+    def unpack_audio(self, data):
+        sink = getattr(self, 'sink', None)
+        if 200 <= data[1] <= 204 or self.paused:
+            # RTCP пакеты не содержат звука
+            return super().unpack_audio(data)
+
+        if isinstance(sink, CustomWaveSink):
+            # Заголовок RTP не шифруется: номер, таймстамп и SSRC читаем до расшифровки
+            sequence, timestamp, ssrc = RTP_HEADER.unpack_from(data, 2)
+            sink.observe_rtp(ssrc, sequence, timestamp, time.perf_counter())
+
+        if not isinstance(sink, OpusCaptureSink):
+            return super().unpack_audio(data)
+
+        raw = RawData(data, self)
+        if raw.decrypted_data is None or raw.decrypted_data == OPUS_SILENCE_FRAME:
+            return
+
+        payload = bytes(raw.decrypted_data)
+        sink.write_packet(raw.ssrc, OpusPacket(raw.sequence, raw.timestamp, raw.receive_time, payload))
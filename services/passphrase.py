@@ -0,0 +1,188 @@
+import math
+import os
+import wave
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from config.settings import settings
+from services.audio_features import HAS_NUMPY, read_wav_mono
+from utils.logger import logger
+
+if HAS_NUMPY:
+    import numpy as np
+
+MATCH_RATE = 16000
+FRAME_LENGTH = 400  # 25 ms
+FRAME_HOP = 320  # 20 ms: вдвое меньше кадров и вчетверо меньше ячеек DTW
+FFT_SIZE = 512
+MEL_FILTERS = 26
+CEPSTRA = 13
+PRE_EMPHASIS = 0.97
+# Края записи тише пика на 35 dB считаются паузой и обрезаются
+TRIM_BELOW_PEAK_DB = 35
+
+
+@lru_cache(maxsize=4)
+def _mel_filterbank(sample_rate: int) -> "np.ndarray":
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    mel_points = np.linspace(to_mel(0.0), to_mel(sample_rate / 2), MEL_FILTERS + 2)
+    hz_points = 700.0 * (10 ** (mel_points / 2595.0) - 1.0)
+    bins = np.floor((FFT_SIZE + 1) * hz_points / sample_rate).astype(int)
+    filterbank = np.zeros((MEL_FILTERS, FFT_SIZE // 2 + 1), dtype=np.float32)
+    for index in range(1, MEL_FILTERS + 1):
+        left, center, right = bins[index - 1], bins[index], bins[index + 1]
+        if center > left:
+            filterbank[index - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filterbank[index - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filterbank
+
+
+@lru_cache(maxsize=1)
+def _dct_matrix() -> "np.ndarray":
+    n = np.arange(MEL_FILTERS)
+    k = np.arange(CEPSTRA)[:, None]
+    return (np.cos(math.pi * k * (2 * n + 1) / (2 * MEL_FILTERS)) * math.sqrt(2.0 / MEL_FILTERS)).astype(np.float32)
+
+
+def mfcc(mono: "np.ndarray", sample_rate: int) -> "np.ndarray":
+    """MFCC без c0 с нормализацией среднего; паузы по краям отрезаются"""
+    if len(mono) < FRAME_LENGTH:
+        return np.zeros((0, CEPSTRA - 1), dtype=np.float32)
+    emphasized = np.append(mono[0], mono[1:] - PRE_EMPHASIS * mono[:-1]).astype(np.float32)
+    count = 1 + (len(emphasized) - FRAME_LENGTH) // FRAME_HOP
+    indices = np.arange(FRAME_LENGTH)[None, :] + FRAME_HOP * np.arange(count)[:, None]
+    frames = emphasized[indices] * np.hamming(FRAME_LENGTH).astype(np.float32)
+
+    power = np.abs(np.fft.rfft(frames, FFT_SIZE, axis=1)) ** 2 / FFT_SIZE
+    energy = power.sum(axis=1)
+    voiced = np.flatnonzero(energy > energy.max() * 10 ** (-TRIM_BELOW_PEAK_DB / 10))
+    if len(voiced) == 0:
+        return np.zeros((0, CEPSTRA - 1), dtype=np.float32)
+    power = power[voiced[0]:voiced[-1] + 1]
+
+    mel_energy = np.log(power @ _mel_filterbank(sample_rate).T + 1e-10)
+    cepstra = (mel_energy @ _dct_matrix().T)[:, 1:]
+    return cepstra - cepstra.mean(axis=0)
+
+
+def dtw_distance(a: "np.ndarray", b: "np.ndarray", band_ratio: float) -> float:
+    """DTW с полосой Сакоэ-Чибы, нормированное на длину пути
+
+    Ячейки одной антидиагонали зависят только от двух предыдущих, поэтому
+    каждая антидиагональ считается одной векторной операцией.
+    """
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        return math.inf
+    cost = np.sqrt(np.maximum(
+        (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2.0 * a @ b.T, 0.0
+    ))
+    radius = max(abs(n - m), band_ratio * max(n, m), 1.0)
+    slope = n / m
+
+    # Плоские индексы: сосед сверху — -(m + 1), слева — -1, по диагонали — -(m + 2)
+    width = m + 1
+    total = np.full((n + 1) * width, np.inf, dtype=np.float64)
+    total[0] = 0.0
+    flat_cost = cost.ravel()
+    for diagonal in range(2, n + m + 1):
+        # Полоса |i - j * n / m| <= radius при j = diagonal - i, с учетом разной длины последовательностей
+        low = max(1, diagonal - m, math.ceil((diagonal * slope - radius) / (1 + slope)))
+        high = min(n, diagonal - 1, math.floor((diagonal * slope + radius) / (1 + slope)))
+        if low > high:
+            continue
+        i = np.arange(low, high + 1)
+        index = i * (width - 1) + diagonal
+        best = np.minimum(np.minimum(total[index - width], total[index - 1]), total[index - width - 1])
+        total[index] = flat_cost[(i - 1) * m + (diagonal - i - 1)] + best
+    return float(total[n * width + m] / (n + m))
+
+
+@dataclass
+class PassphraseTemplate:
+    name: str
+    features: "np.ndarray"
+
+
+class PassphraseMatcher:
+    """Офлайн проверка фразы: MFCC ответа против эталонных записей через DTW
+
+    Эталоны — WAV файлы из каталогов settings.passphrase_templates. Признаки
+    считаются один раз при создании. Масштаб расстояний берется из попарных
+    расстояний между эталонами (разброс произношения), а при одном эталоне —
+    из passphrase_distance_scale.
+    """
+
+    def __init__(self, template_dirs: Dict[str, str]):
+        self.templates: Dict[str, List[PassphraseTemplate]] = {}
+        self.scales: Dict[str, float] = {}
+        if not HAS_NUMPY:
+            if template_dirs:
+                logger.warning("⚠️ numpy не установлен — проверка фразы отключена")
+            return
+        for question, directory in template_dirs.items():
+            templates = self._load_templates(directory)
+            if templates:
+                self.templates[question] = templates
+                self.scales[question] = self._distance_scale(templates)
+                logger.info(f"🗣️ Эталоны фразы: {len(templates)} из {directory}, масштаб {self.scales[question]:.2f}")
+
+    @staticmethod
+    def _load_templates(directory: str) -> List[PassphraseTemplate]:
+        if not os.path.isdir(directory):
+            logger.info(f"Каталог эталонов фразы {directory} не найден — проверка фразы для него отключена")
+            return []
+        templates = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.lower().endswith(".wav"):
+                continue
+            try:
+                mono, sample_rate = read_wav_mono(os.path.join(directory, filename), MATCH_RATE)
+            except (OSError, EOFError, wave.Error, ValueError, KeyError) as e:
+                logger.warning(f"⚠️ Эталон {filename} пропущен: {e}")
+                continue
+            features = mfcc(mono, sample_rate)
+            if len(features):
+                templates.append(PassphraseTemplate(filename, features))
+        return templates
+
+    @staticmethod
+    def _distance_scale(templates: List[PassphraseTemplate]) -> float:
+        distances = [
+            dtw_distance(first.features, second.features, settings.passphrase_dtw_band)
+            for index, first in enumerate(templates) for second in templates[index + 1:]
+        ]
+        if not distances:
+            return settings.passphrase_distance_scale
+        return max(float(np.median(distances)), 1e-3)
+
+    def has_templates(self, question: Optional[str]) -> bool:
+        return question in self.templates
+
+    def match_signal(self, mono: "np.ndarray", sample_rate: int, question: str) -> Optional[dict]:
+        """Сравнить моно сигнал ответа на MATCH_RATE с эталонами вопроса (блокирующий вызов)"""
+        templates = self.templates.get(question)
+        if not templates:
+            return None
+        features = mfcc(mono, sample_rate)
+
+        best_distance, best_template = math.inf, None
+        for template in templates:
+            distance = dtw_distance(features, template.features, settings.passphrase_dtw_band)
+            if distance < best_distance:
+                best_distance, best_template = distance, template.name
+
+        ratio = best_distance / self.scales[question]
+        accept, reject = settings.passphrase_accept_ratio, settings.passphrase_reject_ratio
+        score = 1.0 - min(1.0, max(0.0, ratio - accept) / (reject - accept))
+        return {
+            'matched': ratio <= accept,
+            'score': score,
+            'distance': best_distance if math.isfinite(best_distance) else None,
+            'ratio': ratio if math.isfinite(ratio) else None,
+            'template': best_template,
+        }
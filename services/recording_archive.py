@@ -0,0 +1,327 @@
+import atexit
+import gzip
+import hashlib
+import os
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from config.settings import settings
+from services.audio_buffers import MB
+from utils.logger import logger
+
+ARCHIVE_SUFFIX = ".wav.gz"
+STAGING_DIR = "staging"
+BLOBS_DIR = "blobs"
+MANIFEST_NAME = "manifest.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    question INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    duration REAL,
+    quality INTEGER
+);
+CREATE INDEX IF NOT EXISTS recordings_guild ON recordings (guild_id, created_at);
+CREATE INDEX IF NOT EXISTS recordings_user ON recordings (user_id, created_at);
+CREATE INDEX IF NOT EXISTS recordings_question ON recordings (question, created_at);
+CREATE INDEX IF NOT EXISTS recordings_created ON recordings (created_at);
+CREATE INDEX IF NOT EXISTS recordings_blob ON recordings (sha256);
+"""
+
+
+@dataclass
+class ArchiveJob:
+    """Ответ, ожидающий записи в архив"""
+    staged_path: str
+    guild_id: int
+    user_id: int
+    question: int
+    created_at: float
+    duration: Optional[float] = None
+    quality: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+@dataclass
+class _PendingBlob:
+    sha256: str
+    temp_path: str
+    final_path: str
+    size_bytes: int
+    stored_bytes: int
+    file: Optional[BinaryIO] = None
+
+
+@dataclass
+class _Batch:
+    jobs: List[ArchiveJob] = field(default_factory=list)
+    blobs: Dict[str, _PendingBlob] = field(default_factory=dict)
+    started: float = field(default_factory=time.monotonic)
+
+
+def blob_path(archive_dir: str, sha256: str) -> str:
+    """Путь блоба по хэшу содержимого: blobs/ab/cd/abcd….wav.gz"""
+    return os.path.join(archive_dir, BLOBS_DIR, sha256[:2], sha256[2:4], sha256 + ARCHIVE_SUFFIX)
+
+
+def read_blob(path: str) -> bytes:
+    """Исходный WAV архивной записи"""
+    with gzip.open(path, "rb") as f:
+        return f.read()
+
+
+class RecordingArchive:
+    """Архив ответов с адресацией по содержимому
+
+    Ответ сохраняется один раз под SHA-256 своего WAV в сжатом виде;
+    манифест SQLite связывает блобы с гильдией, пользователем, вопросом и
+    временем. Сжатие, запись и fsync выполняет фоновый поток пачками;
+    из цикла событий вызываются только неблокирующие submit() и
+    request_janitor(). Janitor применяет ограничения по возрасту и
+    размеру и удаляет временные файлы, оставшиеся после сбоев.
+    """
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+        self.staging_dir = os.path.join(archive_dir, STAGING_DIR)
+        self.archived = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._staged = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="recording-archive", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, filepath: str, guild_id: int, user_id: int, question: int,
+               duration: Optional[float] = None, quality: Optional[int] = None) -> bool:
+        """Поставить файл ответа в очередь архива
+
+        Файл сразу связывается жесткой ссылкой в staging, поэтому исходный
+        можно удалять, не дожидаясь записи.
+        """
+        self._ensure_started()
+        self._staged += 1
+        staged_path = os.path.join(self.staging_dir, f"{os.getpid()}_{self._staged}_{os.path.basename(filepath)}")
+        try:
+            try:
+                os.link(filepath, staged_path)
+            except OSError:
+                # Другая файловая система — копируем
+                shutil.copyfile(filepath, staged_path)
+        except OSError as e:
+            self.failed += 1
+            logger.warning(f"⚠️ Не удалось передать запись {filepath} в архив: {e}")
+            return False
+        self._queue.put(ArchiveJob(staged_path, guild_id, user_id, question, time.time(), duration, quality))
+        return True
+
+    def request_janitor(self) -> None:
+        if self._thread is not None:
+            self._queue.put("janitor")
+
+    def close(self) -> None:
+        """Дописать очередь и остановить поток"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # Поток архива
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(os.path.join(self.archive_dir, MANIFEST_NAME))
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _run(self) -> None:
+        batch = _Batch()
+        while True:
+            timeout = None
+            if batch.jobs:
+                timeout = max(0.0, batch.started + settings.archive_batch_seconds - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = "flush"
+
+            if isinstance(item, ArchiveJob):
+                if not batch.jobs:
+                    batch.started = time.monotonic()
+                self._guard(self._stage, batch, item)
+                if len(batch.jobs) < settings.archive_batch_size:
+                    continue
+                item = "flush"
+
+            if batch.jobs:
+                self._guard(self._flush, batch)
+                batch = _Batch()
+            if item == "janitor":
+                self._guard(self._janitor)
+            elif item is None:
+                if self._db is not None:
+                    self._db.close()
+                    self._db = None
+                return
+
+    def _guard(self, action, *args) -> None:
+        try:
+            action(*args)
+        except (OSError, sqlite3.Error, EOFError) as e:
+            self.failed += 1
+            logger.error(f"❌ Ошибка архива записей: {e}")
+
+    def _stage(self, batch: _Batch, job: ArchiveJob) -> None:
+        """Хэшировать и сжать ответ; fsync и манифест — при сбросе пачки"""
+        with open(job.staged_path, "rb") as f:
+            data = f.read()
+        sha256 = job.sha256 = hashlib.sha256(data).hexdigest()
+
+        exists = sha256 in batch.blobs or self.db.execute(
+            "SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)
+        ).fetchone() is not None
+        if exists:
+            self.deduplicated += 1
+        else:
+            final_path = blob_path(self.archive_dir, sha256)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            temp_path = f"{final_path}.{os.getpid()}.tmp"
+            compressed = gzip.compress(data, compresslevel=settings.archive_compression_level, mtime=0)
+            f = open(temp_path, "wb")
+            f.write(compressed)
+            batch.blobs[sha256] = _PendingBlob(sha256, temp_path, final_path, len(data), len(compressed), f)
+        batch.jobs.append(job)
+        os.remove(job.staged_path)
+
+    def _flush(self, batch: _Batch) -> None:
+        directories = set()
+        for blob in batch.blobs.values():
+            blob.file.flush()
+            os.fsync(blob.file.fileno())
+            blob.file.close()
+            os.replace(blob.temp_path, blob.final_path)
+            directories.add(os.path.dirname(blob.final_path))
+        for directory in directories:
+            descriptor = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO blobs (sha256, path, size_bytes, stored_bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (blob.sha256, os.path.relpath(blob.final_path, self.archive_dir), blob.size_bytes, blob.stored_bytes, time.time())
+                    for blob in batch.blobs.values()
+                ]
+            )
+            self.db.executemany(
+                "INSERT INTO recordings (sha256, guild_id, user_id, question, created_at, duration, quality) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (job.sha256, job.guild_id, job.user_id, job.question, job.created_at, job.duration, job.quality)
+                    for job in batch.jobs
+                ]
+            )
+        self.archived += len(batch.jobs)
+        logger.debug(f"🗄️ В архив записано ответов: {len(batch.jobs)}, новых блобов: {len(batch.blobs)}")
+
+    def _janitor(self) -> None:
+        cutoff = time.time() - settings.archive_retention_days * 24 * 3600
+        with self.db:
+            expired = self.db.execute("DELETE FROM recordings WHERE created_at < ?", (cutoff,)).rowcount
+        removed_blobs = self._remove_unreferenced_blobs()
+
+        limit = int(settings.archive_max_mb * MB)
+        while (self.db.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM blobs").fetchone()[0]) > limit:
+            with self.db:
+                trimmed = self.db.execute(
+                    "DELETE FROM recordings WHERE id IN (SELECT id FROM recordings ORDER BY created_at LIMIT 100)"
+                ).rowcount
+            expired += trimmed
+            removed_blobs += self._remove_unreferenced_blobs()
+            if not trimmed:
+                break
+
+        orphans = self._sweep_orphans()
+        if expired or removed_blobs or orphans:
+            logger.info(
+                f"🧹 Архив: удалено записей {expired}, блобов {removed_blobs}, временных файлов {orphans}"
+            )
+
+    def _remove_unreferenced_blobs(self) -> int:
+        rows = self.db.execute(
+            "SELECT sha256, path FROM blobs WHERE NOT EXISTS "
+            "(SELECT 1 FROM recordings WHERE recordings.sha256 = blobs.sha256)"
+        ).fetchall()
+        for _, path in rows:
+            try:
+                os.remove(os.path.join(self.archive_dir, path))
+            except FileNotFoundError:
+                pass
+        with self.db:
+            self.db.executemany("DELETE FROM blobs WHERE sha256 = ?", [(sha256,) for sha256, _ in rows])
+        return len(rows)
+
+    def _sweep_orphans(self) -> int:
+        """Временные файлы старше archive_orphan_seconds — остатки упавших процессов"""
+        deadline = time.time() - settings.archive_orphan_seconds
+        removed = 0
+        for directory, suffixes in (
+            (self.staging_dir, None),
+            (os.path.join(self.archive_dir, BLOBS_DIR), (".tmp",)),
+            (settings.recording_temp_dir, (".wav", ".ogg")),
+            (settings.recording_spill_dir, (".pcm",)),
+        ):
+            for path in self._walk(directory):
+                if suffixes and not path.endswith(suffixes):
+                    continue
+                try:
+                    if os.path.getmtime(path) < deadline:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    @staticmethod
+    def _walk(directory: str) -> Iterator[str]:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                yield os.path.join(root, name)
+
+    def stats(self) -> dict:
+        return {
+            'archived': self.archived,
+            'deduplicated': self.deduplicated,
+            'failed': self.failed,
+            'queued': self._queue.qsize(),
+        }
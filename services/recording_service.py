@@ -1,56 +1,82 @@
-import os
 import asyncio
-from typing import Callable
+import os
+from typing import Callable, Optional
 from datetime import datetime
 import discord
 from discord.sinks import WaveSink
+from config.settings import settings
+from services.guild_cache import guild_resources
+from services.member_resolver import member_resolver
+from services.audio_buffers import MB, WAV_HEADER_BYTES, RecordingMemoryBudget, UserAudioBuffer, wav_header
+from services.audio_features import speech_window
+from services.opus_capture import OpusCaptureSink
+from services.shared_pcm import pcm_pool
+from services.sinks import CustomWaveSink
 from utils.logger import logger
 from utils.helpers import sanitize_filename
+from utils.timer_wheel import TimerWheel
 from core.exceptions import RecordingException
 
-class CustomWaveSink(WaveSink):
-    """Кастомный Sink для записи аудио"""
-    def __init__(self):
-        super().__init__()
-
 class RecordingService:
     """Сервис управления голосовыми записями"""
    
-    def __init__(self):
+    def __init__(self, scheduler: Optional[TimerWheel] = None):
         self.active_recordings = {}
+        self.scheduler = scheduler or TimerWheel()
+        self.memory_budget = RecordingMemoryBudget(int(settings.recording_memory_budget_mb * MB))
    
     async def start_recording(
         self,
         voice_client: discord.VoiceClient,
         duration: int,
         callback: Callable,
-        session_id: str
+        session_id: str,
+        speaker_id: Optional[int] = None
     ) -> bool:
-        """Запустить запись на заданную длительность"""
+        """Запустить запись на заданную длительность
+
+        С speaker_id запись идет в режиме перебивания: захватывается только
+        дорожка этого пользователя, а отсчет длительности начинается с его
+        первой речи. Запускается до вопроса; пока вопрос звучит, запись
+        ограничена только дедлайном воспроизведения, затем вызывающий
+        сообщает prompt_finished().
+        """
         try:
             if session_id in self.active_recordings:
                 logger.warning(f"🎙️ Запись уже активна для сессии {session_id}")
                 return False
            
-            sink = CustomWaveSink()
+            barge_in = speaker_id is not None
+            if barge_in:
+                loop = asyncio.get_running_loop()
+                sink = self._create_sink(
+                    duration,
+                    filters={'users': [speaker_id]},
+                    on_speech=lambda user: loop.call_soon_threadsafe(self._on_speech_started, voice_client, session_id)
+                )
+            else:
+                sink = self._create_sink(duration)
             self.active_recordings[session_id] = {
                 'sink': sink,
                 'start_time': datetime.utcnow(),
                 'duration': duration,
                 'voice_client': voice_client,
-                'stop_task': None
+                'barge_in': barge_in,
+                'speech_time': None,
+                'stop_handle': None
             }
            
             # Запускаем запись
             voice_client.start_recording(sink, callback=callback)
-            logger.info(f"🎙️ Запись начата на {duration} секунд для сессии {session_id}")
-           
-            # Создаем задачу для автоматической остановки
-            stop_task = asyncio.create_task(self._auto_stop_recording(voice_client, session_id, duration))
-            self.active_recordings[session_id]['stop_task'] = stop_task
            
-            # Показываем индикатор записи (неблокирующий)
-            asyncio.create_task(self._show_recording_indicator(voice_client.guild, session_id, duration))
+            # Дедлайн остановки и индикатор записи ставим в колесо таймеров
+            if barge_in:
+                logger.info(f"🎙️ Запись с перебиванием начата для сессии {session_id}: {duration}с от начала речи")
+                self._set_stop_deadline(voice_client, session_id, settings.stage_timeouts["prompt"] + settings.recording_barge_in_wait)
+            else:
+                logger.info(f"🎙️ Запись начата на {duration} секунд для сессии {session_id}")
+                self._set_stop_deadline(voice_client, session_id, duration)
+            self.scheduler.schedule(0, self._show_recording_indicator, voice_client.guild, session_id, duration, sink, key=session_id)
            
             return True
        
@@ -60,11 +86,47 @@ class RecordingService:
                 del self.active_recordings[session_id]
             raise RecordingException(f"Не удалось начать запись: {e}")
 
-    async def _auto_stop_recording(self, voice_client: discord.VoiceClient, session_id: str, duration: int):
-        """Автоматически остановить запись через заданное время"""
+    def prompt_finished(self, session_id: str) -> Optional[float]:
+        """Вопрос доиграл: без речи ждем начала ответа recording_barge_in_wait секунд
+
+        Возвращает, сколько еще секунд максимум продлится запись, или None,
+        если запись уже завершена.
+        """
+        recording = self.active_recordings.get(session_id)
+        if recording is None:
+            return None
+        if not recording['barge_in']:
+            return float(recording['duration'])
+        if recording['speech_time'] is None:
+            self._set_stop_deadline(recording['voice_client'], session_id, settings.recording_barge_in_wait)
+            return settings.recording_barge_in_wait + recording['duration']
+        elapsed = (datetime.utcnow() - recording['speech_time']).total_seconds()
+        return max(0.0, recording['duration'] - elapsed)
+
+    def _on_speech_started(self, voice_client: discord.VoiceClient, session_id: str) -> None:
+        """Первая речь пользователя: окно записи отсчитывается от нее"""
+        recording = self.active_recordings.get(session_id)
+        if recording is None or recording['speech_time'] is not None:
+            return
+        recording['speech_time'] = datetime.utcnow()
+        offset = (recording['speech_time'] - recording['start_time']).total_seconds()
+        logger.info(f"🗣️ Речь в сессии {session_id} через {offset:.1f}с после начала захвата")
+        self._set_stop_deadline(voice_client, session_id, recording['duration'])
+
+    def _set_stop_deadline(self, voice_client: discord.VoiceClient, session_id: str, delay: float) -> None:
+        recording = self.active_recordings[session_id]
+        if recording['stop_handle'] is not None:
+            self.scheduler.cancel(recording['stop_handle'])
+        recording['stop_handle'] = self.scheduler.schedule(delay, self._auto_stop_recording, voice_client, session_id, key=session_id)
+
+    def _create_sink(self, duration: int, **kwargs) -> CustomWaveSink:
+        if settings.recording_capture_mode == "opus":
+            return OpusCaptureSink(duration, self.memory_budget, **kwargs)
+        return CustomWaveSink(duration, self.memory_budget, **kwargs)
+
+    def _auto_stop_recording(self, voice_client: discord.VoiceClient, session_id: str):
+        """Автоматически остановить запись по дедлайну"""
         try:
-            await asyncio.sleep(duration)
-            
             if session_id in self.active_recordings and voice_client.recording:
                 voice_client.stop_recording()
                 
@@ -75,21 +137,17 @@ class RecordingService:
                 
                 logger.success(f"🎙️ Запись автоматически завершена для сессии {session_id}")
                 logger.success(f"📊 Запись {session_id}: фактическая длительность {actual_duration:.1f}с")
-                
-        except asyncio.CancelledError:
-            logger.info(f"⏹️ Автоостановка записи отменена для сессии {session_id}")
+
+            self.active_recordings.pop(session_id, None)
+
         except Exception as e:
             logger.error(f"❌ Ошибка автоостановки записи: {e}")
    
-    async def _show_recording_indicator(self, guild: discord.Guild, session_id: str, duration: int):
+    async def _show_recording_indicator(self, guild: discord.Guild, session_id: str, duration: int, sink: CustomWaveSink):
         """Показать индикатор записи в системном канале (если есть)"""
         try:
-            # Попытаемся найти системный канал
-            system_channel = None
-            for channel in guild.text_channels:
-                if 'верификация' in channel.name.lower() or 'verification' in channel.name.lower():
-                    system_channel = channel
-                    break
+            # Системный канал берем из кэша ресурсов гильдии
+            system_channel = guild_resources.get(guild).indicator_channel
             
             if not system_channel:
                 return  # Если нет подходящего канала, просто пропускаем
@@ -121,8 +179,8 @@ class RecordingService:
                 value=f"""```ini
 [AUDIO_SETTINGS]
 Format=WAV
-Quality=44.1kHz
-Channels=Stereo
+Quality={sink.sample_rate / 1000:g}kHz
+Channels={'Stereo' if sink.channels == 2 else 'Mono'}
 Duration={duration}s
 ```""",
                 inline=False
@@ -147,9 +205,9 @@ Duration={duration}s
            
             recording_info = self.active_recordings[session_id]
             
-            # Отменяем задачу автоостановки, если она существует
-            if recording_info.get('stop_task'):
-                recording_info['stop_task'].cancel()
+            # Отменяем дедлайн автоостановки и индикатор
+            if self.scheduler.cancel_key(session_id):
+                logger.info(f"⏹️ Автоостановка записи отменена для сессии {session_id}")
            
             if voice_client.recording:
                 voice_client.stop_recording()
@@ -172,9 +230,20 @@ Duration={duration}s
         self,
         sink: WaveSink,
         guild: discord.Guild,
-        output_dir: str = "temp_recordings"
+        output_dir: Optional[str] = None,
+        only_user_id: Optional[int] = None,
+        shared_owner: Optional[int] = None
     ) -> list:
-        """Сохранить записанные аудиофайлы с детальной статистикой"""
+        """Сохранить записанные аудиофайлы с детальной статистикой
+
+        only_user_id ограничивает сохранение одним пользователем — для Opus
+        записи остальные потоки не декодируются вовсе. С shared_owner PCM
+        ответа дополнительно кладется в разделяемую память для воркеров
+        анализа (file_info['pcm']), аренда принадлежит этой сессии.
+        При recording_trim_enabled сохраняется только окно речи с запасом
+        recording_trim_margin_ms; исходная и итоговая длительность — в
+        file_info['window'].
+        """
         saved_files = []
         stats = {
             'total_files': 0,
@@ -183,12 +252,18 @@ Duration={duration}s
             'processing_start': datetime.utcnow()
         }
        
+        output_dir = output_dir or settings.recording_temp_dir
         try:
             os.makedirs(output_dir, exist_ok=True)
             logger.info(f"📁 Создана/проверена директория: {output_dir}")
            
-            for user_id, audio in sink.audio_data.items():
-                member = guild.get_member(user_id)
+            captures_packets = isinstance(sink, OpusCaptureSink) and sink.captures_packets
+            recorded = sink.user_streams if captures_packets else sink.audio_data
+
+            for user_id, audio in recorded.items():
+                if only_user_id is not None and user_id != only_user_id:
+                    continue
+                member = await member_resolver.fetch(guild, user_id)
                 if not member:
                     logger.warning(f"⚠️ Пользователь {user_id} не найден в гильдии")
                     continue
@@ -198,10 +273,37 @@ Duration={duration}s
                 filepath = os.path.join(output_dir, filename)
                
                 # Сохраняем файл
+                pcm = None
+                if captures_packets:
+                    # Декодируем только этот поток и не в цикле событий
+                    pcm = await asyncio.get_running_loop().run_in_executor(None, sink.decode_user, user_id)
+                elif settings.recording_trim_enabled and isinstance(audio, UserAudioBuffer):
+                    pcm = audio.getvalue()
+
+                window = None
+                if pcm and settings.recording_trim_enabled:
+                    window = await asyncio.get_running_loop().run_in_executor(
+                        None, speech_window, pcm, sink.channels, sink.sample_width, sink.sample_rate,
+                        settings.recording_trim_margin_ms
+                    )
+                    if window and window.trimmed:
+                        frame_bytes = sink.channels * sink.sample_width
+                        pcm = memoryview(pcm)[window.start * frame_bytes:window.end * frame_bytes]
+                        logger.info(
+                            f"✂️ {member.display_name}: тишина обрезана, {window.raw_duration:.1f}s → {window.duration:.1f}s"
+                        )
+
                 with open(filepath, "wb") as f:
-                    audio_buffer = audio.file.getbuffer()
-                    f.write(audio_buffer)
-                    file_size = len(audio_buffer)
+                    if pcm is not None:
+                        f.write(wav_header(len(pcm), sink.channels, sink.sample_width, sink.sample_rate))
+                        f.write(pcm)
+                        file_size = WAV_HEADER_BYTES + len(pcm)
+                    elif isinstance(audio, UserAudioBuffer):
+                        file_size = audio.write_wav(f, sink.channels, sink.sample_width, sink.sample_rate)
+                    else:
+                        audio_buffer = audio.file.getbuffer()
+                        f.write(audio_buffer)
+                        file_size = len(audio_buffer)
                
                 # Собираем статистику
                 stats['total_files'] += 1
@@ -215,8 +317,21 @@ Duration={duration}s
                     'filepath': filepath,
                     'size_bytes': file_size,
                     'size_kb': file_size / 1024,
-                    'timestamp': datetime.utcnow()
+                    'timestamp': datetime.utcnow(),
+                    'network': sink.network_stats(user_id) if isinstance(sink, CustomWaveSink) else None,
+                    'window': window.to_dict() if window else None
                 }
+                if shared_owner is not None:
+                    if pcm is not None:
+                        file_info['pcm'] = pcm_pool.store(shared_owner, (pcm,), len(pcm), sink.channels, sink.sample_width, sink.sample_rate)
+                    elif isinstance(audio, UserAudioBuffer):
+                        file_info['pcm'] = pcm_pool.store(shared_owner, audio.iter_chunks(), audio.size, sink.channels, sink.sample_width, sink.sample_rate)
+                if captures_packets and settings.recording_upload_format == "ogg":
+                    upload_path = os.path.splitext(filepath)[0] + ".ogg"
+                    with open(upload_path, "wb") as f:
+                        start, end = (window.start, window.end) if window else (0, None)
+                        sink.write_ogg(user_id, f, start, end)
+                    file_info['upload_path'] = upload_path
                 saved_files.append(file_info)
                
                 logger.success(f"💾 Сохранена запись: {member.display_name} → {filename} ({file_size/1024:.1f} KB)")
@@ -250,7 +365,7 @@ Duration={duration}s
 │ Модуль:  RecordingService
 │ Метод:   save_audio_files
 │ Время:   {datetime.utcnow().strftime('%H:%M:%S')} UTC
-│ Файлов:  {stats['total_files']} из {len(sink.audio_data)}
+│ Файлов:  {stats['total_files']} из {len(sink.audio_data) or len(getattr(sink, 'user_streams', {}))}
 └──────────────────────┘
 ```
 
@@ -280,23 +395,27 @@ Duration={duration}s
                     text="⚠️ Система записи • Требуется вмешательство администратора"
                 )
 
-                # Попытаемся найти канал для отправки ошибки
-                for channel in guild.text_channels:
-                    if channel.permissions_for(guild.me).send_messages:
-                        await channel.send(embed=error_embed)
-                        break
+                # Канал для отправки ошибки
+                alert_channel = guild_resources.get(guild).alert_channel
+                if alert_channel:
+                    await alert_channel.send(embed=error_embed)
 
             except Exception as embed_error:
                 logger.error(f"Не удалось отправить эмбед ошибки: {embed_error}")
 
             return saved_files
+
+        finally:
+            if isinstance(sink, CustomWaveSink):
+                sink.release()
     
     def get_active_recordings_info(self) -> dict:
         """Получить информацию о всех активных записях"""
         info = {
             'count': len(self.active_recordings),
             'sessions': {},
-            'total_duration': 0
+            'total_duration': 0,
+            'memory': self.memory_budget.snapshot()
         }
         
         current_time = datetime.utcnow()
@@ -312,7 +431,8 @@ Duration={duration}s
                 'duration': duration,
                 'elapsed': elapsed,
                 'remaining': remaining,
-                'status': 'active' if remaining > 0 else 'finishing'
+                'status': 'active' if remaining > 0 else 'finishing',
+                'memory': recording_data['sink'].memory_stats()
             }
             info['total_duration'] += duration
         
@@ -379,6 +499,8 @@ Version=2.0
 Status={'ACTIVE' if info['count'] > 0 else 'IDLE'}
 Sessions={info['count']}
 Max_Concurrent=10
+Memory={info['memory']['in_memory_bytes'] / MB:.1f}/{info['memory']['limit_bytes'] / MB:.0f}MB
+Spilled={info['memory']['spilled_bytes'] / MB:.1f}MB
 ```""",
             inline=False
         )
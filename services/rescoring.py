@@ -0,0 +1,376 @@
+import csv
+import mmap
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from rich.table import Table
+
+from config.settings import settings
+from services.audio_features import extract_features_and_signal, pcm_to_mono, signal_at_rate
+from services.passphrase import MATCH_RATE, PassphraseMatcher
+from services.recording_archive import MANIFEST_NAME
+from utils.logger import logger
+
+GZIP_WBITS = 31
+SCORE_BUCKETS = (15, 30, 50, 70, 90, 101)
+
+# Поля признаков, которые воркер возвращает по каждому блобу
+FEATURE_FIELDS = ('duration', 'avg_volume', 'speech_seconds', 'snr_db', 'clipping_ratio', 'frames')
+
+_matcher: Optional[PassphraseMatcher] = None
+
+
+@dataclass
+class ManifestRecording:
+    id: int
+    sha256: str
+    path: str
+    size_bytes: int
+    guild_id: int
+    user_id: int
+    question: int
+    created_at: float
+    quality: Optional[int]
+
+
+@dataclass
+class RescoreReport:
+    """Старые и новые оценки архивных ответов"""
+    recordings: List[ManifestRecording]
+    old: np.ndarray
+    new: np.ndarray
+    blobs: int
+    failed: int
+    elapsed: float
+    parity_error: Optional[int] = None
+    pass_threshold: int = 50
+    unscored: List[int] = field(default_factory=list)
+
+
+def load_manifest(
+    archive_dir: str,
+    guild_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    question: Optional[int] = None,
+    since: Optional[float] = None,
+    limit: Optional[int] = None
+) -> List[ManifestRecording]:
+    """Записи манифеста архива по фильтрам (используют индексы recordings)"""
+    conditions, params = [], []
+    for column, value in (("guild_id", guild_id), ("user_id", user_id), ("question", question)):
+        if value is not None:
+            conditions.append(f"r.{column} = ?")
+            params.append(value)
+    if since is not None:
+        conditions.append("r.created_at >= ?")
+        params.append(since)
+    query = (
+        "SELECT r.id, r.sha256, b.path, b.size_bytes, r.guild_id, r.user_id, r.question, r.created_at, r.quality "
+        "FROM recordings r JOIN blobs b ON b.sha256 = r.sha256"
+    )
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY r.created_at"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+
+    db = sqlite3.connect(f"file:{os.path.join(archive_dir, MANIFEST_NAME)}?mode=ro", uri=True)
+    try:
+        return [ManifestRecording(*row) for row in db.execute(query, params)]
+    finally:
+        db.close()
+
+
+def parse_wav(buffer) -> Tuple[int, int, int, memoryview]:
+    """(каналы, ширина отсчета, частота, PCM) из WAV в памяти без копирования данных"""
+    view = memoryview(buffer)
+    if bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    position = 12
+    fmt = None
+    while position + 8 <= len(view):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", view, position)
+        body = position + 8
+        if chunk_id == b"fmt ":
+            _, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", view, body)
+            fmt = (channels, bits // 8, sample_rate)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("data chunk before fmt")
+            return (*fmt, view[body:min(body + chunk_size, len(view))])
+        position = body + chunk_size + (chunk_size & 1)
+    raise ValueError("no data chunk")
+
+
+def _init_worker(passphrases: bool) -> None:
+    global _matcher
+    if passphrases:
+        _matcher = PassphraseMatcher(settings.passphrase_templates)
+
+
+def analyze_blob(path: str, questions: Iterable[int]) -> dict:
+    """Признаки одного архивного блоба: файл отображается в память и распаковывается из mmap"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        wav = zlib.decompress(mapped, GZIP_WBITS)
+    channels, sample_width, sample_rate, pcm = parse_wav(wav)
+    features, mono, rate = extract_features_and_signal(pcm, channels, sample_width, sample_rate)
+    row = {
+        'duration': features.duration,
+        'avg_volume': int(features.rms * 10000),
+        'speech_seconds': features.speech_seconds,
+        'snr_db': features.snr_db,
+        'clipping_ratio': features.clipping_ratio,
+        'frames': features.frames,
+        'passphrase': {},
+    }
+    if _matcher is not None:
+        texts = {question: settings.questions[question] for question in questions if question < len(settings.questions)}
+        if any(_matcher.has_templates(text) for text in texts.values()):
+            signal = signal_at_rate(mono, rate, MATCH_RATE)
+            if signal is None:
+                signal = pcm_to_mono(pcm, channels, sample_width, sample_rate, MATCH_RATE)[0]
+            for question, text in texts.items():
+                match = _matcher.match_signal(signal, MATCH_RATE, text)
+                if match:
+                    row['passphrase'][question] = match['score']
+    return row
+
+
+def analyze_chunk(items: List[Tuple[str, str, List[int]]]) -> List[Tuple[str, Optional[dict]]]:
+    """Пачка блобов на одну задачу пула — меньше накладных расходов на IPC"""
+    results = []
+    for sha256, path, questions in items:
+        try:
+            results.append((sha256, analyze_blob(path, questions)))
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            logger.warning(f"⚠️ Не удалось проанализировать {sha256[:12]}: {e}")
+            results.append((sha256, None))
+    return results
+
+
+def signal_score_batch(speech_seconds, snr_db, clipping_ratio, frames, expected_duration) -> np.ndarray:
+    """Векторная AudioAnalyzer._calculate_signal_score; NaN — признаков нет"""
+    speech_target = np.maximum(0.5, expected_duration * 0.3)
+    speech_score = np.minimum(1.0, speech_seconds / speech_target)
+    snr_score = np.minimum(1.0, np.maximum(0.0, snr_db - 5) / 20)
+    clipping_score = 1.0 - np.minimum(1.0, clipping_ratio / 0.02)
+    score = speech_score * 0.5 + snr_score * 0.3 + clipping_score * 0.2
+    return np.where(frames > 0, score, np.nan)
+
+
+def score_batch(duration, file_size_kb, avg_volume, expected_duration,
+                signal_score=None, passphrase_score=None, network_score=None) -> np.ndarray:
+    """Векторная AudioAnalyzer._calculate_quality_metrics: оценка 15..100 для массивов ответов
+
+    Необязательные измерения передаются массивами с NaN там, где их нет.
+    """
+    duration = np.asarray(duration, dtype=np.float64)
+    file_size_kb = np.asarray(file_size_kb, dtype=np.float64)
+    avg_volume = np.asarray(avg_volume, dtype=np.float64)
+    expected = np.asarray(expected_duration, dtype=np.float64)
+    short = expected <= 3
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(expected > 0, duration / expected, 0.0)
+        duration_score = np.where(
+            expected > 0,
+            np.where(
+                short,
+                np.where(ratio >= 0.3,
+                         np.where(ratio <= 2.0, 1.0, np.maximum(0.7, 1.0 - (ratio - 2.0) * 0.2)),
+                         ratio / 0.3 * 0.8),
+                np.where(ratio >= 0.6,
+                         np.where(ratio <= 1.3, 1.0, np.maximum(0.8, 1.0 - (ratio - 1.3) * 0.3)),
+                         ratio / 0.6 * 0.7),
+            ),
+            np.where(duration > 0.5, 0.8, 0.3),
+        )
+
+        expected_size_kb = np.where(short, expected * 12, expected * 15)
+        min_ratio = np.where(short, 0.2, 0.3)
+        size_ratio = np.where(expected_size_kb > 0, file_size_kb / expected_size_kb, 0.0)
+        size_score = np.where(
+            expected_size_kb > 0,
+            np.where(size_ratio >= min_ratio, np.where(size_ratio <= 2.5, 1.0, 0.8), size_ratio / min_ratio * 0.6),
+            np.where(file_size_kb > 10, 0.7, 0.3),
+        )
+
+    volume_score = np.where(
+        avg_volume > 0,
+        np.where(
+            short,
+            np.where(avg_volume >= 300, np.where(avg_volume <= 8000, 1.0, 0.9), np.maximum(0.4, avg_volume / 300 * 0.8)),
+            np.where(avg_volume >= 500, np.where(avg_volume <= 6000, 1.0, 0.9), np.maximum(0.3, avg_volume / 500 * 0.7)),
+        ),
+        0.1,
+    )
+
+    quality = np.where(
+        short,
+        duration_score * 0.3 + volume_score * 0.5 + size_score * 0.2,
+        duration_score * 0.4 + volume_score * 0.4 + size_score * 0.2,
+    )
+    for extra, keep, weight in ((signal_score, 0.8, 0.2), (passphrase_score, 0.6, 0.4), (network_score, 0.85, 0.15)):
+        if extra is not None:
+            extra = np.asarray(extra, dtype=np.float64)
+            quality = np.where(np.isnan(extra), quality, quality * keep + np.nan_to_num(extra) * weight)
+    return np.clip(np.trunc(quality * 100), 15, 100).astype(np.int64)
+
+
+def _expected_durations(recordings: List[ManifestRecording]) -> np.ndarray:
+    durations = settings.recording_durations
+    return np.array([durations[r.question] if r.question < len(durations) else 0 for r in recordings], dtype=np.float64)
+
+
+def _parity_error(recordings, rows, expected, new, sample: int = 200) -> int:
+    """Наибольшее расхождение векторной оценки со скалярной на выборке"""
+    from services.audio_analysis import AudioAnalyzer
+
+    worst = 0
+    for index in np.linspace(0, len(recordings) - 1, min(sample, len(recordings))).astype(int):
+        recording, row = recordings[index], rows[index]
+        audio_data = {
+            'duration': row['duration'],
+            'file_size_kb': recording.size_bytes / 1024,
+            'avg_volume': row['avg_volume'],
+            'features': {name: row[name] for name in FEATURE_FIELDS},
+        }
+        if recording.question in row['passphrase']:
+            audio_data['passphrase'] = {'score': row['passphrase'][recording.question]}
+        scalar = AudioAnalyzer._calculate_quality_metrics(AudioAnalyzer.__new__(AudioAnalyzer), audio_data, int(expected[index]))
+        worst = max(worst, abs(scalar['quality'] - int(new[index])))
+    return worst
+
+
+def rescore(
+    archive_dir: str,
+    recordings: List[ManifestRecording],
+    workers: int,
+    chunk_size: int = 64,
+    passphrases: bool = True,
+    pass_threshold: int = 50,
+    check_parity: bool = True
+) -> RescoreReport:
+    """Пересчитать оценки записей текущей версией анализа в пуле процессов"""
+    started = time.perf_counter()
+    questions_by_blob: Dict[str, set] = {}
+    paths: Dict[str, str] = {}
+    for recording in recordings:
+        questions_by_blob.setdefault(recording.sha256, set()).add(recording.question)
+        paths[recording.sha256] = os.path.join(archive_dir, recording.path)
+
+    items = [(sha256, paths[sha256], sorted(questions)) for sha256, questions in questions_by_blob.items()]
+    chunks = [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+    results: Dict[str, Optional[dict]] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(passphrases,)) as pool:
+        futures = [pool.submit(analyze_chunk, chunk) for chunk in chunks]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.update(future.result())
+            if done % 20 == 0 or done == len(futures):
+                logger.info(f"🔁 Пересчитано блобов: {len(results)}/{len(items)}")
+
+    scored = [recording for recording in recordings if results.get(recording.sha256)]
+    unscored = [recording.id for recording in recordings if not results.get(recording.sha256)]
+    rows = [results[recording.sha256] for recording in scored]
+    expected = _expected_durations(scored)
+
+    columns = {name: np.array([row[name] for row in rows], dtype=np.float64) for name in FEATURE_FIELDS}
+    passphrase = np.array(
+        [row['passphrase'].get(recording.question, np.nan) for recording, row in zip(scored, rows)], dtype=np.float64
+    )
+    signal = signal_score_batch(
+        columns['speech_seconds'], columns['snr_db'], columns['clipping_ratio'], columns['frames'], expected
+    )
+    new = score_batch(
+        columns['duration'],
+        np.array([recording.size_bytes / 1024 for recording in scored], dtype=np.float64),
+        columns['avg_volume'],
+        expected,
+        signal_score=signal,
+        passphrase_score=passphrase,
+    )
+    old = np.array([recording.quality if recording.quality is not None else -1 for recording in scored], dtype=np.int64)
+
+    return RescoreReport(
+        recordings=scored,
+        old=old,
+        new=new,
+        blobs=len(items),
+        failed=sum(1 for result in results.values() if result is None),
+        elapsed=time.perf_counter() - started,
+        parity_error=_parity_error(scored, rows, expected, new) if check_parity and scored else None,
+        pass_threshold=pass_threshold,
+        unscored=unscored,
+    )
+
+
+def render_report(report: RescoreReport, top: int = 10) -> List[Table]:
+    """Таблицы сравнения: распределения, корзины оценок и крупнейшие изменения"""
+    known = report.old >= 0
+    old, new = report.old[known], report.new[known]
+    threshold = report.pass_threshold
+
+    summary = Table(title="🔁 Пересчет оценок архива", show_header=True)
+    summary.add_column("Метрика")
+    summary.add_column("Было", justify="right")
+    summary.add_column("Стало", justify="right")
+    for name, function in (("Среднее", np.mean), ("p10", lambda values: np.percentile(values, 10)),
+                           ("Медиана", np.median), ("p90", lambda values: np.percentile(values, 90))):
+        summary.add_row(name, *(f"{function(values):.1f}" if len(values) else "—" for values in (old, new)))
+    summary.add_row(f"Проходят (≥{threshold})", f"{int((old >= threshold).sum())}", f"{int((new >= threshold).sum())}")
+    summary.add_row("Прошли → не прошли", "", f"{int(((old >= threshold) & (new < threshold)).sum())}")
+    summary.add_row("Не прошли → прошли", "", f"{int(((old < threshold) & (new >= threshold)).sum())}")
+    summary.add_row("Записей / блобов", "", f"{len(report.recordings)} / {report.blobs}")
+    summary.add_row("Без старой оценки", "", f"{int((~known).sum())}")
+    summary.add_row("Ошибок чтения", "", f"{report.failed} (записей {len(report.unscored)})")
+    summary.add_row("Время", "", f"{report.elapsed:.1f}s ({report.blobs / max(report.elapsed, 1e-9):.0f} файлов/с)")
+    if report.parity_error is not None:
+        summary.add_row("Расхождение со скалярной оценкой", "", f"{report.parity_error}")
+
+    buckets = Table(title="📊 Распределение оценок", show_header=True)
+    buckets.add_column("Оценка")
+    buckets.add_column("Было", justify="right")
+    buckets.add_column("Стало", justify="right")
+    old_counts, _ = np.histogram(old, bins=SCORE_BUCKETS)
+    new_counts, _ = np.histogram(new, bins=SCORE_BUCKETS)
+    for low, high, old_count, new_count in zip(SCORE_BUCKETS, SCORE_BUCKETS[1:], old_counts, new_counts):
+        buckets.add_row(f"{low}–{min(high - 1, 100)}", f"{old_count}", f"{new_count}")
+
+    changes = Table(title=f"↕️ Крупнейшие изменения (топ {top})", show_header=True)
+    for column in ("Запись", "Гильдия", "Пользователь", "Вопрос", "Было", "Стало"):
+        changes.add_column(column, justify="right")
+    indices = np.flatnonzero(known)
+    delta = report.new[indices] - report.old[indices]
+    for position in np.argsort(-np.abs(delta), kind="stable")[:top]:
+        if delta[position] == 0:
+            break
+        index = indices[position]
+        recording = report.recordings[index]
+        changes.add_row(
+            f"{recording.id}", f"{recording.guild_id}", f"{recording.user_id}", f"{recording.question + 1}",
+            f"{report.old[index]}", f"{report.new[index]}"
+        )
+    return [summary, buckets, changes]
+
+
+def write_csv(report: RescoreReport, path: str) -> None:
+    """Построчное сравнение для дальнейшего анализа"""
+    threshold = report.pass_threshold
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "sha256", "guild_id", "user_id", "question", "created_at", "old", "new", "delta", "flip"])
+        for recording, old, new in zip(report.recordings, report.old.tolist(), report.new.tolist()):
+            flip = ""
+            if old >= 0 and (old >= threshold) != (new >= threshold):
+                flip = "fail" if new < threshold else "pass"
+            writer.writerow([
+                recording.id, recording.sha256, recording.guild_id, recording.user_id, recording.question,
+                recording.created_at, old if old >= 0 else "", new, new - old if old >= 0 else "", flip
+            ])
@@ -0,0 +1,264 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, TextIO, Tuple
+
+from config.settings import settings
+from utils.helpers import pid_alive
+from utils.logger import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+    pa = pq = None
+
+SEGMENTS_DIR = "log"
+PARQUET_DIR = "parquet"
+SEGMENT_SUFFIX = ".jsonl"
+
+# Колонки Parquet по видам записей; отсутствующие поля становятся null.
+# guild_id и дата берутся из пути раздела и в файлы не пишутся
+RECORD_COLUMNS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "answer": (
+        ("ts", "float64"),
+        ("user_id", "int64"),
+        ("question", "int32"),
+        ("quality", "int32"),
+        ("duration", "float64"),
+        ("raw_duration", "float64"),  # до обрезки тишины
+        ("expected_duration", "float64"),
+        ("avg_volume", "int64"),
+        ("file_size_kb", "float64"),
+        ("analysis_method", "string"),
+        ("speech_seconds", "float64"),
+        ("snr_db", "float64"),
+        ("clipping_ratio", "float64"),
+        ("passphrase_score", "float64"),
+        ("network_score", "float64"),
+        ("duplicate_of", "int64"),
+        ("archived", "bool"),
+        ("analysis_seconds", "float64"),
+        ("upload_seconds", "float64"),
+        ("processing_seconds", "float64"),
+        ("audio_url", "string"),
+    ),
+    "session": (
+        ("ts", "float64"),
+        ("user_id", "int64"),
+        ("outcome", "string"),
+        ("answered", "int32"),
+        ("average_quality", "float64"),
+        ("duration_seconds", "float64"),
+        ("resumes", "int32"),
+        ("error", "string"),
+    ),
+}
+
+
+def _day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _schema(kind: str) -> "pa.Schema":
+    return pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in RECORD_COLUMNS[kind]])
+
+
+class ResultLog:
+    """Журнал результатов верификации для аналитики
+
+    Каждый результат ответа и итог сессии дописывается строкой JSON в
+    сегмент log/<pid>-<время>.jsonl. Запись идет из фонового потока
+    пачками; из цикла событий вызываются только неблокирующие append() и
+    request_compaction(). Компактация переносит закрытые сегменты в Parquet
+    с разбиением parquet/<вид>/guild_id=<id>/date=<день>/ (hive-разметка
+    читается pyarrow.dataset, DuckDB и pandas). Без pyarrow сегменты
+    остаются в JSON Lines.
+    """
+
+    def __init__(self, log_dir: str):
+        self.log_dir = log_dir
+        self.segments_dir = os.path.join(log_dir, SEGMENTS_DIR)
+        self.parquet_dir = os.path.join(log_dir, PARQUET_DIR)
+        self.appended = 0
+        self.written = 0
+        self.compacted = 0
+        self.failed = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._segment: Optional[TextIO] = None
+        self._segment_started = 0.0
+        self._warned = False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="result-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, kind: str, **fields) -> None:
+        """Поставить запись в очередь журнала"""
+        self._ensure_started()
+        fields.setdefault("ts", time.time())
+        fields["kind"] = kind
+        self.appended += 1
+        self._queue.put(fields)
+
+    def request_compaction(self) -> None:
+        if self._thread is not None:
+            self._queue.put("compact")
+
+    def close(self) -> None:
+        """Дописать очередь и остановить поток"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # Поток журнала
+
+    def _run(self) -> None:
+        batch: List[str] = []
+        started = 0.0
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0.0, started + settings.result_log_batch_seconds - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = "flush"
+
+            if isinstance(item, dict):
+                if not batch:
+                    started = time.monotonic()
+                batch.append(json.dumps(item, ensure_ascii=False, default=str))
+                if len(batch) < settings.result_log_batch_size:
+                    continue
+                item = "flush"
+
+            if batch:
+                self._guard(self._write, batch)
+                batch = []
+            if item == "compact":
+                self._guard(self._compact)
+            elif item is None:
+                self._close_segment()
+                return
+
+    def _guard(self, action, *args) -> None:
+        try:
+            action(*args)
+        except (OSError, ValueError) as e:
+            self.failed += 1
+            logger.error(f"❌ Ошибка журнала результатов: {e}")
+
+    def _write(self, lines: List[str]) -> None:
+        """Одна запись и fsync на пачку; сегмент сменяется по возрасту"""
+        if self._segment is not None and time.time() - self._segment_started > settings.result_log_segment_seconds:
+            self._close_segment()
+        if self._segment is None:
+            self._segment_started = time.time()
+            path = os.path.join(self.segments_dir, f"{os.getpid()}-{int(self._segment_started * 1000)}{SEGMENT_SUFFIX}")
+            self._segment = open(path, "a", encoding="utf-8")
+        self._segment.write("\n".join(lines) + "\n")
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self.written += len(lines)
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _closed_segments(self) -> List[str]:
+        """Сегменты этого процесса и завершившихся процессов; открытые сегменты живых процессов не трогаем"""
+        own = str(os.getpid())
+        segments = []
+        for name in sorted(os.listdir(self.segments_dir)):
+            pid = name.split("-", 1)[0]
+            if not name.endswith(SEGMENT_SUFFIX) or not pid.isdigit():
+                continue
+            if pid == own or not pid_alive(int(pid)):
+                segments.append(os.path.join(self.segments_dir, name))
+        return segments
+
+    def _compact(self) -> None:
+        if not HAS_PYARROW:
+            if not self._warned:
+                self._warned = True
+                logger.info("pyarrow не установлен — журнал результатов остается в JSON Lines без компактации")
+            return
+        self._close_segment()
+        segments = self._closed_segments()
+        if not segments:
+            return
+
+        partitions: Dict[Tuple[str, int, str], List[dict]] = defaultdict(list)
+        skipped = 0
+        for path in segments:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка после сбоя
+                        skipped += 1
+                        continue
+                    if record.get("kind") in RECORD_COLUMNS:
+                        partitions[(record["kind"], record.get("guild_id", 0), _day(record["ts"]))].append(record)
+
+        stamp = f"{os.getpid()}-{time.time_ns()}"
+        today = _day(time.time())
+        for (kind, guild_id, day), records in partitions.items():
+            directory = os.path.join(self.parquet_dir, kind, f"guild_id={guild_id}", f"date={day}")
+            os.makedirs(directory, exist_ok=True)
+            columns = [name for name, _ in RECORD_COLUMNS[kind]]
+            table = pa.Table.from_pylist([{name: record.get(name) for name in columns} for record in records], schema=_schema(kind))
+            self._write_table(table, os.path.join(directory, f"part-{stamp}.parquet"))
+            if day < today:
+                self._merge_partition(directory, kind)
+
+        for path in segments:
+            os.remove(path)
+        records = sum(len(records) for records in partitions.values())
+        self.compacted += records
+        logger.info(
+            f"📦 Журнал результатов: {records} записей из {len(segments)} сегментов → Parquet "
+            f"({len(partitions)} разделов{f', пропущено строк {skipped}' if skipped else ''})"
+        )
+
+    @staticmethod
+    def _write_table(table: "pa.Table", path: str) -> None:
+        temp_path = path + ".tmp"
+        pq.write_table(table, temp_path, compression="zstd")
+        os.replace(temp_path, path)
+
+    def _merge_partition(self, directory: str, kind: str) -> None:
+        """Закрытый день — один файл на раздел вместо файла на каждую компактацию"""
+        parts = sorted(name for name in os.listdir(directory) if name.endswith(".parquet"))
+        if len(parts) < 2:
+            return
+        table = pa.concat_tables([pq.read_table(os.path.join(directory, name), schema=_schema(kind)) for name in parts])
+        self._write_table(table.sort_by("ts"), os.path.join(directory, f"part-{os.getpid()}-{time.time_ns()}.parquet"))
+        for name in parts:
+            os.remove(os.path.join(directory, name))
+
+    def stats(self) -> dict:
+        return {
+            'appended': self.appended,
+            'written': self.written,
+            'compacted': self.compacted,
+            'failed': self.failed,
+            'queued': self._queue.qsize(),
+        }
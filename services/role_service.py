@@ -2,6 +2,7 @@ import discord
 from typing import Optional
 from utils.logger import logger
 from core.exceptions import RoleException
+from services.guild_cache import guild_resources
 
 class RoleService:
     """Service for managing user roles"""
@@ -15,7 +16,7 @@ class RoleService:
         """Assign verified role and remove unverified role"""
         try:
             guild = member.guild
-            verified_role = guild.get_role(verified_role_id)
+            verified_role = guild_resources.role(guild, verified_role_id)
             
             if not verified_role:
                 raise RoleException(f"Verified role not found: {verified_role_id}")
@@ -27,7 +28,7 @@ class RoleService:
             
             # Remove unverified role if specified and present
             if unverified_role_id:
-                unverified_role = guild.get_role(unverified_role_id)
+                unverified_role = guild_resources.role(guild, unverified_role_id)
                 if unverified_role and unverified_role in member.roles:
                     await member.remove_roles(unverified_role, reason="Completed verification")
                     logger.info(f"Removed unverified role from {member.display_name}")
@@ -0,0 +1,91 @@
+from typing import Optional
+
+RTP_CLOCK_RATE = 48000
+SAMPLES_PER_FRAME = 960  # 20 мс при 48 кГц
+SEQ_MOD = 1 << 16
+MAX_DROPOUT = 3000
+
+
+class RtpStreamStats:
+    """Статистика RTP потока одного SSRC: потери, порядок и джиттер (RFC 3550)
+
+    Обновляется из потока приема пакетов, читается после остановки записи.
+    """
+
+    def __init__(self, ssrc: int, clock_rate: int = RTP_CLOCK_RATE):
+        self.ssrc = ssrc
+        self.clock_rate = clock_rate
+        self.received = 0
+        self.out_of_order = 0
+        self.duplicates = 0
+        self.base_seq: Optional[int] = None
+        self.max_seq = 0
+        self.cycles = 0
+        self.jitter = 0.0  # в единицах RTP таймстампа
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp = 0
+        self._transit: Optional[float] = None
+        self._seen = set()
+
+    def observe(self, sequence: int, timestamp: int, arrival: float) -> None:
+        """Учесть пакет; arrival — монотонное время приема в секундах"""
+        if self.base_seq is None:
+            self.base_seq = self.max_seq = sequence
+            self.first_timestamp = self.last_timestamp = timestamp
+        else:
+            delta = (sequence - self.max_seq) % SEQ_MOD
+            if 0 < delta < MAX_DROPOUT:
+                if sequence < self.max_seq:
+                    self.cycles += SEQ_MOD
+                self.max_seq = sequence
+                self.last_timestamp = timestamp
+            elif delta != 0:
+                self.out_of_order += 1
+
+        extended = self._extend(sequence)
+        if extended in self._seen:
+            self.duplicates += 1
+            return
+        self._seen.add(extended)
+        self.received += 1
+
+        # Межпакетный джиттер: J += (|D| - J) / 16
+        transit = arrival * self.clock_rate - timestamp
+        if self._transit is not None:
+            self.jitter += (abs(transit - self._transit) - self.jitter) / 16
+        self._transit = transit
+
+    def _extend(self, sequence: int) -> int:
+        extended = self.cycles + sequence
+        # Запоздавший пакет из предыдущего цикла номеров
+        if sequence > self.max_seq and sequence - self.max_seq > SEQ_MOD // 2:
+            extended -= SEQ_MOD
+        return extended
+
+    @property
+    def expected(self) -> int:
+        if self.base_seq is None:
+            return 0
+        return self.cycles + self.max_seq - self.base_seq + 1
+
+    @property
+    def lost(self) -> int:
+        return max(0, self.expected - self.received)
+
+    def to_dict(self) -> dict:
+        expected = self.expected
+        span = 0
+        if self.first_timestamp is not None:
+            span = ((self.last_timestamp - self.first_timestamp) % (1 << 32)) + SAMPLES_PER_FRAME
+        covered = self.received * SAMPLES_PER_FRAME
+        return {
+            'packets': self.received,
+            'expected': expected,
+            'lost': self.lost,
+            'loss_ratio': self.lost / expected if expected else 0.0,
+            'out_of_order': self.out_of_order,
+            'duplicates': self.duplicates,
+            'jitter_ms': self.jitter * 1000 / self.clock_rate,
+            # Доля таймлайна, которую пришлось заполнить тишиной (потери и паузы DTX)
+            'silence_fill_ratio': max(0.0, 1 - covered / span) if span else 0.0
+        }
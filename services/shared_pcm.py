@@ -0,0 +1,245 @@
+import atexit
+import os
+import time
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, Optional
+
+from config.settings import settings
+from services.audio_buffers import MB
+from utils.helpers import pid_alive
+from utils.logger import logger
+
+# Имя сегмента: префикс, pid владельца и номер — по pid находятся сегменты упавших процессов
+SEGMENT_PREFIX = "vbpcm"
+SHM_DIR = "/dev/shm"
+
+
+@dataclass
+class PcmHandle:
+    """Ссылка на PCM ответа в разделяемой памяти"""
+    name: str
+    offset: int
+    size: int
+    channels: int
+    sample_width: int
+    sample_rate: int
+    owner: int
+    slab: Optional[int] = None  # None — отдельный сегмент под этот ответ
+    created: float = field(default_factory=time.monotonic)
+    readers: int = 0  # запросов воркерам, еще читающих эти данные
+    released: bool = False
+
+    def params(self) -> dict:
+        return {'channels': self.channels, 'sample_width': self.sample_width, 'sample_rate': self.sample_rate}
+
+    def to_metadata(self) -> dict:
+        return dict(self.params(), shm=self.name, offset=self.offset, size=self.size)
+
+
+def segment_owner(name: str) -> Optional[int]:
+    """pid процесса, создавшего сегмент пула, или None для чужих сегментов"""
+    prefix, _, rest = name.partition("_")
+    pid = rest.partition("_")[0]
+    return int(pid) if prefix == SEGMENT_PREFIX and pid.isdigit() else None
+
+
+def attach_segment(name: str) -> shared_memory.SharedMemory:
+    """Подключиться к чужому сегменту, не передавая его resource_tracker этого процесса
+
+    Иначе tracker воркера удалит сегмент при своем завершении.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        segment = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+class PcmSlabPool:
+    """Пул слотов разделяемой памяти для передачи ответов воркерам анализа
+
+    Один сегмент делится на слоты фиксированного размера и создается при
+    первой аренде. Ответ, не поместившийся в слот или пришедший при
+    занятом пуле, получает отдельный сегмент. Аренды привязаны к сессии
+    (owner) и освобождаются вместе с ее файлами; sweep() убирает
+    просроченные аренды и сегменты упавших процессов. Пока воркер читает
+    ответ (pin), освобожденная аренда не отдает память новому ответу.
+    """
+
+    def __init__(self, slab_bytes: int, slabs: int, enabled: bool = True):
+        self.slab_bytes = slab_bytes
+        self.slabs = slabs
+        self.enabled = enabled
+        self.leased = 0
+        self.dedicated = 0
+        self.swept = 0
+        self.pinned = 0
+        self._segment: Optional[shared_memory.SharedMemory] = None
+        self._free: List[int] = []
+        self._dedicated: Dict[str, shared_memory.SharedMemory] = {}
+        self._leases: Dict[int, List[PcmHandle]] = {}
+        self._counter = 0
+        self._closed = False
+
+    def _segment_name(self) -> str:
+        self._counter += 1
+        return f"{SEGMENT_PREFIX}_{os.getpid()}_{self._counter}"
+
+    def _ensure_segment(self) -> None:
+        if self._segment is not None:
+            return
+        self.sweep_orphans()
+        self._segment = shared_memory.SharedMemory(
+            name=self._segment_name(), create=True, size=self.slab_bytes * self.slabs
+        )
+        self._free = list(range(self.slabs - 1, -1, -1))
+        atexit.register(self.close)
+        logger.info(f"🧠 Пул PCM: {self.slabs} слотов по {self.slab_bytes // 1024} KB в {self._segment.name}")
+
+    def store(self, owner: int, chunks: Iterable, size: int, channels: int, sample_width: int, sample_rate: int) -> Optional[PcmHandle]:
+        """Скопировать PCM в разделяемую память; None, если пул выключен или данных нет"""
+        if not self.enabled or self._closed or size <= 0:
+            return None
+        self._ensure_segment()
+
+        if size <= self.slab_bytes and self._free:
+            slab = self._free.pop()
+            segment = self._segment
+            handle = PcmHandle(segment.name, slab * self.slab_bytes, size, channels, sample_width, sample_rate, owner, slab)
+        else:
+            segment = shared_memory.SharedMemory(name=self._segment_name(), create=True, size=size)
+            self._dedicated[segment.name] = segment
+            self.dedicated += 1
+            handle = PcmHandle(segment.name, 0, size, channels, sample_width, sample_rate, owner)
+
+        position = handle.offset
+        for chunk in chunks:
+            length = min(len(chunk), handle.offset + size - position)
+            segment.buf[position:position + length] = chunk[:length]
+            position += length
+
+        self._leases.setdefault(owner, []).append(handle)
+        self.leased += 1
+        return handle
+
+    def read(self, handle: PcmHandle) -> bytes:
+        """Копия PCM — для воркеров, не видящих разделяемую память этого хоста"""
+        segment = self._segment if handle.slab is not None else self._dedicated[handle.name]
+        return bytes(segment.buf[handle.offset:handle.offset + handle.size])
+
+    def release(self, handle: PcmHandle) -> None:
+        leases = self._leases.get(handle.owner)
+        if not leases or handle not in leases:
+            return
+        leases.remove(handle)
+        if not leases:
+            del self._leases[handle.owner]
+        handle.released = True
+        if not handle.readers:
+            self._free_storage(handle)
+
+    def pin(self, handle: PcmHandle) -> None:
+        """Воркер начинает читать ответ: память не переиспользуется до unpin()"""
+        if not handle.readers:
+            self.pinned += 1
+        handle.readers += 1
+
+    def unpin(self, handle: PcmHandle) -> None:
+        handle.readers -= 1
+        if handle.readers:
+            return
+        self.pinned -= 1
+        if handle.released:
+            self._free_storage(handle)
+
+    def _free_storage(self, handle: PcmHandle) -> None:
+        if self._closed:
+            return
+        if handle.slab is not None:
+            self._free.append(handle.slab)
+        else:
+            self._unlink(self._dedicated.pop(handle.name))
+
+    def release_owner(self, owner: int) -> int:
+        handles = list(self._leases.get(owner, ()))
+        for handle in handles:
+            self.release(handle)
+        return len(handles)
+
+    def sweep(self, active_owners: Iterable[int] = ()) -> int:
+        """Освободить аренды завершенных сессий и аренды старше shared_pcm_lease_seconds"""
+        active = set(active_owners)
+        deadline = time.monotonic() - settings.shared_pcm_lease_seconds
+        leaked = [
+            handle for owner, handles in self._leases.items() for handle in handles
+            if owner not in active or handle.created < deadline
+        ]
+        for handle in leaked:
+            self.release(handle)
+        if leaked:
+            self.swept += len(leaked)
+            logger.warning(f"🧹 Освобождено потерянных сегментов PCM: {len(leaked)}")
+        return len(leaked) + self.sweep_orphans()
+
+    def sweep_orphans(self) -> int:
+        """Удалить сегменты пула, оставшиеся от завершившихся аварийно процессов"""
+        try:
+            names = os.listdir(SHM_DIR)
+        except OSError:
+            return 0
+        removed = 0
+        for name in names:
+            owner = segment_owner(name)
+            if owner is None or pid_alive(owner):
+                continue
+            try:
+                os.unlink(os.path.join(SHM_DIR, name))
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Couldn't remove shared memory segment {name}: {e}")
+        if removed:
+            self.swept += removed
+            logger.warning(f"🧹 Удалено сегментов PCM завершившихся процессов: {removed}")
+        return removed
+
+    @staticmethod
+    def _unlink(segment: shared_memory.SharedMemory) -> None:
+        segment.close()
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._leases.clear()
+        for segment in self._dedicated.values():
+            self._unlink(segment)
+        self._dedicated.clear()
+        if self._segment is not None:
+            self._unlink(self._segment)
+            self._segment = None
+
+    def stats(self) -> dict:
+        return {
+            'slabs_free': len(self._free) if self._segment else self.slabs,
+            'slabs_total': self.slabs,
+            'leases': sum(len(handles) for handles in self._leases.values()),
+            'pinned': self.pinned,
+            'dedicated_segments': len(self._dedicated),
+            'leased_total': self.leased,
+            'dedicated_total': self.dedicated,
+            'swept_total': self.swept,
+        }
+
+
+# Global pool instance
+pcm_pool = PcmSlabPool(
+    int(settings.shared_pcm_slab_mb * MB),
+    settings.shared_pcm_slabs,
+    enabled=settings.shared_pcm_enabled and bool(settings.analysis_workers),  # нужен только внешним воркерам
+)
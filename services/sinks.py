@@ -0,0 +1,131 @@
+import time
+from typing import Callable, Dict, Optional
+
+from discord.sinks import Filters, WaveSink
+
+from config.settings import settings
+from services.audio_buffers import MB, RecordingMemoryBudget, UserAudioBuffer, frame_energy, frame_peak
+from services.rtp_stats import RtpStreamStats
+
+
+class CustomWaveSink(WaveSink):
+    """Sink с ограниченной памятью: кольцевые буферы на пользователя и общий бюджет
+
+    on_speech вызывается один раз, когда recording_barge_in_speech_frames
+    кадров подряд громче recording_barge_in_speech_dbfs (из потока приема).
+    Порог — по RMS кадра, а не по пику, чтобы шум и щелчки не начинали ответ.
+    """
+
+    def __init__(
+        self,
+        duration: int,
+        budget: RecordingMemoryBudget,
+        *,
+        filters=None,
+        on_speech: Optional[Callable[[int], None]] = None
+    ):
+        super().__init__(filters=filters)
+        self.duration = duration
+        self.budget = budget
+        self.channels = 2
+        self.sample_width = 2
+        self.sample_rate = 48000
+        self.dropped_silence_frames = 0
+        self.on_speech = on_speech
+        self.speech_started_at: Optional[float] = None
+        self._speech_energy = 10 ** (settings.recording_barge_in_speech_dbfs / 10)
+        self._speech_run = 0
+        self._voiced_until = {}
+        self.rtp_stats: Dict[int, RtpStreamStats] = {}
+        self.user_rtp_stats: Dict[int, RtpStreamStats] = {}
+
+    def init(self, vc):
+        super().init(vc)
+        decoder = getattr(vc, 'decoder', None)
+        if decoder is not None:
+            self.channels = decoder.CHANNELS
+            self.sample_width = decoder.SAMPLE_SIZE // decoder.CHANNELS
+            self.sample_rate = decoder.SAMPLING_RATE
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * self.channels * self.sample_width
+
+    def _create_buffer(self) -> UserAudioBuffer:
+        capacity = int(self.duration * settings.recording_buffer_slack * self.bytes_per_second)
+        capacity = min(capacity, int(settings.recording_user_buffer_mb * MB))
+        capacity -= capacity % (self.channels * self.sample_width)
+        return UserAudioBuffer(capacity, self.budget, settings.recording_spill_dir)
+
+    @Filters.container
+    def write(self, data, user):
+        if self.on_speech is not None and self.speech_started_at is None:
+            self._detect_speech(data, user)
+        # Кадры тишины отбрасываем, оставляя короткий хвост после речи
+        now_bytes = self.audio_data[user].written if user in self.audio_data else 0
+        if frame_peak(data) < settings.recording_silence_peak:
+            if now_bytes >= self._voiced_until.get(user, -1):
+                self.dropped_silence_frames += 1
+                return
+        else:
+            hangover = self.bytes_per_second * settings.recording_silence_hangover_ms // 1000
+            self._voiced_until[user] = now_bytes + len(data) + hangover
+
+        if user not in self.audio_data:
+            self.audio_data[user] = self._create_buffer()
+        self.audio_data[user].write(data)
+
+    def _detect_speech(self, data, user) -> None:
+        if frame_energy(data) < self._speech_energy:
+            self._speech_run = 0
+            return
+        self._speech_run += 1
+        if self._speech_run >= settings.recording_barge_in_speech_frames:
+            self._mark_speech(user)
+
+    def _mark_speech(self, user) -> None:
+        if self.speech_started_at is None and self.on_speech is not None:
+            self.speech_started_at = time.monotonic()
+            self.on_speech(user)
+
+    def observe_rtp(self, ssrc: int, sequence: int, timestamp: int, arrival: float) -> None:
+        """Учесть RTP заголовок принятого пакета (вызывается из потока приема)"""
+        stats = self.rtp_stats.get(ssrc)
+        if stats is None:
+            stats = self.rtp_stats[ssrc] = RtpStreamStats(ssrc, self.sample_rate)
+        stats.observe(sequence, timestamp, arrival)
+
+    def _user_for_ssrc(self, ssrc: int) -> Optional[int]:
+        ssrc_map = getattr(getattr(self.vc, 'ws', None), 'ssrc_map', {}) or {}
+        return ssrc_map.get(ssrc, {}).get('user_id')
+
+    def network_stats(self, user_id: int) -> Optional[dict]:
+        """Сетевая статистика ответа пользователя или None, если RTP не наблюдался"""
+        stats = self.user_rtp_stats.get(user_id)
+        return stats.to_dict() if stats else None
+
+    def cleanup(self):
+        self.finished = True
+        for buffer in self.audio_data.values():
+            buffer.cleanup()
+        # SSRC сопоставляем сейчас: после выхода пользователя запись из ssrc_map пропадет
+        for ssrc, stats in self.rtp_stats.items():
+            user = self._user_for_ssrc(ssrc)
+            if user is not None:
+                self.user_rtp_stats[user] = stats
+
+    def release(self):
+        """Освободить все буферы sink'а"""
+        for buffer in self.audio_data.values():
+            buffer.release()
+
+    def memory_stats(self) -> dict:
+        buffers = list(self.audio_data.values())
+        return {
+            'users': len(buffers),
+            'in_memory_bytes': sum(b.capacity for b in buffers if not b.spilled),
+            'spilled_bytes': sum(b.capacity for b in buffers if b.spilled),
+            'used_bytes': sum(b.size for b in buffers),
+            'overflow_bytes': sum(b.overflow_bytes for b in buffers),
+            'dropped_silence_frames': self.dropped_silence_frames
+        }
@@ -0,0 +1,291 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from services.recording_archive import MANIFEST_NAME
+from services.verified_cache import VerifiedEntry
+from utils.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    outcome TEXT NOT NULL DEFAULT 'in_progress',
+    answered INTEGER NOT NULL DEFAULT 0,
+    average_quality REAL,
+    duration_seconds REAL,
+    resumes INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    UNIQUE (guild_id, user_id, started_at)
+);
+CREATE INDEX IF NOT EXISTS attempts_guild_time ON attempts (guild_id, started_at);
+CREATE TABLE IF NOT EXISTS answers (
+    attempt_id INTEGER NOT NULL REFERENCES attempts (id),
+    question INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    quality INTEGER,
+    duration REAL,
+    expected_duration REAL,
+    analysis_method TEXT,
+    passphrase_score REAL,
+    network_score REAL,
+    duplicate_of INTEGER,
+    archived INTEGER NOT NULL DEFAULT 0,
+    analysis_seconds REAL,
+    upload_seconds REAL,
+    processing_seconds REAL,
+    audio_url TEXT,
+    PRIMARY KEY (attempt_id, question)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS verified (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    verified_at REAL NOT NULL,
+    quality REAL,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+"""
+
+ANSWER_FIELDS = (
+    "quality", "duration", "expected_duration", "analysis_method", "passphrase_score", "network_score",
+    "duplicate_of", "archived", "analysis_seconds", "upload_seconds", "processing_seconds", "audio_url",
+)
+ATTEMPT_FIELDS = ("outcome", "answered", "average_quality", "duration_seconds", "resumes", "error")
+# Ответ попадает в архив перед записью в историю; окно поиска блоба в манифесте
+ARCHIVE_MATCH_SECONDS = 60.0
+
+
+@dataclass
+class HistoryAttempt:
+    """Одна сессия верификации участника с ответами по вопросам"""
+    id: int
+    guild_id: int
+    user_id: int
+    started_at: float
+    finished_at: Optional[float]
+    outcome: str
+    answered: int
+    average_quality: Optional[float]
+    duration_seconds: Optional[float]
+    resumes: int
+    error: Optional[str]
+    answers: List[dict] = field(default_factory=list)
+
+
+@dataclass
+class HistoryPage:
+    attempts: List[HistoryAttempt]
+    total: Optional[int]  # только для истории одного участника
+    next_cursor: Optional[Tuple[float, int]]  # (started_at, id) последней попытки страницы
+
+
+class HistoryStore:
+    """История попыток верификации в SQLite
+
+    Попытка — одна сессия (гильдия, пользователь, начало сессии); ответы и
+    итог дописываются к ней по мере обработки. Страницы читаются по ключу
+    (started_at, id) через индексы (гильдия, пользователь, время) и
+    (гильдия, время), поэтому время запроса не зависит ни от глубины
+    истории, ни от номера страницы. Методы блокирующие; вызываются из
+    одного потока VerificationHistory.
+    """
+
+    def __init__(self, path: str, archive_dir: Optional[str] = None):
+        self.path = path
+        self.archive_dir = archive_dir
+        self._db: Optional[sqlite3.Connection] = None
+        self._archive_db: Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: процессы кластера на одном хосте пишут в общую историю
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def _attempt_id(self, guild_id: int, user_id: int, started_at: float) -> int:
+        self.db.execute(
+            "INSERT OR IGNORE INTO attempts (guild_id, user_id, started_at) VALUES (?, ?, ?)",
+            (guild_id, user_id, started_at)
+        )
+        return self.db.execute(
+            "SELECT id FROM attempts WHERE guild_id = ? AND user_id = ? AND started_at = ?",
+            (guild_id, user_id, started_at)
+        ).fetchone()[0]
+
+    def record_answer(self, guild_id: int, user_id: int, started_at: float, question: int, answer: dict) -> None:
+        with self.db:
+            attempt_id = self._attempt_id(guild_id, user_id, started_at)
+            self.db.execute(
+                f"INSERT OR REPLACE INTO answers (attempt_id, question, recorded_at, {', '.join(ANSWER_FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(ANSWER_FIELDS))})",
+                (attempt_id, question, answer.get("ts", time.time()), *(answer.get(name) for name in ANSWER_FIELDS))
+            )
+
+    def record_outcome(self, guild_id: int, user_id: int, started_at: float, outcome: dict) -> None:
+        with self.db:
+            attempt_id = self._attempt_id(guild_id, user_id, started_at)
+            self.db.execute(
+                f"UPDATE attempts SET finished_at = ?, {', '.join(f'{name} = ?' for name in ATTEMPT_FIELDS)} WHERE id = ?",
+                (outcome.get("ts", time.time()), *(outcome.get(name) for name in ATTEMPT_FIELDS), attempt_id)
+            )
+
+    def page(
+        self,
+        guild_id: int,
+        user_id: Optional[int] = None,
+        cursor: Optional[Tuple[float, int]] = None,
+        limit: int = 5
+    ) -> HistoryPage:
+        """Попытки от новых к старым, начиная после cursor"""
+        conditions, params = ["guild_id = ?"], [guild_id]
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        total = None
+        if user_id is not None:
+            # Счет по диапазону индекса одного участника; по всей гильдии он рос бы с историей
+            total = self.db.execute(f"SELECT COUNT(*) FROM attempts WHERE {' AND '.join(conditions)}", params).fetchone()[0]
+        if cursor is not None:
+            conditions.append("(started_at, id) < (?, ?)")
+            params.extend(cursor)
+
+        rows = self.db.execute(
+            f"SELECT id, guild_id, user_id, started_at, finished_at, {', '.join(ATTEMPT_FIELDS)} FROM attempts "
+            f"WHERE {' AND '.join(conditions)} ORDER BY started_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+        has_more = len(rows) > limit
+        attempts = [HistoryAttempt(*row) for row in rows[:limit]]
+        self._attach_answers(attempts)
+        next_cursor = (attempts[-1].started_at, attempts[-1].id) if has_more else None
+        return HistoryPage(attempts, total, next_cursor)
+
+    def _attach_answers(self, attempts: List[HistoryAttempt]) -> None:
+        if not attempts:
+            return
+        by_id: Dict[int, HistoryAttempt] = {attempt.id: attempt for attempt in attempts}
+        cursor = self.db.execute(
+            f"SELECT attempt_id, question, recorded_at, {', '.join(ANSWER_FIELDS)} FROM answers "
+            f"WHERE attempt_id IN ({','.join('?' * len(by_id))}) ORDER BY attempt_id, question",
+            list(by_id)
+        )
+        columns = [description[0] for description in cursor.description]
+        for row in cursor:
+            answer = dict(zip(columns, row))
+            attempt = by_id[answer.pop("attempt_id")]
+            if answer["archived"]:
+                answer["archive_sha256"] = self._archived_blob(attempt, answer)
+            attempt.answers.append(answer)
+
+    def _archived_blob(self, attempt: HistoryAttempt, answer: dict) -> Optional[str]:
+        """SHA-256 блоба ответа в архиве записей (по индексу манифеста (пользователь, время))"""
+        if self.archive_dir is None:
+            return None
+        if self._archive_db is None:
+            manifest = os.path.join(self.archive_dir, MANIFEST_NAME)
+            if not os.path.exists(manifest):
+                return None
+            self._archive_db = sqlite3.connect(f"file:{manifest}?mode=ro", uri=True, check_same_thread=False)
+        row = self._archive_db.execute(
+            "SELECT sha256 FROM recordings WHERE user_id = ? AND created_at BETWEEN ? AND ? "
+            "AND guild_id = ? AND question = ? ORDER BY created_at DESC LIMIT 1",
+            (attempt.user_id, answer["recorded_at"] - ARCHIVE_MATCH_SECONDS, answer["recorded_at"],
+             attempt.guild_id, answer["question"])
+        ).fetchone()
+        return row[0] if row else None
+
+    # VerifiedResultStore
+
+    def load_verified(self, guild_id: int, user_id: int) -> Optional[VerifiedEntry]:
+        row = self.db.execute(
+            "SELECT verified_at, quality FROM verified WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ).fetchone()
+        return VerifiedEntry(guild_id, user_id, row[0], row[1]) if row else None
+
+    def save_verified(self, entry: VerifiedEntry) -> None:
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO verified (guild_id, user_id, verified_at, quality) VALUES (?, ?, ?, ?)",
+                (entry.guild_id, entry.user_id, entry.verified_at, entry.quality)
+            )
+
+    def delete_verified(self, guild_id: int, user_id: int) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM verified WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+
+    def close(self) -> None:
+        for connection in (self._db, self._archive_db):
+            if connection is not None:
+                connection.close()
+        self._db = self._archive_db = None
+
+
+class VerificationHistory:
+    """История верификаций: запись без ожидания и запросы в отдельном потоке
+
+    Служит и постоянным хранилищем VerifiedResultCache.
+    """
+
+    def __init__(self, path: str, archive_dir: Optional[str] = None):
+        self.store = HistoryStore(path, archive_dir)
+        self.failed = 0
+        # Один поток: соединения SQLite не делятся, а записи идут в порядке поступления
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+
+    def _submit(self, action, *args) -> None:
+        future = self._executor.submit(action, *args)
+        future.add_done_callback(self._on_written)
+
+    def _on_written(self, future) -> None:
+        if future.exception():
+            self.failed += 1
+            logger.warning(f"⚠️ Не удалось записать историю верификации: {future.exception()}")
+
+    def record_answer(self, guild_id: int, user_id: int, started_at: float, question: int, answer: dict) -> None:
+        self._submit(self.store.record_answer, guild_id, user_id, started_at, question, answer)
+
+    def record_outcome(self, guild_id: int, user_id: int, started_at: float, outcome: dict) -> None:
+        self._submit(self.store.record_outcome, guild_id, user_id, started_at, outcome)
+
+    async def page(
+        self,
+        guild_id: int,
+        user_id: Optional[int] = None,
+        cursor: Optional[Tuple[float, int]] = None,
+        limit: int = 5
+    ) -> HistoryPage:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.store.page, guild_id, user_id, cursor, limit
+        )
+
+    # VerifiedResultStore: кэш вызывает методы в своем executor, а SQLite работает в потоке истории
+
+    def load_verified(self, guild_id: int, user_id: int) -> Optional[VerifiedEntry]:
+        return self._executor.submit(self.store.load_verified, guild_id, user_id).result()
+
+    def save_verified(self, entry: VerifiedEntry) -> None:
+        self._executor.submit(self.store.save_verified, entry).result()
+
+    def delete_verified(self, guild_id: int, user_id: int) -> None:
+        self._executor.submit(self.store.delete_verified, guild_id, user_id).result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.store.close()
+
+    def stats(self) -> dict:
+        return {'failed': self.failed}
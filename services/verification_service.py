@@ -1,58 +1,75 @@
 import asyncio
-import math
 import os
-import struct
-import tempfile
+import time
 from datetime import datetime
 from functools import partial
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Optional
 
 import discord
 
 from config.settings import settings
+from core.exceptions import RoleException, StageTimeoutException
 from models.verification_session import VerificationSession, VerificationStatus
+from services.analysis_worker import AnalysisClient
+from services.audio_features import HAS_NUMPY
 from services.audio_service import AudioService
+from services.fingerprint import AnswerFingerprints
+from services.guild_cache import guild_resources
+from services.member_resolver import member_resolver
+from services.recording_archive import RecordingArchive
 from services.recording_service import RecordingService
+from services.result_log import ResultLog
 from services.role_service import RoleService
+from services.shared_pcm import PcmHandle, pcm_pool
+from services.verification_history import VerificationHistory
+from services.verified_cache import VerifiedEntry, VerifiedResultCache, VerifiedResultStore
 from utils.logger import logger
-
-try:
-    import librosa
-    import numpy as np
-    HAS_LIBROSA = True
-except ImportError:
-    HAS_LIBROSA = False
-    librosa = None
-    np = None  # Добавь это, чтобы избежать NameError
-
-try:
-    from pydub import AudioSegment
-    HAS_PYDUB = True
-except ImportError:
-    HAS_PYDUB = False
+from utils.task_scope import SessionScope
+from utils.timer_wheel import TimerWheel
 
 
 class VerificationService:
     """Основной сервис обработки верификации"""
 
-    def __init__(self):
+    def __init__(self, result_store: Optional[VerifiedResultStore] = None):
         self.active_sessions: Dict[int, VerificationSession] = {}
+        self.suspended_sessions: Dict[int, VerificationSession] = {}
+        self.scopes: Dict[int, SessionScope] = {}
+        self.scheduler = TimerWheel()
         self.audio_service = AudioService()
-        self.recording_service = RecordingService()
+        self.recording_service = RecordingService(self.scheduler)
+        self._reaper_started = False
         self.role_service = RoleService()
+        self.analysis_client = AnalysisClient(settings.analysis_workers)
+        self.archive = RecordingArchive(settings.archive_dir) if settings.archive_enabled else None
+        self.result_log = ResultLog(settings.result_log_dir) if settings.result_log_enabled else None
+        self.history = (
+            VerificationHistory(settings.history_db_path, settings.archive_dir if settings.archive_enabled else None)
+            if settings.history_enabled else None
+        )
+        self.fingerprints = (
+            AnswerFingerprints(settings.fingerprint_db_path) if settings.fingerprint_enabled and HAS_NUMPY else None
+        )
+        self.verified_cache = VerifiedResultCache(
+            settings.verified_cache_ttl_seconds, settings.verified_cache_max_entries, result_store or self.history
+        )
 
     async def start_verification(self, member: discord.Member, voice_client: discord.VoiceClient, text_channel: discord.TextChannel) -> bool:
         if member.id in self.active_sessions:
             logger.warning(f"Верификация уже активна для {member.display_name}")
             return False
 
+        suspended = self._take_suspended(member)
+        if suspended:
+            return await self._resume_verification(suspended, member, voice_client, text_channel)
+
         session = VerificationSession(
             user_id=member.id,
             guild_id=member.guild.id,
             status=VerificationStatus.IN_PROGRESS
         )
-        self.active_sessions[member.id] = session
+        scope = self._activate_session(session)
 
         # 📋 КОМПАКТНЫЙ ЭМБЕД ДЛЯ САППОРТОВ
         embed = discord.Embed(
@@ -77,10 +94,93 @@ class VerificationService:
         embed.set_footer(text=f"ID: {member.id} • {member.guild.name}")
 
         await text_channel.send(embed=embed)
-        await self._ask_question(voice_client, text_channel, session)
+        scope.spawn(self._ask_question(voice_client, text_channel, session), name="question")
+        return True
+
+    async def restore_verified(self, member: discord.Member, text_channel: discord.TextChannel) -> bool:
+        """Участник уже проходил верификацию: восстановить роли без интервью"""
+        if settings.low_memory_mode:
+            # Снятие роли у участника вне кэша не доходит событием, поэтому результат мог устареть
+            return False
+        entry = await self.verified_cache.get(member.guild.id, member.id)
+        if entry is None:
+            return False
+
+        try:
+            await self.role_service.assign_verified_role(member, settings.verified_role_id, settings.unverified_role_id)
+        except RoleException as e:
+            logger.warning(f"⚠️ Не удалось восстановить роли {member.display_name} из кэша: {e}")
+            return False
+
+        verified_at = datetime.utcfromtimestamp(entry.verified_at)
+        embed = discord.Embed(
+            title="♻️ Верификация восстановлена",
+            description=f"**{member.mention}** (`{member.id}`)\n✅ Пройдена <t:{int(entry.verified_at)}:R>, интервью не требуется",
+            color=0x27ae60,
+            timestamp=datetime.utcnow()
+        )
+        if entry.quality is not None:
+            embed.add_field(name="📈 Качество", value=f"`{entry.quality:.0f}%`", inline=True)
+        embed.set_thumbnail(url=member.display_avatar.url)
+        embed.set_footer(text=f"ID: {member.id} • Кэш от {verified_at.strftime('%d.%m %H:%M UTC')}")
+
+        await text_channel.send(embed=embed)
+        logger.info(f"♻️ {member.display_name} уже верифицирован — роли восстановлены без интервью")
+        return True
+
+    def _activate_session(self, session: VerificationSession) -> SessionScope:
+        """Зарегистрировать сессию, ее группу задач и TTL"""
+        self.active_sessions[session.user_id] = session
+        scope = self.scopes[session.user_id] = SessionScope(f"verification-{session.user_id}")
+        self._start_reaper()
+        self.scheduler.schedule(settings.session_ttl_seconds, self._expire_session, session.user_id, key=session.user_id)
+        return scope
+
+    def _take_suspended(self, member: discord.Member) -> Optional[VerificationSession]:
+        session = self.suspended_sessions.pop(member.id, None)
+        if session is None:
+            return None
+        self.scheduler.cancel_key(("suspended", member.id))
+        if session.guild_id != member.guild.id:
+            logger.info(f"Приостановленная сессия {member.id} относится к другой гильдии и отброшена")
+            return None
+        return session
+
+    async def _resume_verification(self, session: VerificationSession, member: discord.Member, voice_client: discord.VoiceClient, text_channel: discord.TextChannel) -> bool:
+        """Продолжить приостановленную сессию с первого неотвеченного вопроса"""
+        session.resume()
+        scope = self._activate_session(session)
+
+        answered = len(session.results)
+        total = len(settings.questions)
+        embed = discord.Embed(
+            title="🔄 Верификация возобновлена",
+            description=f"**{member.mention}** (`{member.id}`)\n▶️ Продолжение с вопроса **{session.current_question_index + 1}/{total}**",
+            color=0x3498db,
+            timestamp=datetime.utcnow()
+        )
+        embed.add_field(
+            name="📊 Прогресс",
+            value=f"`{answered}/{total}` {'▰' * answered}{'▱' * (total - answered)}",
+            inline=True
+        )
+        embed.add_field(
+            name="🔁 Возобновлений",
+            value=f"```{session.resumes}/{settings.session_max_resumes}```",
+            inline=True
+        )
+        embed.set_thumbnail(url=member.display_avatar.url)
+        embed.set_footer(text=f"ID: {member.id} • {member.guild.name}")
+
+        await text_channel.send(embed=embed)
+        logger.info(f"🔄 Сессия {member.display_name} возобновлена с вопроса {session.current_question_index + 1}")
+        scope.spawn(self._ask_question(voice_client, text_channel, session), name="question")
         return True
 
     async def _ask_question(self, voice_client: discord.VoiceClient, text_channel: discord.TextChannel, session: VerificationSession):
+        scope = self.scopes.get(session.user_id)
+        if scope is None or scope.cancelled:
+            return
         try:
             question = settings.questions[session.current_question_index]
             duration = settings.recording_durations[session.current_question_index]
@@ -97,7 +197,7 @@ class VerificationService:
                 timestamp=datetime.utcnow()
             )
 
-            user = voice_client.guild.get_member(session.user_id)
+            user = await member_resolver.fetch(voice_client.guild, session.user_id)
             if user:
                 embed.add_field(name="👤 Пользователь", value=f"{user.mention}\n`{user.id}`", inline=True)
                 embed.add_field(name="📊 Прогресс", value=f"`{progress}/{total}` {progress_bar}", inline=True)
@@ -107,496 +207,208 @@ class VerificationService:
             embed.set_footer(text=f"Осталось: {total - progress} вопросов")
 
             await text_channel.send(embed=embed)
-            await self.audio_service.play_question_audio(voice_client, question, settings.audio_files)
 
-            callback = partial(self._handle_recording_complete, text_channel=text_channel, voice_client=voice_client, session=session)
+            callback = partial(self._on_recording_finished, text_channel=text_channel, voice_client=voice_client, session=session)
             session_id = f"{session.user_id}_{session.current_question_index}"
 
-            await self.recording_service.start_recording(voice_client, duration, callback, session_id)
+            if settings.recording_barge_in:
+                # Захват дорожки пользователя идет с начала вопроса: ответ можно начать не дослушав
+                await self.recording_service.start_recording(
+                    voice_client, duration, callback, session_id, speaker_id=session.user_id
+                )
+            await scope.stage(
+                "prompt",
+                self.audio_service.play_question_audio(voice_client, question, settings.audio_files),
+                settings.stage_timeouts["prompt"]
+            )
+            if settings.recording_barge_in:
+                remaining = self.recording_service.prompt_finished(session_id)
+                if remaining is None:
+                    # Ответ уже записан во время вопроса
+                    return
+            else:
+                await self.recording_service.start_recording(voice_client, duration, callback, session_id)
+                remaining = duration
+
+            # Если колбэк записи так и не придет, сессия не должна висеть вечно
+            self.scheduler.schedule(
+                remaining + settings.stage_timeouts["recording_callback"],
+                self._recording_watchdog, text_channel, session, session.current_question_index,
+                key=session_id
+            )
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Ошибка при отправке вопроса: {e}")
             await self._handle_verification_error(text_channel, session, str(e))
 
-    async def _convert_to_pcm16(self, input_path: str, output_path: str) -> bool:
-        """Конвертировать аудио в PCM16 формат с помощью ffmpeg"""
+    async def _analyze_audio_file(
+        self,
+        filepath: str,
+        expected_duration: int,
+        network: Optional[dict] = None,
+        pcm_handle: Optional[PcmHandle] = None,
+        question: Optional[str] = None
+    ) -> dict:
+        """Анализ ответа в воркере анализа или, если воркеры недоступны, в процессе"""
+        return await self.analysis_client.analyze(filepath, expected_duration, network, pcm_handle, question)
+
+    async def _check_fingerprint(self, scope: SessionScope, hashes: Optional[list], guild_id: int, question_index: int, user_id: int) -> Optional[dict]:
+        """Ответ другого участника с той же записью или None
+
+        hashes считает анализ; без них (анализ без numpy или декодером) проверки нет.
+        Проверка только справочная: по таймауту ответ обрабатывается без нее.
+        """
+        if self.fingerprints is None or hashes is None:
+            return None
         try:
-            process = await asyncio.create_subprocess_exec(
-                "ffmpeg", "-y", "-i", input_path,
-                "-ar", "44100", "-ac", "1", "-sample_fmt", "s16",
-                output_path,
-                stdout=asyncio.subprocess.DEVNULL,
-                stderr=asyncio.subprocess.DEVNULL
+            return await scope.stage(
+                "fingerprint",
+                self.fingerprints.check(hashes, guild_id, question_index, user_id),
+                settings.stage_timeouts["fingerprint"]
             )
-            await process.wait()
-            return process.returncode == 0
-        except Exception as e:
-            logger.warning(f"FFmpeg conversion failed: {e}")
-            return False
-
-    def _interpret_rms(self, rms: float) -> Tuple[str, str, int]:
-        """Интерпретировать RMS значение в удобочитаемый формат"""
-        if rms <= 0.0:
-            return "0.0000", "🔴 Тишина", 5
-        
-        try:
-            db = 20 * math.log10(rms + 1e-10)  # dBFS громкость
-            rms_str = f"{rms:.4f}"
-            
-            if db < -40:
-                return rms_str, "🔴 Очень тихо", 15
-            elif db < -30:
-                return rms_str, "🟡 Тихо", 35
-            elif db < -20:
-                return rms_str, "🟢 Нормально", 70
-            elif db < -10:
-                return rms_str, "🟢 Громко", 85
-            else:
-                return rms_str, "🟦 Очень громко", 90
-        except Exception:
-            return f"{rms:.4f}", "🟡 Неопределенно", 50
+        except StageTimeoutException as e:
+            logger.warning(f"⚠️ Проверка отпечатка ответа {user_id} пропущена: {e}")
+            return None
 
-    async def _analyze_with_librosa(self, file_path: str) -> Dict:
-        """Анализ аудио с помощью librosa (наиболее точный)"""
-        try:
-            # Создаем временный файл для конвертации
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                temp_path = tmp_file.name
-
-            # Конвертируем в совместимый формат
-            if not await self._convert_to_pcm16(file_path, temp_path):
-                os.unlink(temp_path)
-                raise Exception("FFmpeg conversion failed")
+    def _archive_answer(self, filepath: str, guild_id: int, user_id: int, question_index: int, audio_analysis: dict) -> bool:
+        """Сохранить ответ в архив для повторного анализа; файл можно сразу удалять"""
+        if self.archive is None:
+            return False
+        return self.archive.submit(
+            filepath, guild_id, user_id, question_index, audio_analysis['duration'], audio_analysis['quality']
+        )
 
-            # Загружаем аудио
-            y, sr = librosa.load(temp_path, sr=None, mono=True)
-            
-            # Вычисляем метрики
-            duration = len(y) / sr
-            rms = float(librosa.feature.rms(y=y).mean())
-            
-            # Очищаем временный файл
-            os.unlink(temp_path)
-            
-            return {
-                'duration': duration,
-                'sample_rate': sr,
-                'rms': rms,
-                'method': 'librosa'
-            }
-            
-        except Exception as e:
-            if 'temp_path' in locals() and os.path.exists(temp_path):
-                os.unlink(temp_path)
-            raise Exception(f"Librosa analysis failed: {e}")
+    def _log_answer(self, session: VerificationSession, question_index: int, audio_analysis: Optional[dict], **fields) -> None:
+        """Результат ответа в журнал для аналитики и в историю участника"""
+        fields['ts'] = time.time()
+        if audio_analysis:
+            features = audio_analysis.get('features') or {}
+            passphrase = audio_analysis.get('passphrase') or {}
+            fields.update(
+                quality=audio_analysis['quality'],
+                duration=audio_analysis['duration'],
+                avg_volume=audio_analysis['avg_volume'],
+                file_size_kb=audio_analysis['file_size_kb'],
+                analysis_method=audio_analysis['analysis_method'],
+                speech_seconds=features.get('speech_seconds'),
+                snr_db=features.get('snr_db'),
+                clipping_ratio=features.get('clipping_ratio'),
+                passphrase_score=passphrase.get('score'),
+                network_score=audio_analysis.get('network_score'),
+            )
+        fields['expected_duration'] = settings.recording_durations[question_index]
+        if self.result_log:
+            self.result_log.append(
+                "answer", guild_id=session.guild_id, user_id=session.user_id, question=question_index, **fields
+            )
+        if self.history:
+            self.history.record_answer(session.guild_id, session.user_id, session.started_timestamp, question_index, fields)
+
+    def _log_session(self, session: VerificationSession, outcome: str, error: Optional[str] = None) -> None:
+        """Итог сессии в журнал и историю: completed, error, cancelled, suspended, expired"""
+        fields = {
+            'ts': time.time(),
+            'outcome': outcome,
+            'answered': sum(1 for result in session.results.values() if result.get('quality') is not None),
+            'average_quality': session.average_quality,
+            'duration_seconds': (datetime.utcnow() - session.start_time).total_seconds(),
+            'resumes': session.resumes,
+            'error': error,
+        }
+        if self.result_log:
+            self.result_log.append("session", guild_id=session.guild_id, user_id=session.user_id, **fields)
+        if self.history:
+            self.history.record_outcome(session.guild_id, session.user_id, session.started_timestamp, fields)
+
+    async def _on_recording_finished(self, sink, text_channel: discord.TextChannel, voice_client: discord.VoiceClient, session: VerificationSession):
+        """Колбэк записи: переносит обработку ответа в группу задач сессии"""
+        self.scheduler.cancel_key(f"{session.user_id}_{session.current_question_index}")
+        scope = self.scopes.get(session.user_id)
+        if scope is None or scope.cancelled:
+            # Сессия уже отменена — просто освобождаем буферы записи
+            if hasattr(sink, 'release'):
+                sink.release()
+            return
+        scope.spawn(self._handle_recording_complete(sink, text_channel, voice_client, session), name="answer")
+
+    def _recording_watchdog(self, text_channel: discord.TextChannel, session: VerificationSession, question_index: int) -> None:
+        """Колбэк записи не пришел к дедлайну — завершаем сессию с ошибкой"""
+        scope = self.scopes.get(session.user_id)
+        if scope is None or scope.cancelled or session.current_question_index != question_index:
+            return
+        logger.warning(f"⏱️ Колбэк записи для сессии {session.user_id} не получен вовремя")
+        scope.spawn(
+            self._handle_verification_error(text_channel, session, "Запись не завершилась в отведенное время"),
+            name="watchdog"
+        )
 
-    async def _analyze_with_pydub(self, file_path: str) -> Dict:
-        """Анализ аудио с помощью pydub (средний уровень точности)"""
+    async def _handle_recording_complete(self, sink, text_channel: discord.TextChannel, voice_client: discord.VoiceClient, session: VerificationSession):
+        scope = self.scopes[session.user_id]
+        question_index = session.current_question_index
         try:
-            # Пытаемся загрузить напрямую
-            try:
-                audio = AudioSegment.from_wav(file_path)
-            except Exception:
-                # Если не получается, конвертируем через ffmpeg
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-                    temp_path = tmp_file.name
-                
-                if not await self._convert_to_pcm16(file_path, temp_path):
-                    os.unlink(temp_path)
-                    raise Exception("FFmpeg conversion failed")
-                
-                audio = AudioSegment.from_wav(temp_path)
-                os.unlink(temp_path)
-
-            duration = len(audio) / 1000.0  # в секундах
-            sample_rate = audio.frame_rate
-            
-            # Простой расчет RMS
-            samples = audio.get_array_of_samples()
-            if len(samples) > 0:
-                rms = math.sqrt(sum(x*x for x in samples) / len(samples)) / 32768.0
-            else:
-                rms = 0.0
-
-            return {
-                'duration': duration,
-                'sample_rate': sample_rate,
-                'rms': rms,
-                'method': 'pydub'
-            }
-            
-        except Exception as e:
-            raise Exception(f"Pydub analysis failed: {e}")
+            if settings.recording_barge_in and voice_client.is_playing():
+                # Ответ записан, пока вопрос еще звучал — доигрывать его незачем
+                voice_client.stop()
+            guild = text_channel.guild
+            saved_files = await scope.stage(
+                "save", self.recording_service.save_audio_files(
+                    sink, guild, only_user_id=session.user_id, shared_owner=session.user_id
+                ),
+                settings.stage_timeouts["save"]
+            )
 
-    async def _analyze_with_ffprobe(self, file_path: str) -> Dict:
-        """Анализ аудио с помощью ffprobe (базовый уровень)"""
-        try:
-            # Получаем информацию о файле
-            process = await asyncio.create_subprocess_exec(
-                "ffprobe", "-v", "quiet", "-print_format", "json", 
-                "-show_format", "-show_streams", file_path,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            # Анализ, эмбед и загрузка идут в фоне, пока идет пауза и следующий вопрос
+            post_task = scope.spawn(
+                self._process_answer(saved_files, text_channel, session, question_index),
+                name=f"answer_{question_index}"
             )
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                raise Exception(f"ffprobe failed: {stderr.decode()}")
-            
-            import json
-            data = json.loads(stdout.decode())
-            
-            duration = 0.0
-            sample_rate = 48000
-            
-            # Извлекаем информацию о формате
-            if 'format' in data and 'duration' in data['format']:
-                duration = float(data['format']['duration'])
-            
-            # Извлекаем информацию о потоке
-            if 'streams' in data and len(data['streams']) > 0:
-                stream = data['streams'][0]
-                if 'sample_rate' in stream:
-                    sample_rate = int(stream['sample_rate'])
-            
-            # Оценка RMS на основе размера файла (очень приблизительно)
-            file_size = os.path.getsize(file_path)
-            estimated_rms = min(0.1, max(0.001, file_size / (duration * 100000))) if duration > 0 else 0.001
-
-            return {
-                'duration': duration,
-                'sample_rate': sample_rate,
-                'rms': estimated_rms,
-                'method': 'ffprobe'
-            }
-            
-        except Exception as e:
-            raise Exception(f"FFprobe analysis failed: {e}")
+            if post_task is None:
+                self._remove_files(saved_files)
+                return
+            session.pending.append(post_task)
 
-    async def _analyze_audio_file(self, filepath: str, expected_duration: int) -> dict:
-        """Улучшенный анализ аудиофайла с каскадным подходом"""
-        
-        # Базовые значения по умолчанию
-        result = {
-            'duration': 0.0,
-            'file_size_kb': 0.0,
-            'avg_volume': 0,
-            'sample_rate': 48000,
-            'quality': 5,
-            'quality_emoji': '🔴',
-            'quality_color': 0xe74c3c,
-            'channels': 2,
-            'sample_width': 2,
-            'analysis_method': 'fallback'
-        }
-        
-        try:
-            # Проверка существования файла
-            if not os.path.exists(filepath):
-                logger.warning(f"Audio file not found: {filepath}")
-                return result
+            if question_index + 1 < len(settings.questions):
+                session.next_question()
                 
-            file_size = os.path.getsize(filepath)
-            result['file_size_kb'] = file_size / 1024
-            
-            # Проверка минимального размера
-            if file_size < 1024:  # Меньше 1KB
-                logger.warning(f"Audio file too small: {file_size} bytes")
-                result['quality'] = 10
-                return result
-            
-            # Ждем завершения записи файла
-            await asyncio.sleep(0.5)
-            
-            # Каскадный анализ: пробуем методы от лучшего к худшему
-            analysis_result = None
-            
-            # 1. Пробуем librosa (самый точный)
-            if HAS_LIBROSA:
-                try:
-                    logger.debug("Trying librosa analysis...")
-                    analysis_result = await self._analyze_with_librosa(filepath)
-                    logger.info("✅ Librosa analysis successful")
-                except Exception as e:
-                    logger.debug(f"Librosa failed: {e}")
-            
-            # 2. Пробуем pydub (средний уровень)
-            if not analysis_result and HAS_PYDUB:
-                try:
-                    logger.debug("Trying pydub analysis...")
-                    analysis_result = await self._analyze_with_pydub(filepath)
-                    logger.info("✅ Pydub analysis successful")
-                except Exception as e:
-                    logger.debug(f"Pydub failed: {e}")
-            
-            # 3. Пробуем ffprobe (базовый уровень)
-            if not analysis_result:
-                try:
-                    logger.debug("Trying ffprobe analysis...")
-                    analysis_result = await self._analyze_with_ffprobe(filepath)
-                    logger.info("✅ FFprobe analysis successful")
-                except Exception as e:
-                    logger.debug(f"FFprobe failed: {e}")
-            
-            # Если все методы не сработали, используем fallback
-            if not analysis_result:
-                logger.warning("All analysis methods failed, using fallback estimation")
-                result.update(self._estimate_audio_properties(filepath, file_size))
-                result['analysis_method'] = 'fallback_estimation'
-            else:
-                # Обновляем результат данными анализа
-                result['duration'] = analysis_result['duration']
-                result['sample_rate'] = analysis_result['sample_rate']
-                result['avg_volume'] = int(analysis_result['rms'] * 10000)  # Приводим к интегральному RMS
-                result['analysis_method'] = analysis_result['method']
-            
-            # Интерпретируем RMS
-            rms_str, rms_label, rms_quality = self._interpret_rms(analysis_result['rms'] if analysis_result else 0.001)
-            result['rms_string'] = rms_str
-            result['rms_label'] = rms_label
-            
-            # Вычисляем качество
-            result.update(self._calculate_quality_metrics(result, expected_duration))
-            
-            logger.info(f"🎵 Audio analysis complete: {result['duration']:.1f}s, {result['quality']}%, method: {result['analysis_method']}")
-            
-        except Exception as e:
-            logger.error(f"❌ Complete audio analysis failure: {e}")
-            # Аварийный fallback
-            result['duration'] = max(1.0, expected_duration * 0.5)
-            result['quality'] = 25
-            result['analysis_method'] = 'emergency_fallback'
-            
-        return result
-
-    def _estimate_volume_from_file_size(self, file_size: int, duration: float, expected_duration: int) -> int:
-        """Улучшенная оценка громкости с учетом ожидаемой длительности"""
-        if duration <= 0:
-            return 800 if expected_duration <= 3 else 1000
-        
-        bytes_per_second = file_size / duration
-        
-        # Адаптивные пороги в зависимости от ожидаемой длительности
-        if expected_duration <= 3:
-            # Для коротких ответов более мягкие требования
-            if bytes_per_second < 30000:
-                return 400
-            elif bytes_per_second < 60000:
-                return 1000
-            elif bytes_per_second < 100000:
-                return 2000
-            else:
-                return 3500
-        else:
-            # Для длинных ответов стандартные требования
-            if bytes_per_second < 50000:
-                return 500
-            elif bytes_per_second < 100000:
-                return 1500
-            elif bytes_per_second < 150000:
-                return 3000
-            else:
-                return 5000
-
-    def _calculate_manual_rms(self, audio_data: bytes, sample_width: int) -> int:
-        """Manual RMS calculation as fallback"""
-        try:
-            if len(audio_data) < sample_width:
-                return 0
+                # Минималистичное уведомление о паузе
+                pause_embed = discord.Embed(
+                    description=f"⏳ **Пауза {settings.question_pause_seconds:g}с** • Подготовка следующего вопроса...",
+                    color=0x95a5a6
+                )
+                pause_msg = await text_channel.send(embed=pause_embed)
                 
-            if sample_width == 1:
-                # 8-bit unsigned
-                samples = [abs(b - 128) for b in audio_data]
-            elif sample_width == 2:
-                # 16-bit signed
-                samples = []
-                for i in range(0, len(audio_data) - 1, 2):
-                    if i + 1 < len(audio_data):
-                        sample = struct.unpack('<h', audio_data[i:i+2])[0]
-                        samples.append(abs(sample))
-            elif sample_width == 4:
-                # 32-bit signed
-                samples = []
-                for i in range(0, len(audio_data) - 3, 4):
-                    if i + 3 < len(audio_data):
-                        sample = struct.unpack('<i', audio_data[i:i+4])[0]
-                        samples.append(abs(sample))
-            else:
-                return 1000  # Default fallback
+                await self.scheduler.sleep(settings.question_pause_seconds, key=session.user_id)
+                await pause_msg.delete()
                 
-            if samples:
-                # RMS calculation
-                mean_square = sum(x * x for x in samples) / len(samples)
-                return int(mean_square ** 0.5)
+                await self._ask_question(voice_client, text_channel, session)
             else:
-                return 0
-                
-        except Exception as e:
-            logger.warning(f"Manual RMS calculation failed: {e}")
-            return 1000  # Safe fallback
-
-    def _estimate_audio_properties(self, filepath: str, file_size: int, expected_duration: int = 3) -> dict:
-        """Улучшенная оценка свойств аудио с учетом ожидаемой длительности"""
-        estimated_sample_rate = 48000
-        estimated_channels = 2
-        estimated_sample_width = 2
-        
-        # Более точная оценка длительности
-        audio_data_size = max(0, file_size - 44)
-        bytes_per_second = estimated_sample_rate * estimated_channels * estimated_sample_width
-        estimated_duration_calc = audio_data_size / bytes_per_second if bytes_per_second > 0 else 1.0
-        
-        # Ограничиваем оценку разумными пределами
-        if expected_duration <= 3:
-            estimated_duration_calc = min(estimated_duration_calc, expected_duration * 2)
-        
-        # Улучшенная оценка громкости
-        estimated_volume = self._estimate_volume_from_file_size(file_size, estimated_duration_calc, expected_duration)
-        
-        return {
-            'duration': estimated_duration_calc,
-            'sample_rate': estimated_sample_rate,
-            'channels': estimated_channels,
-            'sample_width': estimated_sample_width,
-            'avg_volume': estimated_volume
-        }
+                # Итог подводим только когда все ответы обработаны
+                await self._wait_pending_answers(scope, session)
+                total_files_processed = sum(result['files'] for result in session.results.values())
+                await self._complete_verification(voice_client, text_channel, session, total_files_processed)
 
-    def _calculate_quality_metrics(self, audio_data: dict, expected_duration: int) -> dict:
-        """Calculate quality score with adaptive scoring based on expected duration"""
-        
-        duration = audio_data['duration']
-        file_size_kb = audio_data['file_size_kb']
-        avg_volume = audio_data['avg_volume']
-        
-        # ИСПРАВЛЕНО: Адаптивная оценка длительности
-        if expected_duration > 0:
-            duration_ratio = duration / expected_duration
-            
-            # Для коротких ответов (≤3 сек) - более мягкие требования
-            if expected_duration <= 3:
-                if duration_ratio >= 0.3:  # Минимум 30% от ожидаемого
-                    if duration_ratio <= 2.0:  # Максимум в 2 раза больше
-                        duration_score = 1.0
-                    else:
-                        duration_score = max(0.7, 1.0 - (duration_ratio - 2.0) * 0.2)
-                else:
-                    # Очень короткие ответы - мягкий штраф
-                    duration_score = duration_ratio / 0.3 * 0.8
-            
-            # Для длинных ответов (>3 сек) - стандартные требования
-            else:
-                if duration_ratio >= 0.6:  # Минимум 60% от ожидаемого
-                    if duration_ratio <= 1.3:  # До 130% - отлично
-                        duration_score = 1.0
-                    else:
-                        duration_score = max(0.8, 1.0 - (duration_ratio - 1.3) * 0.3)
-                else:
-                    duration_score = duration_ratio / 0.6 * 0.7
-        else:
-            duration_score = 0.8 if duration > 0.5 else 0.3
-        
-        # ИСПРАВЛЕНО: Адаптивная оценка размера файла
-        # Базовая оценка: 12-18 KB/сек для коротких записей, 15-20 KB/сек для длинных
-        if expected_duration <= 3:
-            expected_size_kb = expected_duration * 12  # Меньше ожидаемый размер для коротких
-            min_acceptable_ratio = 0.2  # Более мягкие требования
-        else:
-            expected_size_kb = expected_duration * 15
-            min_acceptable_ratio = 0.3
-        
-        if expected_size_kb > 0:
-            size_ratio = file_size_kb / expected_size_kb
-            if size_ratio >= min_acceptable_ratio:
-                if size_ratio <= 2.5:
-                    size_score = 1.0
-                else:
-                    size_score = 0.8  # Большой файл не критично
-            else:
-                size_score = size_ratio / min_acceptable_ratio * 0.6
-        else:
-            size_score = 0.7 if file_size_kb > 10 else 0.3
-        
-        # ИСПРАВЛЕНО: Адаптивная оценка громкости
-        if avg_volume > 0:
-            # Для коротких ответов требования к громкости мягче
-            if expected_duration <= 3:
-                if avg_volume >= 300:  # Минимальный порог для коротких
-                    if avg_volume <= 8000:
-                        volume_score = 1.0
-                    else:
-                        volume_score = 0.9
-                else:
-                    volume_score = max(0.4, avg_volume / 300 * 0.8)
-            else:
-                # Для длинных ответов стандартные требования
-                if avg_volume >= 500:
-                    if avg_volume <= 6000:
-                        volume_score = 1.0
-                    else:
-                        volume_score = 0.9
-                else:
-                    volume_score = max(0.3, avg_volume / 500 * 0.7)
-        else:
-            volume_score = 0.1  # Тишина всегда плохо
-        
-        # ИСПРАВЛЕНО: Адаптивные веса в зависимости от длительности
-        if expected_duration <= 3:
-            # Для коротких ответов: громкость важнее длительности
-            quality = int((duration_score * 0.3 + volume_score * 0.5 + size_score * 0.2) * 100)
-        else:
-            # Для длинных ответов: сбалансированно
-            quality = int((duration_score * 0.4 + volume_score * 0.4 + size_score * 0.2) * 100)
-        
-        quality = max(15, min(100, quality))  # Минимум 15% для любого ответа
-        
-        # ИСПРАВЛЕНО: Адаптивные пороги качества
-        if expected_duration <= 3:
-            # Для коротких ответов более мягкие пороги
-            if quality >= 70:
-                quality_emoji = "🟢"
-                quality_color = 0x27ae60
-            elif quality >= 50:
-                quality_emoji = "🟡"
-                quality_color = 0xf39c12
-            elif quality >= 30:
-                quality_emoji = "🟠"
-                quality_color = 0xe67e22
-            else:
-                quality_emoji = "🔴"
-                quality_color = 0xe74c3c
-        else:
-            # Для длинных ответов стандартные пороги
-            if quality >= 80:
-                quality_emoji = "🟢"
-                quality_color = 0x27ae60
-            elif quality >= 60:
-                quality_emoji = "🟡"
-                quality_color = 0xf39c12
-            elif quality >= 40:
-                quality_emoji = "🟠"
-                quality_color = 0xe67e22
-            else:
-                quality_emoji = "🔴"
-                quality_color = 0xe74c3c
-        
-        return {
-            'quality': quality,
-            'quality_emoji': quality_emoji,
-            'quality_color': quality_color,
-            'duration_score': duration_score,
-            'size_score': size_score,
-            'volume_score': volume_score,
-            'expected_duration': expected_duration,
-            'is_short_answer': expected_duration <= 3
-        }
+        except asyncio.CancelledError:
+            logger.info(f"⏹️ Обработка ответа сессии {session.user_id} отменена")
+        except Exception as e:
+            logger.error(f"Ошибка при завершении записи: {e}")
+            await self._handle_verification_error(text_channel, session, str(e))
 
-    async def _handle_recording_complete(self, sink, text_channel: discord.TextChannel, voice_client: discord.VoiceClient, session: VerificationSession):
+    async def _wait_pending_answers(self, scope: SessionScope, session: VerificationSession) -> None:
+        pending = [task for task in session.pending if not task.done()]
+        if pending:
+            logger.debug(f"⏳ Сессия {session.user_id}: ожидание обработки {len(pending)} ответов")
+            await scope.stage("post_processing", asyncio.wait(pending), settings.stage_timeouts["post_processing"])
+        session.pending.clear()
+
+    async def _process_answer(self, saved_files: list, text_channel: discord.TextChannel, session: VerificationSession, question_index: int):
+        """Фоновая обработка ответа: анализ, эмбед для саппортов, загрузка и удаление файлов"""
+        scope = self.scopes[session.user_id]
+        started = time.perf_counter()
         try:
-            guild = text_channel.guild
-            saved_files = await self.recording_service.save_audio_files(sink, guild)
-            
             # ИСПРАВЛЕНО: Обрабатываем все файлы, но отправляем сводку
-            total_files_processed = 0
+            total_files_processed = len(saved_files)
             session_user_file = None
             
             # Находим файл текущего пользователя
@@ -605,99 +417,166 @@ class VerificationService:
                     session_user_file = file_info
                     break
             
-            if session_user_file:
-                member = session_user_file['member']
-                filepath = session_user_file['filepath']
-                filename = Path(filepath).name
-                
-                # Improved audio analysis
-                expected_duration = settings.recording_durations[session.current_question_index]
-                audio_analysis = await self._analyze_audio_file(filepath, expected_duration)
-
-                # 📊 АНАЛИТИЧЕСКИЙ ЭМБЕД ДЛЯ САППОРТОВ
-                progress = session.current_question_index + 1
-                total = len(settings.questions)
-                total_files_processed = len(saved_files)
-                
-                embed = discord.Embed(
-                    title=f"✅ Запись {progress}/{total} завершена",
-                    description=f"**{member.mention}** • Качество: **{audio_analysis['quality']}%** {audio_analysis['quality_emoji']}",
-                    color=audio_analysis['quality_color'],
-                    timestamp=datetime.utcnow()
-                )
+            if not session_user_file:
+                session.record_result(question_index, {'quality': None, 'files': total_files_processed})
+                self._log_answer(session, question_index, None, processing_seconds=time.perf_counter() - started)
+                return
+
+            member = session_user_file['member']
+            filepath = session_user_file['filepath']
+            filename = Path(filepath).name
+            upload_path = session_user_file.get('upload_path', filepath)
+            window = session_user_file.get('window')
+            
+            # Improved audio analysis
+            expected_duration = settings.recording_durations[question_index]
+            analysis_started = time.perf_counter()
+            audio_analysis = await scope.stage(
+                "analysis",
+                self._analyze_audio_file(
+                    filepath, expected_duration, session_user_file.get('network'), session_user_file.get('pcm'),
+                    settings.questions[question_index]
+                ),
+                settings.stage_timeouts["analysis"]
+            )
+            # Хэши отпечатка посчитаны в том же проходе, что и признаки; здесь только поиск по индексу
+            duplicate = await self._check_fingerprint(
+                scope, audio_analysis.pop('fingerprint', None), session.guild_id, question_index, session.user_id
+            )
+            analysis_seconds = time.perf_counter() - analysis_started
+
+            # 📊 АНАЛИТИЧЕСКИЙ ЭМБЕД ДЛЯ САППОРТОВ
+            progress = question_index + 1
+            total = len(settings.questions)
+            
+            embed = discord.Embed(
+                title=f"✅ Запись {progress}/{total} завершена",
+                description=f"**{member.mention}** • Качество: **{audio_analysis['quality']}%** {audio_analysis['quality_emoji']}",
+                color=audio_analysis['quality_color'],
+                timestamp=datetime.utcnow()
+            )
+
+            features = audio_analysis.get('features')
+            signal_line = (
+                f"Речь: {features['speech_seconds']:.1f}s • SNR: {features['snr_db']:.0f} dB • Клиппинг: {features['clipping_ratio']:.1%}\n"
+                if features else ""
+            )
+            passphrase = audio_analysis.get('passphrase')
+            if passphrase:
+                signal_line += f"Фраза: {'совпадает ✅' if passphrase['matched'] else 'не совпадает ❌'} ({passphrase['score']:.0%})\n"
+            raw_line = f" (запись {window['raw_duration']:.1f}s)" if window and window['raw_duration'] > window['duration'] else ""
+            embed.add_field(
+                name="📈 Анализ",
+                value=f"```yaml\nДлительность: {audio_analysis['duration']:.1f}s/{expected_duration}s{raw_line}\nРазмер: {audio_analysis['file_size_kb']:.1f} KB\nГромкость: {audio_analysis['avg_volume']:,} RMS\n{signal_line}Оценка: {audio_analysis['quality']}%```",
+                inline=False
+            )
 
+            network = audio_analysis.get('network')
+            network_score = audio_analysis.get('network_score')
+            if network and network_score is not None:
                 embed.add_field(
-                    name="📈 Анализ",
-                    value=f"```yaml\nДлительность: {audio_analysis['duration']:.1f}s/{expected_duration}s\nРазмер: {audio_analysis['file_size_kb']:.1f} KB\nГромкость: {audio_analysis['avg_volume']:,} RMS\nОценка: {audio_analysis['quality']}%```",
+                    name="📡 Сеть",
+                    value=f"```yaml\nПотери: {network['loss_ratio']:.1%} ({network['lost']}/{network['expected']})\nНе по порядку: {network['out_of_order']}\nДжиттер: {network['jitter_ms']:.1f} ms\nЗаполнено тишиной: {network['silence_fill_ratio']:.0%}\nОценка сети: {network_score:.0%}```",
                     inline=False
                 )
 
+            if duplicate:
                 embed.add_field(
-                    name="📁 Файлы",
-                    value=f"`{filename}`\n*+{total_files_processed-1} других*" if total_files_processed > 1 else f"`{filename}`",
-                    inline=True
+                    name="♻️ Повтор записи",
+                    value=f"Совпадает с ответом <@{duplicate['user_id']}> на **{duplicate['similarity']:.0%}** • <t:{int(duplicate['created_at'])}:R>",
+                    inline=False
                 )
 
-                # Обновленный прогресс бар
-                progress_bar = "▰" * progress + "▱" * (total - progress)
-                embed.add_field(
-                    name="📊 Прогресс",
-                    value=f"`{progress}/{total}` {progress_bar}",
-                    inline=True
-                )
+            embed.add_field(
+                name="📁 Файлы",
+                value=f"`{filename}`\n*+{total_files_processed-1} других*" if total_files_processed > 1 else f"`{filename}`",
+                inline=True
+            )
 
-                embed.add_field(
-                    name="⏭️ Статус",
-                    value="```css\n✅ Обработано```" if progress < total else "```diff\n+ ЗАВЕРШЕНО```",
-                    inline=True
-                )
+            # Обновленный прогресс бар
+            progress_bar = "▰" * progress + "▱" * (total - progress)
+            embed.add_field(
+                name="📊 Прогресс",
+                value=f"`{progress}/{total}` {progress_bar}",
+                inline=True
+            )
 
-                embed.set_thumbnail(url=member.display_avatar.url)
-                embed.set_footer(text=f"ID: {member.id} • Файлов записано: {total_files_processed}")
+            embed.add_field(
+                name="⏭️ Статус",
+                value="```css\n✅ Обработано```" if progress < total else "```diff\n+ ЗАВЕРШЕНО```",
+                inline=True
+            )
 
-                await text_channel.send(embed=embed)
-                
-                # Отправка файла с компактным сообщением
-                await text_channel.send(f"📎 **Аудиофайл:** `{filename}` • {audio_analysis['quality']}% качества", file=discord.File(filepath))
+            embed.set_thumbnail(url=member.display_avatar.url)
+            embed.set_footer(text=f"ID: {member.id} • Файлов записано: {total_files_processed}")
 
-                logger.success(f"🎙️ {member.display_name} — Q{progress}: {audio_analysis['quality']}% ({filename})")
+            await text_channel.send(embed=embed)
             
-            # Удаляем все файлы после обработки
-            for file_info in saved_files:
-                try:
-                    os.remove(file_info['filepath'])
-                except OSError as e:
-                    logger.warning(f"Couldn't remove file {file_info['filepath']}: {e}")
+            # Отправка файла с компактным сообщением
+            upload_started = time.perf_counter()
+            upload_message = await scope.stage(
+                "upload",
+                text_channel.send(f"📎 **Аудиофайл:** `{Path(upload_path).name}` • {audio_analysis['quality']}% качества", file=discord.File(upload_path)),
+                settings.stage_timeouts["upload"]
+            )
 
-            if session.current_question_index + 1 < len(settings.questions):
-                session.next_question()
-                
-                # Минималистичное уведомление о паузе
-                pause_embed = discord.Embed(
-                    description="⏳ **Пауза 3с** • Подготовка следующего вопроса...",
-                    color=0x95a5a6
-                )
-                pause_msg = await text_channel.send(embed=pause_embed)
-                
-                await asyncio.sleep(3)
-                await pause_msg.delete()
-                
-                await self._ask_question(voice_client, text_channel, session)
-            else:
-                # ИСПРАВЛЕНО: Передаем корректное количество файлов
-                await self._complete_verification(voice_client, text_channel, session, total_files_processed)
+            upload_seconds = time.perf_counter() - upload_started
+
+            archived = self._archive_answer(filepath, session.guild_id, session.user_id, question_index, audio_analysis)
+            session.record_result(question_index, {
+                'quality': audio_analysis['quality'],
+                'duration': audio_analysis['duration'],
+                'raw_duration': window['raw_duration'] if window else audio_analysis['duration'],
+                'network_score': network_score,
+                'duplicate_of': duplicate['user_id'] if duplicate else None,
+                'archived': archived,
+                'analysis_method': audio_analysis['analysis_method'],
+                'filename': filename,
+                'files': total_files_processed
+            })
+            self._log_answer(
+                session, question_index, audio_analysis,
+                duplicate_of=duplicate['user_id'] if duplicate else None,
+                archived=archived,
+                raw_duration=window['raw_duration'] if window else audio_analysis['duration'],
+                analysis_seconds=analysis_seconds,
+                upload_seconds=upload_seconds,
+                audio_url=upload_message.jump_url,
+                processing_seconds=time.perf_counter() - started,
+            )
+            logger.success(f"🎙️ {member.display_name} — Q{progress}: {audio_analysis['quality']}% ({filename})")
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Ошибка при завершении записи: {e}")
+            logger.error(f"Ошибка при обработке ответа {question_index + 1}: {e}")
             await self._handle_verification_error(text_channel, session, str(e))
+        finally:
+            # Удаляем все файлы после обработки, в том числе при отмене
+            self._remove_files(saved_files)
+
+    @staticmethod
+    def _remove_files(saved_files: list) -> None:
+        for file_info in saved_files:
+            if file_info.get('pcm'):
+                pcm_pool.release(file_info['pcm'])
+            for path in {file_info['filepath'], file_info.get('upload_path', file_info['filepath'])}:
+                if not os.path.exists(path):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Couldn't remove file {path}: {e}")
 
-    async def _complete_verification(self, voice_client: discord.VoiceClient, text_channel: discord.TextChannel, session: VerificationSession, total_files_count: int):
+    async def _complete_verification(self, voice_client: Optional[discord.VoiceClient], text_channel: discord.TextChannel, session: VerificationSession, total_files_count: int):
         try:
-            await self.audio_service.play_audio_file(voice_client, settings.audio_files["completion"])
+            if voice_client and voice_client.is_connected():
+                await self.audio_service.play_audio_file(voice_client, settings.audio_files["completion"])
 
-            member = voice_client.guild.get_member(session.user_id)
+            member = await member_resolver.fetch(text_channel.guild, session.user_id)
             if member:
                 await self.role_service.assign_verified_role(member, settings.verified_role_id, settings.unverified_role_id)
+                await self.verified_cache.put(VerifiedEntry(member.guild.id, member.id, time.time(), session.average_quality))
 
                 # 🎉 ИСПРАВЛЕННЫЙ ФИНАЛЬНЫЙ ОТЧЕТ
                 embed = discord.Embed(
@@ -708,9 +587,11 @@ class VerificationService:
                 )
 
                 # ИСПРАВЛЕНО: Показываем правильное количество файлов
+                average_quality = session.average_quality
+                quality_line = f"\nКачество: {average_quality:.0f}%" if average_quality is not None else ""
                 embed.add_field(
                     name="📊 Статистика",
-                    value=f"```yaml\nВопросов: {len(settings.questions)}/{len(settings.questions)}\nВремя: {sum(settings.recording_durations)}с\nФайлов: {len(settings.questions)}\nУспех: 100%```",
+                    value=f"```yaml\nВопросов: {len(settings.questions)}/{len(settings.questions)}\nВремя: {sum(settings.recording_durations)}с\nФайлов: {total_files_count}{quality_line}\nУспех: 100%```",
                     inline=False
                 )
 
@@ -730,9 +611,12 @@ class VerificationService:
                 embed.set_footer(text=f"Верификация завершена • {datetime.utcnow().strftime('%H:%M:%S UTC')}")
 
                 await text_channel.send(embed=embed)
+
+                # Сессия завершена до кика: событие выхода не должно ее отменять
+                session.complete()
                 
                 # Проверка прав на кик
-                if member.guild.me.guild_permissions.kick_members:
+                if guild_resources.get(member.guild).bot_permissions.kick_members:
                     try:
                         await self.role_service.kick_member_after_verification(member)
                     except discord.Forbidden:
@@ -754,14 +638,13 @@ class VerificationService:
                     )
                     await text_channel.send(embed=perm_embed)
 
-            session.complete()
+            self._log_session(session, "completed")
 
             if voice_client and voice_client.is_connected():
                 await voice_client.disconnect()
                 logger.info("Бот отключился после завершения верификации")
 
-            if session.user_id in self.active_sessions:
-                del self.active_sessions[session.user_id]
+            self._drop_session(session.user_id)
 
         except Exception as e:
             logger.error(f"Ошибка при завершении верификации: {e}")
@@ -783,7 +666,7 @@ class VerificationService:
         )
 
         if session:
-            user = text_channel.guild.get_member(session.user_id)
+            user = await member_resolver.fetch(text_channel.guild, session.user_id)
             if user:
                 embed.add_field(
                     name="👤 Пользователь",
@@ -806,14 +689,116 @@ class VerificationService:
 
         await text_channel.send(embed=embed)
 
-        if session and session.user_id in self.active_sessions:
-            del self.active_sessions[session.user_id]
+        if session:
+            self._drop_session(session.user_id)
+            self._log_session(session, "error", error_message)
 
         logger.error(f"Verification error: {error_message}")
 
+    def _drop_session(self, user_id: int) -> Optional[VerificationSession]:
+        """Убрать сессию, отменить ее задачи, таймеры и активную запись"""
+        session = self.active_sessions.pop(user_id, None)
+        scope = self.scopes.pop(user_id, None)
+        if scope:
+            scope.cancel()
+        self.scheduler.cancel_key(user_id)
+        pcm_pool.release_owner(user_id)
+        if session:
+            recording_id = f"{user_id}_{session.current_question_index}"
+            self.scheduler.cancel_key(recording_id)
+            recording = self.recording_service.active_recordings.get(recording_id)
+            if recording:
+                self.recording_service.stop_recording(recording['voice_client'], recording_id)
+        return session
+
+    def cancel_session(self, user_id: int) -> bool:
+        """Пользователь покинул канал: немедленно отменить всю группу задач сессии"""
+        session = self.active_sessions.get(user_id)
+        if session is None or session.is_completed:
+            return False
+        self._drop_session(user_id)
+        self._log_session(session, "cancelled")
+        logger.info(f"🛑 Сессия {user_id} отменена: пользователь покинул канал")
+        return True
+
+    def suspend_session(self, user_id: int, voice_client: Optional[discord.VoiceClient], text_channel: discord.TextChannel) -> bool:
+        """Пользователь покинул канал: остановить работу сессии, сохранив прогресс на grace-период"""
+        session = self.active_sessions.get(user_id)
+        if session is None or session.is_completed:
+            return False
+        if session.first_unanswered(len(settings.questions)) >= len(settings.questions):
+            # Все ответы уже обработаны — выход не мешает завершить верификацию
+            self._drop_session(user_id)
+            scope = self._activate_session(session)
+            total_files_processed = sum(result['files'] for result in session.results.values())
+            scope.spawn(
+                self._complete_verification(voice_client, text_channel, session, total_files_processed),
+                name="complete"
+            )
+            logger.info(f"🏁 Сессия {user_id}: все ответы обработаны до выхода, завершение верификации")
+            return True
+        if session.resumes >= settings.session_max_resumes:
+            logger.info(f"🛑 Сессия {user_id} исчерпала лимит возобновлений ({settings.session_max_resumes})")
+            return self.cancel_session(user_id)
+
+        self._drop_session(user_id)
+        session.suspend(len(settings.questions))
+        self._log_session(session, "suspended")
+
+        self.suspended_sessions[user_id] = session
+        self.scheduler.schedule(
+            settings.session_resume_grace_seconds, self._expire_suspended, user_id, key=("suspended", user_id)
+        )
+        logger.info(
+            f"⏸️ Сессия {user_id} приостановлена на вопросе {session.current_question_index + 1}, "
+            f"ожидание возврата {settings.session_resume_grace_seconds:.0f}с"
+        )
+        return True
+
+    def _expire_suspended(self, user_id: int) -> None:
+        session = self.suspended_sessions.pop(user_id, None)
+        if session:
+            self._log_session(session, "expired")
+            logger.info(f"⌛ Приостановленная сессия {user_id} не возобновлена и удалена")
+
+    def _expire_session(self, user_id: int) -> None:
+        """TTL сессии истек — пользователь не завершил верификацию вовремя"""
+        session = self._drop_session(user_id)
+        if session:
+            self._log_session(session, "expired")
+            logger.warning(f"⌛ Сессия {user_id} истекла через {settings.session_ttl_seconds:.0f}с и удалена")
+
+    def _start_reaper(self) -> None:
+        if not self._reaper_started:
+            self.scheduler.every(settings.session_reap_interval, self._reap_stale_sessions, key="session_reaper")
+            if self.fingerprints:
+                self.scheduler.every(settings.fingerprint_evict_interval, self.fingerprints.evict, key="fingerprint_eviction")
+            if self.archive:
+                self.scheduler.every(settings.archive_janitor_interval, self.archive.request_janitor, key="archive_janitor")
+            if self.result_log:
+                self.scheduler.every(
+                    settings.result_log_compact_interval, self.result_log.request_compaction, key="result_log_compaction"
+                )
+            self._reaper_started = True
+
+    def _reap_stale_sessions(self) -> None:
+        """Страховка: удалить завершенные и просроченные сессии, чьи таймеры потерялись"""
+        now = datetime.utcnow()
+        stale = [
+            user_id for user_id, session in self.active_sessions.items()
+            if not session.is_in_progress
+            or (now - session.active_since).total_seconds() > settings.session_ttl_seconds
+        ]
+        for user_id in stale:
+            self._drop_session(user_id)
+        if stale:
+            logger.info(f"🧹 Удалено зависших сессий: {len(stale)}")
+        pcm_pool.sweep(self.active_sessions)
+
     def cleanup_session(self, user_id: int) -> bool:
-        if user_id in self.active_sessions:
-            del self.active_sessions[user_id]
+        self.scheduler.cancel_key(("suspended", user_id))
+        suspended = self.suspended_sessions.pop(user_id, None)
+        if self._drop_session(user_id) or suspended:
             logger.info(f"Сессия {user_id} очищена")
             return True
         return False
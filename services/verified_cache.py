@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Protocol, Tuple
+
+from utils.logger import logger
+
+
+@dataclass
+class VerifiedEntry:
+    """Результат успешной верификации участника"""
+    guild_id: int
+    user_id: int
+    verified_at: float  # unix time
+    quality: Optional[float] = None
+
+
+class VerifiedResultStore(Protocol):
+    """Постоянное хранилище результатов; методы блокирующие и вызываются в executor"""
+
+    def load_verified(self, guild_id: int, user_id: int) -> Optional[VerifiedEntry]:
+        ...
+
+    def save_verified(self, entry: VerifiedEntry) -> None:
+        ...
+
+    def delete_verified(self, guild_id: int, user_id: int) -> None:
+        ...
+
+
+class VerifiedResultCache:
+    """TTL/LRU кэш пройденных верификаций по (гильдия, пользователь)
+
+    Промах в памяти проверяется в постоянном хранилище, если оно подключено.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int, store: Optional[VerifiedResultStore] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[int, int], VerifiedEntry]" = OrderedDict()
+
+    def _is_fresh(self, entry: VerifiedEntry) -> bool:
+        return time.time() - entry.verified_at < self.ttl_seconds
+
+    def _remember(self, entry: VerifiedEntry) -> None:
+        key = (entry.guild_id, entry.user_id)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, guild_id: int, user_id: int) -> Optional[VerifiedEntry]:
+        key = (guild_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            try:
+                entry = await asyncio.get_running_loop().run_in_executor(
+                    None, self.store.load_verified, guild_id, user_id
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать результат верификации {user_id} из хранилища: {e}")
+                entry = None
+            if entry is not None:
+                self._remember(entry)
+
+        if entry is None or not self._is_fresh(entry):
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    async def put(self, entry: VerifiedEntry) -> None:
+        self._remember(entry)
+        if self.store is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.store.save_verified, entry)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить результат верификации {entry.user_id}: {e}")
+
+    async def invalidate(self, guild_id: int, user_id: int) -> None:
+        """Забыть результат: роль снята модератором или участник забанен"""
+        self._entries.pop((guild_id, user_id), None)
+        if self.store is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.store.delete_verified, guild_id, user_id)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить результат верификации {user_id} из хранилища: {e}")
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,62 @@
+"""
+Load simulator for the verification flow
+Drives VoiceEventHandler with fake voice clients, no Discord connection required
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent))
+
+from simulation.load_test import LoadTestConfig, print_report, run_load_test
+from utils.logger import logger
+
+
+def parse_args() -> LoadTestConfig:
+    parser = argparse.ArgumentParser(description="Нагрузочная симуляция голосовой верификации")
+    parser.add_argument("--members", type=int, default=50, help="Количество участников")
+    parser.add_argument("--guilds", type=int, default=0, help="Количество гильдий (0 — по одной на участника)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Подключений в секунду (0 — все сразу)")
+    parser.add_argument("--leave-ratio", type=float, default=0.0, help="Доля участников, уходящих посреди сессии")
+    parser.add_argument("--rejoin-ratio", type=float, default=0.0, help="Доля ушедших, которые возвращаются")
+    parser.add_argument("--flap-ratio", type=float, default=0.0, help="Доля участников с быстрым заходом/выходом")
+    parser.add_argument("--state-toggles", type=int, default=0, help="Переключений mute на участника")
+    parser.add_argument("--prompt-seconds", type=float, default=2.0, help="Длительность воспроизведения вопроса")
+    parser.add_argument("--durations", type=str, default="", help="Длительности записи через запятую, например 1,2")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Таймаут одной сессии")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Показывать логи сессий")
+    args = parser.parse_args()
+
+    durations = [int(value) for value in args.durations.split(",") if value.strip()] or None
+    if not args.verbose:
+        logger.logger.setLevel(logging.WARNING)
+
+    return LoadTestConfig(
+        members=args.members,
+        guilds=args.guilds,
+        join_rate=args.rate,
+        leave_ratio=args.leave_ratio,
+        rejoin_ratio=args.rejoin_ratio,
+        flap_ratio=args.flap_ratio,
+        state_toggles=args.state_toggles,
+        prompt_seconds=args.prompt_seconds,
+        recording_durations=durations,
+        session_timeout=args.timeout,
+        seed=args.seed,
+    )
+
+
+def main():
+    """Simulation entry point"""
+    config = parse_args()
+    report = asyncio.run(run_load_test(config))
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
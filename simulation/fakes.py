@@ -0,0 +1,283 @@
+import asyncio
+import math
+import random
+import struct
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import discord
+
+FRAME_MS = 20
+SAMPLING_RATE = 48000
+CHANNELS = 2
+SAMPLE_SIZE = 4  # байт на сэмпл (2 канала × int16)
+FRAME_BYTES = SAMPLING_RATE * FRAME_MS // 1000 * SAMPLE_SIZE
+
+
+def synthetic_pcm_frame(seed: int, amplitude: float = 0.2) -> bytes:
+    """Сгенерировать 20 мс стерео PCM16 (тон + шум), как после декодера Opus"""
+    rng = random.Random(seed)
+    freq = 120 + seed % 180
+    samples_per_frame = SAMPLING_RATE * FRAME_MS // 1000
+    peak = int(32767 * amplitude)
+    values = []
+    for i in range(samples_per_frame):
+        sample = int(peak * math.sin(2 * math.pi * freq * i / SAMPLING_RATE))
+        sample += rng.randint(-peak // 10, peak // 10)
+        sample = max(-32768, min(32767, sample))
+        values.extend((sample, sample))
+    return struct.pack(f"<{len(values)}h", *values)
+
+
+class FakeDecoder:
+    """Параметры декодера, которые WaveSink читает при форматировании"""
+    CHANNELS = CHANNELS
+    SAMPLE_SIZE = SAMPLE_SIZE
+    SAMPLING_RATE = SAMPLING_RATE
+
+
+class FakeAudioSource:
+    """Заглушка discord.FFmpegPCMAudio без запуска ffmpeg"""
+
+    def __init__(self, source, *args, **kwargs):
+        self.source = source
+
+    def cleanup(self):
+        pass
+
+
+class FakeMessage:
+    """Сообщение, отправленное в фейковый текстовый канал"""
+
+    def __init__(self, channel: "FakeTextChannel", content: Optional[str], embed: Optional[discord.Embed]):
+        self.channel = channel
+        self.id = channel.sent
+        self.content = content
+        self.embed = embed
+        self.deleted = False
+
+    @property
+    def jump_url(self) -> str:
+        return f"https://discord.com/channels/{self.channel.guild.id}/{self.channel.id}/{self.id}"
+
+    async def delete(self):
+        self.deleted = True
+
+
+class FakeTextChannel:
+    """Текстовый канал, копящий сообщения в памяти"""
+
+    def __init__(self, channel_id: int, guild: "FakeGuild", name: str = "verification"):
+        self.id = channel_id
+        self.guild = guild
+        self.name = name
+        self.sent = 0
+        self.listeners: List[Callable[[FakeMessage], None]] = []
+
+    def permissions_for(self, member) -> discord.Permissions:
+        return discord.Permissions(send_messages=True)
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None, file: Optional[discord.File] = None, delete_after: Optional[float] = None, **kwargs):
+        await asyncio.sleep(0)
+        if file is not None:
+            file.close()
+        self.sent += 1
+        message = FakeMessage(self, content, embed)
+        for listener in self.listeners:
+            listener(message)
+        return message
+
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str):
+        self.id = role_id
+        self.name = name
+
+
+class FakeMember:
+    """Участник гильдии с минимальным набором атрибутов discord.Member"""
+
+    def __init__(self, member_id: int, guild: "FakeGuild", name: str, bot: bool = False):
+        self.id = member_id
+        self.guild = guild
+        self.display_name = name
+        self.name = name
+        self.bot = bot
+        self.mention = f"<@{member_id}>"
+        self.display_avatar = SimpleNamespace(url=f"https://cdn.example/avatars/{member_id}.png")
+        self.roles: List[FakeRole] = []
+        self.guild_permissions = discord.Permissions(kick_members=True, manage_roles=True)
+        self.on_kick: Optional[Callable[["FakeMember"], None]] = None
+        self.kicked = False
+
+    async def add_roles(self, *roles, reason: Optional[str] = None):
+        for role in roles:
+            if role not in self.roles:
+                self.roles.append(role)
+
+    async def remove_roles(self, *roles, reason: Optional[str] = None):
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def kick(self, reason: Optional[str] = None):
+        self.kicked = True
+        if self.on_kick:
+            self.on_kick(self)
+
+
+class FakeGuild:
+    """Гильдия; все гильдии симуляции делят общий реестр участников"""
+
+    def __init__(self, guild_id: int, registry: Dict[int, FakeMember], roles: Dict[int, FakeRole]):
+        self.id = guild_id
+        self.name = f"Sim Guild {guild_id}"
+        self._registry = registry
+        self._roles = roles
+        self.text_channels: List[FakeTextChannel] = []
+        self.me = FakeMember(0, self, "VerificationBot", bot=True)
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self._registry.get(user_id)
+
+    async def fetch_member(self, user_id: int) -> Optional[FakeMember]:
+        await asyncio.sleep(0)
+        return self._registry.get(user_id)
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self._roles.get(role_id)
+
+
+class FakeVoiceClient:
+    """Голосовой клиент: воспроизведение по таймеру и синтетическая запись в sink"""
+
+    decoder = FakeDecoder()
+
+    def __init__(self, bot: "FakeBot", channel: "FakeVoiceChannel", prompt_seconds: float, speech_ratio: float):
+        self.bot = bot
+        self.channel = channel
+        self.guild = channel.guild
+        self.loop = asyncio.get_running_loop()
+        self.prompt_seconds = prompt_seconds
+        self.speech_ratio = speech_ratio
+        self.recording = False
+        self.sink = None
+        self._connected = True
+        self._playing_until = 0.0
+        self._feed_task: Optional[asyncio.Task] = None
+        self._callback = None
+        self._callback_args = ()
+        self.ws = SimpleNamespace(ssrc_map={})
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def play(self, source, *, after=None):
+        if self.is_playing():
+            raise discord.ClientException("Already playing audio.")
+        self._playing_until = self.loop.time() + self.prompt_seconds
+        if after:
+            self.loop.call_later(self.prompt_seconds, after, None)
+
+    def is_playing(self) -> bool:
+        return self.loop.time() < self._playing_until
+
+    def stop(self):
+        self._playing_until = 0.0
+
+    def start_recording(self, sink, callback, *args, sync_start: bool = False):
+        if not self._connected:
+            raise discord.sinks.RecordingException("Not connected to voice channel.")
+        if self.recording:
+            raise discord.sinks.RecordingException("Already recording.")
+        self.recording = True
+        self.sink = sink
+        self._callback = callback
+        self._callback_args = args
+        sink.init(self)
+        self._feed_task = self.loop.create_task(self._feed(sink))
+
+    def stop_recording(self):
+        if not self.recording:
+            raise discord.sinks.RecordingException("Not currently recording audio.")
+        self.recording = False
+        if self._feed_task:
+            self._feed_task.cancel()
+        sink, callback, args = self.sink, self._callback, self._callback_args
+        # Как и py-cord, финализируем sink и вызываем колбэк вне текущего стека
+        sink.cleanup()
+        self.loop.create_task(callback(sink, *args))
+
+    async def _feed(self, sink):
+        """Подавать 20 мс кадры от «говорящих» участников канала"""
+        frames = {member.id: synthetic_pcm_frame(member.id) for member in self.channel.members if not member.bot}
+        sequences = {}
+        speak_after = 0.3
+        started = self.loop.time()
+        try:
+            while self.recording:
+                elapsed = self.loop.time() - started
+                for member in list(self.channel.members):
+                    if member.bot or elapsed < speak_after:
+                        continue
+                    ssrc = member.id & 0xFFFFFFFF
+                    self.ws.ssrc_map[ssrc] = {"user_id": member.id, "speaking": True}
+                    sequence = sequences[member.id] = sequences.get(member.id, -1) + 1
+                    # Кадры сверх speech_ratio считаем потерянными в сети
+                    if random.random() > self.speech_ratio:
+                        continue
+                    if hasattr(sink, "observe_rtp"):
+                        sink.observe_rtp(ssrc, sequence & 0xFFFF, sequence * 960, time.perf_counter())
+                    frame = frames.get(member.id) or frames.setdefault(member.id, synthetic_pcm_frame(member.id))
+                    sink.write(frame, member.id)
+                await asyncio.sleep(FRAME_MS / 1000)
+        except asyncio.CancelledError:
+            pass
+
+    async def disconnect(self, *, force: bool = False):
+        if self.recording:
+            self.stop_recording()
+        self._connected = False
+        if self in self.bot.voice_clients:
+            self.bot.voice_clients.remove(self)
+
+
+class FakeVoiceChannel:
+    """Голосовой канал верификации внутри фейковой гильдии"""
+
+    def __init__(self, channel_id: int, guild: FakeGuild, bot: "FakeBot"):
+        self.id = channel_id
+        self.guild = guild
+        self.name = "voice-verification"
+        self.bot = bot
+        self.members: List[FakeMember] = []
+
+    async def connect(self, **kwargs) -> FakeVoiceClient:
+        await asyncio.sleep(0)
+        voice_client = FakeVoiceClient(self.bot, self, self.bot.prompt_seconds, self.bot.speech_ratio)
+        self.bot.voice_clients.append(voice_client)
+        return voice_client
+
+
+class FakeVoiceState:
+    def __init__(self, channel: Optional[FakeVoiceChannel] = None, **flags):
+        self.channel = channel
+        self.self_mute = flags.get("self_mute", False)
+        self.self_deaf = flags.get("self_deaf", False)
+        self.self_stream = flags.get("self_stream", False)
+        self.self_video = flags.get("self_video", False)
+        self.mute = flags.get("mute", False)
+        self.deaf = flags.get("deaf", False)
+
+
+class FakeBot:
+    """Минимальный commands.Bot для VoiceEventHandler"""
+
+    def __init__(self, prompt_seconds: float = 2.0, speech_ratio: float = 0.9):
+        self.voice_clients: List[FakeVoiceClient] = []
+        self.prompt_seconds = prompt_seconds
+        self.speech_ratio = speech_ratio
+        self.channels: Dict[int, object] = {}
+        self.user = SimpleNamespace(id=0, name="VerificationBot")
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
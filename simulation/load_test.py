@@ -0,0 +1,263 @@
+import asyncio
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from unittest import mock
+
+import discord
+from rich.table import Table
+
+from config.settings import settings
+from handlers.voice_events import VoiceEventHandler
+from simulation.fakes import (
+    FakeAudioSource,
+    FakeBot,
+    FakeGuild,
+    FakeMember,
+    FakeMessage,
+    FakeRole,
+    FakeTextChannel,
+    FakeVoiceChannel,
+    FakeVoiceState,
+)
+from utils.helpers import peak_rss_mb
+from utils.logger import console
+
+ERROR_TITLE = "🚨 ОШИБКА ВЕРИФИКАЦИИ"
+
+
+@dataclass
+class LoadTestConfig:
+    """Параметры сценария нагрузочного теста"""
+    members: int = 50
+    guilds: int = 0  # 0 — отдельная гильдия на каждого участника
+    join_rate: float = 0.0  # подключений в секунду, 0 — все сразу
+    leave_ratio: float = 0.0  # доля участников, уходящих посреди сессии
+    rejoin_ratio: float = 0.0  # доля ушедших, которые возвращаются и продолжают сессию
+    flap_ratio: float = 0.0  # доля участников, которые сначала быстро заходят и выходят
+    state_toggles: int = 0  # mute/unmute на участника во время сессии
+    prompt_seconds: float = 2.0
+    speech_ratio: float = 0.9
+    recording_durations: Optional[List[int]] = None
+    session_timeout: float = 120.0
+    seed: int = 1
+
+
+@dataclass
+class LoadTestReport:
+    """Результаты прогона"""
+    members: int
+    completed: int = 0
+    failed: int = 0
+    left_early: int = 0
+    rejoined: int = 0
+    timed_out: int = 0
+    wall_time: float = 0.0
+    session_durations: List[float] = field(default_factory=list)
+    loop_lag: List[float] = field(default_factory=list)
+    messages_sent: int = 0
+    suppressed_events: int = 0
+    peak_rss_mb: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.wall_time if self.wall_time > 0 else 0.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class LoadSimulation:
+    """Прогон сценариев join/leave через VoiceEventHandler без подключения к Discord"""
+
+    def __init__(self, config: LoadTestConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.bot = FakeBot(prompt_seconds=config.prompt_seconds, speech_ratio=config.speech_ratio)
+        self.handler = VoiceEventHandler(self.bot)
+        self.registry: Dict[int, FakeMember] = {}
+        self.roles = {
+            settings.verified_role_id: FakeRole(settings.verified_role_id, "Verified"),
+            settings.unverified_role_id: FakeRole(settings.unverified_role_id, "Unverified"),
+        }
+        self.voice_channels: List[FakeVoiceChannel] = []
+        self.finished: Dict[int, asyncio.Event] = {}
+        self.outcomes: Dict[int, str] = {}
+        self.report = LoadTestReport(members=config.members)
+        self._build_world()
+
+    def _build_world(self):
+        guild_count = self.config.guilds or self.config.members
+        for index in range(guild_count):
+            guild = FakeGuild(10_000 + index, self.registry, self.roles)
+            self.voice_channels.append(FakeVoiceChannel(settings.voice_channel_id, guild, self.bot))
+
+        # Все сессии пишут в один канал, как и в боевой конфигурации
+        home_guild = self.voice_channels[0].guild
+        text_channel = FakeTextChannel(settings.text_channel_id, home_guild)
+        text_channel.listeners.append(self._on_message)
+        for channel in self.voice_channels:
+            channel.guild.text_channels.append(text_channel)
+        self.bot.channels[settings.text_channel_id] = text_channel
+        self.text_channel = text_channel
+
+    def _on_message(self, message: FakeMessage):
+        if message.embed is None or message.embed.title != ERROR_TITLE:
+            return
+        # ID пользователя указан в описании эмбеда ошибки
+        for member_id, event in self.finished.items():
+            if not event.is_set() and str(member_id) in (message.embed.description or ""):
+                self.outcomes[member_id] = "failed"
+                event.set()
+
+    def _on_kick(self, member: FakeMember):
+        self.outcomes.setdefault(member.id, "completed")
+        self.finished[member.id].set()
+        asyncio.get_running_loop().create_task(self._leave(member))
+
+    async def _join(self, member: FakeMember, channel: FakeVoiceChannel):
+        channel.members.append(member)
+        await self.handler.handle_voice_state_update(member, FakeVoiceState(), FakeVoiceState(channel))
+
+    async def _leave(self, member: FakeMember):
+        channel = next((c for c in self.voice_channels if member in c.members), None)
+        if channel is None:
+            return
+        channel.members.remove(member)
+        await self.handler.handle_voice_state_update(member, FakeVoiceState(channel), FakeVoiceState())
+
+    async def _run_member(self, index: int, delay: float):
+        await asyncio.sleep(delay)
+        channel = self.voice_channels[index % len(self.voice_channels)]
+        member = FakeMember(1_000_000 + index, channel.guild, f"sim_user_{index}")
+        member.on_kick = self._on_kick
+        self.registry[member.id] = member
+        done = self.finished[member.id] = asyncio.Event()
+
+        leaves_early = self.rng.random() < self.config.leave_ratio
+        if self.rng.random() < self.config.flap_ratio:
+            await self._join(member, channel)
+            await self._leave(member)
+
+        started = time.perf_counter()
+        await self._join(member, channel)
+
+        for toggle in range(self.config.state_toggles):
+            await asyncio.sleep(self.rng.uniform(0.1, 0.5))
+            muted = toggle % 2 == 0
+            await self.handler.handle_voice_state_update(
+                member, FakeVoiceState(channel, self_mute=not muted), FakeVoiceState(channel, self_mute=muted)
+            )
+
+        if leaves_early:
+            await asyncio.sleep(self.rng.uniform(0.5, sum(settings.recording_durations)))
+            if not done.is_set() and self.rng.random() < self.config.rejoin_ratio:
+                # Обрыв связи: выход и быстрый возврат, сессия должна продолжиться
+                await self._leave(member)
+                await asyncio.sleep(self.rng.uniform(0.2, 1.0))
+                self.report.rejoined += 1
+                await self._join(member, channel)
+            elif not done.is_set():
+                self.outcomes[member.id] = "left_early"
+                done.set()
+                await self._leave(member)
+
+        try:
+            await asyncio.wait_for(done.wait(), timeout=self.config.session_timeout)
+        except asyncio.TimeoutError:
+            self.outcomes[member.id] = "timed_out"
+
+        if self.outcomes.get(member.id) == "completed":
+            self.report.session_durations.append(time.perf_counter() - started)
+
+    async def _monitor_loop_lag(self, interval: float = 0.05):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.report.loop_lag.append(max(0.0, loop.time() - expected))
+
+    async def run(self) -> LoadTestReport:
+        spacing = 1 / self.config.join_rate if self.config.join_rate > 0 else 0.0
+        monitor = asyncio.create_task(self._monitor_loop_lag())
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(self._run_member(i, i * spacing) for i in range(self.config.members)))
+        finally:
+            monitor.cancel()
+        self.report.wall_time = time.perf_counter() - started
+
+        for outcome in self.outcomes.values():
+            if outcome == "completed":
+                self.report.completed += 1
+            elif outcome == "failed":
+                self.report.failed += 1
+            elif outcome == "left_early":
+                self.report.left_early += 1
+            elif outcome == "timed_out":
+                self.report.timed_out += 1
+        self.report.messages_sent = self.text_channel.sent
+        self.report.suppressed_events = self.handler.suppressed_events
+        self.report.peak_rss_mb = peak_rss_mb()
+        service = self.handler.verification_service
+        # Дописать архив, журнал и историю до удаления временного каталога
+        for writer in (service.archive, service.result_log, service.history):
+            if writer:
+                await asyncio.get_running_loop().run_in_executor(None, writer.close)
+        return self.report
+
+
+async def run_load_test(config: LoadTestConfig) -> LoadTestReport:
+    """Запустить симуляцию с подменой FFmpeg-источника и длительностей записи"""
+    durations = config.recording_durations or settings.recording_durations
+    with tempfile.TemporaryDirectory() as data_dir, \
+            mock.patch.object(discord, "FFmpegPCMAudio", FakeAudioSource), \
+            mock.patch.object(settings, "recording_durations", list(durations)), \
+            mock.patch.object(settings, "fingerprint_db_path", os.path.join(data_dir, "fingerprints.sqlite3")), \
+            mock.patch.object(settings, "archive_dir", os.path.join(data_dir, "archive")), \
+            mock.patch.object(settings, "result_log_dir", os.path.join(data_dir, "results")), \
+            mock.patch.object(settings, "history_db_path", os.path.join(data_dir, "history.sqlite3")):
+        return await LoadSimulation(config).run()
+
+
+def render_report(report: LoadTestReport) -> Table:
+    """Собрать таблицу с итогами прогона"""
+    table = Table(title="📊 Нагрузочный тест верификации", show_header=True)
+    table.add_column("Метрика")
+    table.add_column("Значение", justify="right")
+
+    lag_ms = [lag * 1000 for lag in report.loop_lag]
+    rows = [
+        ("Участников", f"{report.members}"),
+        ("Завершено", f"{report.completed}"),
+        ("Ошибок", f"{report.failed}"),
+        ("Ушли досрочно", f"{report.left_early}"),
+        ("Вернулись", f"{report.rejoined}"),
+        ("Таймаутов", f"{report.timed_out}"),
+        ("Время прогона", f"{report.wall_time:.1f}s"),
+        ("Пропускная способность", f"{report.throughput:.2f} сессий/с"),
+        ("Сессия p50", f"{percentile(report.session_durations, 50):.2f}s"),
+        ("Сессия p99", f"{percentile(report.session_durations, 99):.2f}s"),
+        ("Лаг цикла p50", f"{percentile(lag_ms, 50):.1f} ms"),
+        ("Лаг цикла p99", f"{percentile(lag_ms, 99):.1f} ms"),
+        ("Лаг цикла max", f"{max(lag_ms, default=0.0):.1f} ms"),
+        ("Сообщений отправлено", f"{report.messages_sent}"),
+        ("Отфильтровано событий", f"{report.suppressed_events}"),
+        ("Пиковый RSS", f"{report.peak_rss_mb:.1f} MB"),
+    ]
+    for name, value in rows:
+        table.add_row(name, value)
+    return table
+
+
+def print_report(report: LoadTestReport):
+    console.print(render_report(report))
@@ -1,5 +1,9 @@
+import asyncio
+import os
 import re
-from typing import Optional
+import resource
+import sys
+from typing import Optional, Tuple
 import discord
 from datetime import datetime, timezone
 
@@ -29,3 +33,44 @@ def create_embed(
         )
     
     return embed
+
+
+async def run_process(*args: str, timeout: float, capture_output: bool = False) -> Tuple[int, bytes, bytes]:
+    """Run a subprocess with a deadline; the process is killed on timeout or cancellation"""
+    pipe = asyncio.subprocess.PIPE if capture_output else asyncio.subprocess.DEVNULL
+    process = await asyncio.create_subprocess_exec(*args, stdout=pipe, stderr=pipe)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        return process.returncode, stdout or b"", stderr or b""
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await asyncio.shield(process.wait())
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process in megabytes"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident set size in megabytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with this pid exists (possibly owned by another user)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,117 @@
+import random
+import struct
+from typing import BinaryIO, Iterable, List
+
+OGG_CAPTURE = b"OggS"
+OPUS_SAMPLE_RATE = 48000
+DEFAULT_PRE_SKIP = 312
+MAX_SEGMENTS = 255
+
+
+def _crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    """CRC-32 Ogg (полином 0x04C11DB7, без отражения)"""
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[((crc >> 24) & 0xFF) ^ byte]
+    return crc
+
+
+def opus_packet_samples(packet: bytes) -> int:
+    """Количество сэмплов (48 кГц) в Opus пакете по TOC байту (RFC 6716, 3.1)"""
+    if not packet:
+        return 0
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame_samples = (480, 960, 1920, 2880)[config % 4]
+    elif config < 16:
+        frame_samples = (480, 960)[config % 2]
+    else:
+        frame_samples = (120, 240, 480, 960)[config % 4]
+
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frame_samples * frames
+
+
+class OggOpusWriter:
+    """Упаковка готовых Opus пакетов в контейнер Ogg без перекодирования"""
+
+    def __init__(self, f: BinaryIO, channels: int = 2, pre_skip: int = DEFAULT_PRE_SKIP, vendor: str = "verificationBot"):
+        self.f = f
+        self.channels = channels
+        self.pre_skip = pre_skip
+        self.serial = random.getrandbits(32)
+        self.sequence = 0
+        self.granule = 0
+        self.bytes_written = 0
+        self._segments: List[int] = []
+        self._payload = bytearray()
+
+        head = struct.pack("<8sBBHIhB", b"OpusHead", 1, channels, pre_skip, OPUS_SAMPLE_RATE, 0, 0)
+        vendor_bytes = vendor.encode("utf-8")
+        tags = b"OpusTags" + struct.pack("<I", len(vendor_bytes)) + vendor_bytes + struct.pack("<I", 0)
+        self._write_page([head], granule=0, flags=0x02)
+        self._write_page([tags], granule=0, flags=0x00)
+
+    @staticmethod
+    def _lacing(packet: bytes) -> List[int]:
+        values = [255] * (len(packet) // 255)
+        values.append(len(packet) % 255)
+        return values
+
+    def _write_page(self, packets: Iterable[bytes], granule: int, flags: int) -> None:
+        segments: List[int] = []
+        payload = bytearray()
+        for packet in packets:
+            segments.extend(self._lacing(packet))
+            payload.extend(packet)
+        self._emit(segments, payload, granule, flags)
+
+    def _emit(self, segments: List[int], payload: bytes, granule: int, flags: int) -> None:
+        header = struct.pack(
+            "<4sBBqIIIB", OGG_CAPTURE, 0, flags, granule, self.serial, self.sequence, 0, len(segments)
+        ) + bytes(segments)
+        page = bytearray(header + payload)
+        struct.pack_into("<I", page, 22, ogg_crc(page))
+        self.f.write(page)
+        self.bytes_written += len(page)
+        self.sequence += 1
+
+    def write_packet(self, packet: bytes) -> None:
+        lacing = self._lacing(packet)
+        if len(self._segments) + len(lacing) > MAX_SEGMENTS:
+            self._flush(flags=0x00)
+        self._segments.extend(lacing)
+        self._payload.extend(packet)
+        self.granule += opus_packet_samples(packet)
+
+    def _flush(self, flags: int) -> None:
+        if not self._segments and not flags & 0x04:
+            return
+        self._emit(self._segments, bytes(self._payload), self.granule, flags)
+        self._segments = []
+        self._payload = bytearray()
+
+    def close(self) -> int:
+        """Записать последнюю страницу с флагом EOS; вернуть размер файла"""
+        self._flush(flags=0x04)
+        return self.bytes_written
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Optional, Set, TypeVar
+
+from core.exceptions import StageTimeoutException
+from utils.logger import logger
+
+T = TypeVar("T")
+
+
+class SessionScope:
+    """Группа задач одной сессии верификации
+
+    Все фоновые задачи сессии запускаются через spawn(), каждая стадия
+    ограничена своим дедлайном через stage(). cancel() отменяет всю группу
+    разом.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cancelled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def spawn(self, coro: Awaitable, name: Optional[str] = None) -> Optional[asyncio.Task]:
+        """Запустить задачу внутри группы"""
+        if self.cancelled:
+            coro.close()
+            return None
+        task = asyncio.get_running_loop().create_task(coro, name=f"{self.name}:{name or 'task'}")
+        self._tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"💥 Необработанная ошибка в задаче {task.get_name()}: {task.exception()}")
+
+    async def stage(self, stage_name: str, awaitable: Awaitable[T], timeout: float) -> T:
+        """Выполнить стадию с дедлайном; по таймауту бросается StageTimeoutException"""
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise StageTimeoutException(f"Стадия «{stage_name}» не уложилась в {timeout:g}с")
+
+    def cancel(self) -> int:
+        """Отменить все задачи группы (кроме текущей)"""
+        if self.cancelled:
+            return 0
+        self.cancelled = True
+
+        current = asyncio.current_task()
+        cancelled = 0
+        for task in list(self._tasks):
+            if task is not current and not task.done():
+                task.cancel()
+                cancelled += 1
+        return cancelled
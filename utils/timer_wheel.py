@@ -0,0 +1,216 @@
+import asyncio
+import math
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from utils.logger import logger
+
+
+class TimerHandle:
+    """Отложенный вызов в колесе таймеров"""
+
+    __slots__ = ('deadline', 'callback', 'args', 'key', 'cancelled', 'future', '_slot')
+
+    def __init__(self, deadline: int, callback: Callable, args: tuple, key: Optional[Hashable]):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.cancelled = False
+        self.future: Optional[asyncio.Future] = None
+        self._slot: Optional[Set["TimerHandle"]] = None
+
+
+class TimerWheel:
+    """Иерархическое колесо таймеров, обслуживаемое одной задачей
+
+    Таймер кладется в слот уровня, на котором его дедлайн впервые отличается
+    от текущего тика. При переходе через границу уровня слот «осыпается» на
+    уровень ниже. Постановка и отмена — O(1), отмена возможна по ключу сессии.
+    """
+
+    def __init__(self, tick: float = 0.1, slot_bits: int = 6, levels: int = 4):
+        self.tick = tick
+        self.slot_bits = slot_bits
+        self.slots = 1 << slot_bits
+        self.mask = self.slots - 1
+        self.levels = levels
+        self._wheels: List[List[Set[TimerHandle]]] = [
+            [set() for _ in range(self.slots)] for _ in range(levels)
+        ]
+        self._overflow: Set[TimerHandle] = set()
+        self._by_key: Dict[Hashable, Set[TimerHandle]] = {}
+        self._current = 0
+        self._count = 0
+        self._origin: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    # ------------------------------------------------------------------ планирование
+
+    def schedule(self, delay: float, callback: Callable, *args: Any, key: Optional[Hashable] = None) -> TimerHandle:
+        """Вызвать callback(*args) через delay секунд; корутины запускаются задачей"""
+        self._ensure_running()
+        if self._count == 0:
+            # Колесо пустое — можно перескочить простой без прокрутки тиков
+            self._current = self._now_tick()
+        ticks = max(1, math.ceil(delay / self.tick))
+        handle = TimerHandle(self._now_tick() + ticks, callback, args, key)
+        self._insert(handle)
+        self._count += 1
+        if key is not None:
+            self._by_key.setdefault(key, set()).add(handle)
+        self._wakeup.set()
+        return handle
+
+    def every(self, interval: float, callback: Callable, *args: Any, key: Optional[Hashable] = None) -> TimerHandle:
+        """Периодический вызов; отменяется по ключу"""
+        def _fire():
+            self.every(interval, callback, *args, key=key)
+            return callback(*args)
+        return self.schedule(interval, _fire, key=key)
+
+    async def sleep(self, delay: float, key: Optional[Hashable] = None) -> None:
+        """Асинхронная пауза на колесе; cancel_key(key) прерывает ее через CancelledError"""
+        self._ensure_running()
+        future = self._loop.create_future()
+        handle = self.schedule(delay, self._resolve, future, key=key)
+        handle.future = future
+        try:
+            await future
+        finally:
+            if not future.done() or future.cancelled():
+                self.cancel(handle)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def cancel(self, handle: TimerHandle) -> bool:
+        if handle.cancelled:
+            return False
+        handle.cancelled = True
+        if handle._slot is not None:
+            handle._slot.discard(handle)
+            handle._slot = None
+            self._count -= 1
+        self._forget_key(handle)
+        if handle.future is not None and not handle.future.done():
+            handle.future.cancel()
+        return True
+
+    def cancel_key(self, key: Hashable) -> int:
+        """Отменить все таймеры с данным ключом"""
+        handles = self._by_key.pop(key, set())
+        cancelled = 0
+        for handle in handles:
+            handle.key = None
+            cancelled += self.cancel(handle)
+        return cancelled
+
+    def pending(self, key: Hashable) -> int:
+        return len(self._by_key.get(key, ()))
+
+    def _forget_key(self, handle: TimerHandle) -> None:
+        if handle.key is None:
+            return
+        handles = self._by_key.get(handle.key)
+        if handles is not None:
+            handles.discard(handle)
+            if not handles:
+                del self._by_key[handle.key]
+
+    # ------------------------------------------------------------------ устройство колеса
+
+    def _insert(self, handle: TimerHandle) -> None:
+        deadline = max(handle.deadline, self._current + 1)
+        for level in range(self.levels):
+            shift = self.slot_bits * (level + 1)
+            if deadline >> shift == self._current >> shift:
+                slot = self._wheels[level][(deadline >> (self.slot_bits * level)) & self.mask]
+                break
+        else:
+            slot = self._overflow
+        slot.add(handle)
+        handle._slot = slot
+
+    def _advance(self) -> None:
+        """Перейти к следующему тику: осыпать верхние уровни и выполнить таймеры"""
+        self._current += 1
+        current = self._current
+
+        if current & ((1 << (self.slot_bits * self.levels)) - 1) == 0:
+            self._cascade(self._overflow)
+        for level in range(self.levels - 1, 0, -1):
+            if current & ((1 << (self.slot_bits * level)) - 1) == 0:
+                self._cascade(self._wheels[level][(current >> (self.slot_bits * level)) & self.mask])
+
+        due = self._wheels[0][current & self.mask]
+        if not due:
+            return
+        fired = list(due)
+        due.clear()
+        for handle in fired:
+            handle._slot = None
+            self._count -= 1
+            self._forget_key(handle)
+            self._run(handle)
+
+    def _cascade(self, slot: Set[TimerHandle]) -> None:
+        handles = list(slot)
+        slot.clear()
+        for handle in handles:
+            self._insert(handle)
+
+    def _run(self, handle: TimerHandle) -> None:
+        try:
+            result = handle.callback(*handle.args)
+            if asyncio.iscoroutine(result):
+                task = self._loop.create_task(result)
+                task.add_done_callback(self._report_task_error)
+        except Exception as e:
+            logger.error(f"⏰ Ошибка в таймере {getattr(handle.callback, '__name__', handle.callback)}: {e}")
+
+    @staticmethod
+    def _report_task_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error(f"⏰ Ошибка в задаче таймера: {task.exception()}")
+
+    # ------------------------------------------------------------------ драйвер
+
+    def _now_tick(self) -> int:
+        return int((self._loop.time() - self._origin) / self.tick)
+
+    def _ensure_running(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        if self._origin is None:
+            self._origin = self._loop.time()
+            self._current = 0
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._drive())
+
+    async def _drive(self) -> None:
+        while True:
+            if self._count == 0:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            target = self._now_tick()
+            while self._current < target and self._count:
+                self._advance()
+            if self._count == 0:
+                continue
+            next_time = self._origin + (self._current + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_time - self._loop.time()))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None